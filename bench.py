@@ -0,0 +1,328 @@
+"""
+Benchmarks for the load, metric and rendering paths at configurable scale.
+
+A synthetic generator writes a gaze / REC scoring pair shaped like
+output/gaze_scoring_results_new.json and output/rec_scoring_results_new.json
+(same keys, 0–100 gaze coordinates with interleaved nulls, pixel bboxes);
+every benchmark then runs on those files and reports the best and median
+wall time over --repeat runs. Startup benchmarks import each app's top-level
+modules in a fresh interpreter, then time what the first rerun's drawing adds
+(colormaps, first overlay, heatmap), and record which heavy third-party
+packages each step pulled in. Results are written as JSON, so two runs (or
+two commits) can be compared with --compare.
+
+Usage:
+    python bench.py --examples 1000 --candidates 12 --fixations 6
+    python bench.py --examples 10000 --out output/bench/10k.json --compare output/bench/10k_before.json
+    python bench.py --startup-only --out output/bench/startup.json
+    python bench.py --examples 300000 --vocab 100000   # search at scale (100 ms per query target)
+"""
+import argparse
+import ast
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from drawing import draw_rec_point, draw_sequence, render_gaze_overlay
+from gaze_metrics import TARGET_SIZE, compute_all, pack_store
+from label_index import SearchIndex, build_search_index
+from parallel_eval import store_report
+from ranking_eval import summarize
+from render_cache import encode_image
+from scoring_store import CAND_GOLD, ScoringStore, build_store
+from scoring_stream import iter_merged, merge_entries
+from thumbnails import THUMB_WIDTHS, scaled_size
+
+APPS = ("rerank_vis.py", "rerank_streamlit.py")
+HEAVY_MODULES = ("matplotlib", "scipy", "datasets", "pyarrow", "pandas", "fsspec")
+SEARCH_TARGET_S = 0.1  # per query, interactive budget of the example search box
+WORDS = ("the", "man", "woman", "left", "right", "red", "shirt", "dog", "on", "in",
+         "small", "bowl", "of", "carrots", "child", "green", "jacket", "behind", "table", "car")
+
+
+# ─── Synthetic scoring files ───────────────────────────────────────────────────
+def synth_entries(
+    n_examples: int,
+    n_candidates: int = 12,
+    n_fixations: int = 6,
+    null_rate: float = 0.4,
+    n_vocab: int = 0,
+    seed: int = 0,
+) -> tuple[list[dict], list[dict]]:
+    """
+    (gaze entries, rec entries) with the keys and value ranges of the real
+    files. With `n_vocab`, each candidate text also gets one word out of that
+    many pseudo-words, so the search index sees a vocabulary of realistic size.
+    """
+    rng = np.random.default_rng(seed)
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    extra = ["".join(rng.choice(letters, size=int(rng.integers(4, 11)))) for _ in range(n_vocab)]
+    gaze, rec = [], []
+    for e in range(n_examples):
+        n_c = max(1, int(rng.integers(n_candidates - 2, n_candidates + 1)))
+        x0, y0 = rng.uniform(0, 400), rng.uniform(0, 250)
+        bbox = [x0, y0, rng.uniform(10, 512 - x0), rng.uniform(10, 320 - y0)]
+        candidates = [
+            {"text": " ".join([*rng.choice(WORDS, size=int(rng.integers(1, 9))),
+                               *([extra[int(rng.integers(n_vocab))]] if n_vocab else [])]).capitalize(),
+             "type": "gold" if c < 2 else "generated"}
+            for c in range(n_c)
+        ]
+        sequences = []
+        for _ in range(n_c):
+            n_f = max(1, int(rng.poisson(n_fixations)))
+            pts = np.round(rng.uniform(0, 100, size=(n_f, 2)), 1).tolist()
+            sequences.append([None if rng.random() < null_rate else pt for pt in pts])
+        rec_points = [None if rng.random() < 0.05 else pt
+                      for pt in np.round(rng.uniform(0, 100, size=(n_c, 2)), 1).tolist()]
+        common = {
+            "image_path": f"output/overlayed_example_{e}.jpg",
+            "plain_path": f"output/plain_example_{e}.jpg",
+            "bbox":       bbox,
+            "candidates": candidates,
+        }
+        gaze.append({**common, "gaze_distances": rng.uniform(0, 200, n_c).tolist(),
+                     "gaze_sequences": sequences})
+        rec.append({**common, "rec_distances": rng.uniform(0, 200, n_c).tolist(),
+                    "rec_points": rec_points})
+    return gaze, rec
+
+
+def write_synthetic(out_dir: Path, **scale) -> tuple[Path, Path]:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    gaze, rec = synth_entries(**scale)
+    gaze_path = out_dir / "gaze_scoring_results_synth.json"
+    rec_path = out_dir / "rec_scoring_results_synth.json"
+    gaze_path.write_text(json.dumps(gaze, indent=2))
+    rec_path.write_text(json.dumps(rec, indent=2))
+    return gaze_path, rec_path
+
+
+# ─── Timing ────────────────────────────────────────────────────────────────────
+def timed(fn: Callable[[], object], repeat: int) -> dict[str, float]:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return {"best_s": min(times), "median_s": statistics.median(times), "runs": repeat}
+
+
+def run_benchmarks(gaze_path: Path, rec_path: Path, work_dir: Path, repeat: int = 3,
+                   n_render: int = 200) -> dict[str, dict]:
+    results: dict[str, dict] = {}
+
+    # Load / merge, as rerank_vis.py used to do it and through the streaming path
+    def load_and_merge():
+        with open(gaze_path) as f:
+            gaze = json.load(f)
+        with open(rec_path) as f:
+            rec = json.load(f)
+        return [merge_entries(g, r) for g, r in zip(gaze, rec)]
+
+    results["load:json_load_merge"] = timed(load_and_merge, repeat)
+    results["load:stream_merge"] = timed(lambda: sum(1 for _ in iter_merged(gaze_path, rec_path)), repeat)
+    store_dir = work_dir / "store"
+    results["load:build_store"] = timed(lambda: build_store(gaze_path, rec_path, store_dir), repeat)
+    results["load:open_store"] = timed(lambda: len(ScoringStore(store_dir)), repeat)
+    store = ScoringStore(store_dir)
+
+    # Example search, on an index opened once as the app caches it: a substring hit, and a
+    # typo only the fuzzy fallback matches (its first run includes the prefilter tables' build)
+    search_dir = work_dir / "search"
+    results["search:build_index"] = timed(lambda: build_search_index(store, search_dir), repeat)
+    results["search:open_index"] = timed(lambda: SearchIndex(search_dir), repeat)
+    index = SearchIndex(search_dir)
+    for name, query in (("substring", "carrot"), ("fuzzy_miss", "jackte")):
+        results[f"search:{name}"] = {**timed(lambda query=query: index.search(query), repeat),
+                                     "target_s": SEARCH_TARGET_S}
+
+    # Notebook metrics: one batched pass, then each metric's ranking evaluation
+    results["metrics:pack_store"] = timed(lambda: pack_store(store, TARGET_SIZE), repeat)
+    packed = pack_store(store, TARGET_SIZE)
+    results["metrics:compute_all"] = timed(lambda: compute_all(packed), repeat)
+    scores = compute_all(packed)
+    is_gold = np.asarray(store.cand_type) == CAND_GOLD
+    for name, s in scores.items():
+        results[f"metrics:evaluate:{name}"] = timed(
+            lambda s=s: summarize(s, packed.cand_offsets, is_gold, (1, 3, 5), gold_last_on_ties=True), repeat)
+
+    # compute_length_metrics: gold@k + reference-length stats for rec / gaze / combined
+    results["length_metrics:serial"] = timed(lambda: store_report(store, n_workers=1), repeat)
+    results["length_metrics:parallel"] = timed(lambda: store_report(store), repeat)
+
+    # Rendering, on a blank base image the size of the overlayed images
+    # (candidates without any valid fixation are skipped: nothing to draw)
+    drawable = [c for c in range(len(store.gaze)) if len(store.gaze.sequence(c))][:n_render]
+    n = len(drawable)
+    base = Image.new("RGB", TARGET_SIZE)
+    sx, sy = base.width / 100.0, base.height / 100.0
+    sequences = [store.gaze.sequence(c) for c in drawable]
+    raw_sequences = [store.gaze.raw(c) for c in drawable]
+    rec_points = [
+        pt if ok else None
+        for pt, ok in zip(np.asarray(store.rec_point[:n_render]).tolist(),
+                          np.asarray(store.rec_valid[:n_render]).tolist())
+    ]
+
+    def draw_all(seqs):
+        img = base.copy()
+        draw = ImageDraw.Draw(img)
+        for seq in seqs:
+            draw_sequence(draw, seq, sx, sy)
+
+    def draw_recs():
+        img = base.copy()
+        draw = ImageDraw.Draw(img)
+        for pt in rec_points:
+            draw_rec_point(draw, pt, sx, sy)
+
+    results[f"render:draw_sequence_arrays_x{n}"] = timed(lambda: draw_all(sequences), repeat)
+    results[f"render:draw_sequence_lists_x{n}"] = timed(lambda: draw_all(raw_sequences), repeat)
+    results[f"render:draw_rec_point_x{len(rec_points)}"] = timed(draw_recs, repeat)
+    results[f"render:gaze_overlay_encode_x{min(n, 50)}"] = timed(
+        lambda: [encode_image(render_gaze_overlay(base, seq)) for seq in sequences[:50]], repeat)
+    # What the app draws and sends: the 384 px pyramid level, WebP
+    panel = base.resize(scaled_size(base.size, THUMB_WIDTHS[-1]))
+    results[f"render:gaze_overlay_panel_webp_x{min(n, 50)}"] = timed(
+        lambda: [encode_image(render_gaze_overlay(panel, seq), "WEBP") for seq in sequences[:50]], repeat)
+    return results
+
+
+# ─── App startup ───────────────────────────────────────────────────────────────
+def app_imports(app: Path) -> list[str]:
+    """Modules an app script imports at top level (streamlit itself excluded)."""
+    modules = []
+    for node in ast.parse(app.read_text()).body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            modules.append(node.module)
+    return [m for m in dict.fromkeys(modules) if m.split(".")[0] != "streamlit"]
+
+
+_STARTUP_PROBE = """
+import json, sys, time
+heavy = sys.argv[1].split(",")
+t0 = time.perf_counter()
+for name in sys.argv[2:]:
+    try:
+        __import__(name)
+    except ImportError:
+        pass
+t1 = time.perf_counter()
+imported = [m for m in heavy if m in sys.modules]
+# What the first rerun adds: one gaze overlay per colormap the apps use, and a heatmap
+from PIL import Image, ImageDraw
+from drawing import draw_sequence, render_gaze_overlay
+from heatmap import heat_image
+import numpy as np
+base = Image.new("RGB", (512, 320))
+seq = np.array([[10, 10], [50, 50], [80, 20]], dtype=np.float32)
+render_gaze_overlay(base, seq)
+draw_sequence(ImageDraw.Draw(base), seq, 1.0, 1.0, cmap_name="plasma")
+heat_image(np.ones((8, 8)), base.size)
+print(json.dumps({"s": t1 - t0, "heavy": imported,
+                  "first_draw_s": time.perf_counter() - t1,
+                  "heavy_after_draw": [m for m in heavy if m in sys.modules]}))
+"""
+
+
+def startup_benchmarks(repeat: int = 3) -> dict[str, dict]:
+    """
+    Cold import time of each app's top-level modules, then the extra time of
+    the first rerun's drawing (colormap tables, first overlay, heatmap), one
+    fresh interpreter per run.
+    """
+    results = {}
+    for app in APPS:
+        modules = app_imports(Path(app))
+        times, draw_times, probe = [], [], {}
+        for _ in range(repeat):
+            out = subprocess.run([sys.executable, "-c", _STARTUP_PROBE, ",".join(HEAVY_MODULES), *modules],
+                                 capture_output=True, text=True, check=True, cwd=Path(__file__).parent)
+            probe = json.loads(out.stdout)
+            times.append(probe["s"])
+            draw_times.append(probe["first_draw_s"])
+        results[f"startup:{Path(app).stem}_imports"] = {
+            "best_s": min(times), "median_s": statistics.median(times), "runs": repeat,
+            "heavy_modules": probe["heavy"],
+        }
+        results[f"startup:{Path(app).stem}_first_draw"] = {
+            "best_s": min(draw_times), "median_s": statistics.median(draw_times), "runs": repeat,
+            "heavy_modules": probe["heavy_after_draw"],
+        }
+    return results
+
+
+def compare(old: dict, new: dict) -> list[str]:
+    """One line per benchmark present in both runs: best times and new/old ratio."""
+    lines = []
+    for name, res in new["results"].items():
+        before = old["results"].get(name)
+        if before:
+            ratio = res["best_s"] / before["best_s"] if before["best_s"] else float("inf")
+            lines.append(f"{name:50s} {before['best_s']:9.4f}s -> {res['best_s']:9.4f}s  x{ratio:.2f}")
+    return lines
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--examples", type=int, default=1000)
+    ap.add_argument("--candidates", type=int, default=12, help="candidates per example (max)")
+    ap.add_argument("--fixations", type=int, default=6, help="mean fixations per gaze sequence")
+    ap.add_argument("--null-rate", type=float, default=0.4, help="fraction of null fixations")
+    ap.add_argument("--vocab", type=int, default=0, help="extra pseudo-words in the candidate texts")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default=None, help="results JSON (default output/bench/<scale>.json)")
+    ap.add_argument("--compare", default=None, help="earlier results JSON to compare against")
+    ap.add_argument("--keep", default=None, help="keep the synthetic files and store in this directory")
+    ap.add_argument("--startup-only", action="store_true", help="only run the app startup benchmarks")
+    args = ap.parse_args()
+
+    scale = {"n_examples": args.examples, "n_candidates": args.candidates,
+             "n_fixations": args.fixations, "null_rate": args.null_rate, "n_vocab": args.vocab, "seed": args.seed}
+    results = startup_benchmarks(args.repeat)
+    if not args.startup_only:
+        work_dir = Path(args.keep) if args.keep else Path(tempfile.mkdtemp(prefix="rerank_bench_"))
+        try:
+            gaze_path, rec_path = write_synthetic(work_dir, **scale)
+            results.update(run_benchmarks(gaze_path, rec_path, work_dir, args.repeat))
+        finally:
+            if not args.keep:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "scale":       scale,
+        "environment": {"python": platform.python_version(), "numpy": np.__version__,
+                        "machine": platform.machine(), "platform": platform.platform()},
+        "timestamp":   time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results":     results,
+    }
+    out = Path(args.out or f"output/bench/{args.examples}x{args.candidates}x{args.fixations}.json")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+
+    for name, res in results.items():
+        heavy = f"  heavy: {', '.join(res['heavy_modules']) or '-'}" if "heavy_modules" in res else ""
+        over = "  OVER TARGET" if res["best_s"] > res.get("target_s", float("inf")) else ""
+        print(f"{name:50s} best {res['best_s']:9.4f}s  median {res['median_s']:9.4f}s{heavy}{over}")
+    if args.compare:
+        print("\ncompared with", args.compare)
+        print("\n".join(compare(json.loads(Path(args.compare).read_text()), report)))
+    print(f"\nwrote {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Gaze / REC overlay drawing shared by the Streamlit apps and offline tools.
+
+Colormaps become cached uint8 RGB lookup tables, one per (name, length),
+resampled from the tables shipped in colormap_data.py; only a colormap not
+shipped there imports matplotlib, so neither starting the apps nor their
+first draw pays for it.
+"""
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from colormap_data import COLORMAP_HEX
+
+GAZE_STYLE = {"cmap_name": "viridis", "last_color": "red", "label": True}
+REC_STYLE = {"color": "yellow", "radius": 6}
+LUT_SIZE = 256
+
+
+def scaled_style(style: dict, scale: float) -> dict:
+    """`style` for drawing on an image `scale` times the original's width (e.g. a thumbnail).
+
+    Left unchanged at full size, so full-size overlays keep their pixels and cache keys.
+    """
+    return style if scale == 1.0 else {**style, "scale": scale}
+
+
+@lru_cache(maxsize=None)
+def colormap_lut(cmap_name: str, n: int = LUT_SIZE) -> np.ndarray:
+    """
+    (n, 3) uint8 RGB table of a matplotlib colormap resampled to `n` colors —
+    the colors `cm.get_cmap(cmap_name, n)` gives — built once per (name, n).
+    """
+    hex_table = COLORMAP_HEX.get(cmap_name)
+    if hex_table is not None:
+        # matplotlib's ListedColormap.resampled(n): color i is entry floor(i/(n-1) * N)
+        base = np.frombuffer(bytes.fromhex("".join(hex_table)), dtype=np.uint8).reshape(-1, 3)
+        x = np.linspace(0.0, 1.0, n) * len(base)
+        x[x == len(base)] = len(base) - 1
+        lut = base[x.astype(np.int64)]
+    else:
+        from matplotlib import colormaps
+        lut = colormaps[cmap_name].resampled(n)(np.arange(n))[:, :3]
+        lut = (255 * lut).astype(np.uint8)
+    lut.setflags(write=False)
+    return lut
+
+
+def _px(size: int, scale: float) -> int:
+    """A marker size in pixels at `scale` (at least 1)."""
+    return max(1, int(round(size * scale)))
+
+
+def _scale_points(seq_100, sx: float, sy: float) -> np.ndarray:
+    """(n, 2) int pixel coords; list input is filtered for invalid / null entries first."""
+    if not isinstance(seq_100, np.ndarray):
+        seq_100 = np.array([
+            pt for pt in seq_100
+            if isinstance(pt, (list, tuple)) and len(pt) == 2
+            and isinstance(pt[0], (int, float)) and isinstance(pt[1], (int, float))
+        ], dtype=np.float64).reshape(-1, 2)
+    return np.rint(seq_100.astype(np.float64) * (sx, sy)).astype(np.int64)
+
+
+def draw_sequence(
+    draw: ImageDraw.ImageDraw,
+    seq_100: list[tuple[float, float]],
+    sx: float,
+    sy: float,
+    cmap_name: str = "viridis",
+    last_color: str = "red",
+    label: bool = True,
+    dwell=None,
+    scale: float = 1.0,
+):
+    """
+    seq_100: list of (x,y) pairs in 0–100 coordinates (floats), or an (n, 2)
+             array of already-validated fixations (`ragged.RaggedPoints.sequence`)
+    sx, sy: scale factors to convert 0–100 → pixel coords (1, 1 for pixel input)
+    dwell: optional samples per fixation (`gaze_preprocess.Fixations`); circle
+           area grows with dwell, so collapsed runs stay visible
+    scale: marker size relative to the full-size image (radii, line widths and
+           label offsets shrink with it on a downscaled thumbnail)
+    This function:
+      - Filters out any invalid or null entries (lists only)
+      - Scales each (x, y) by (sx, sy)
+      - Draws a colored circle for each fixation (colormap by index)
+      - Draws a thick line between consecutive fixations
+      - Labels each fixation with its 1-based index
+      - Outlines the final fixation in `last_color`
+    Coordinates, boxes and colors for the whole sequence are computed up front
+    in NumPy; the loop only issues the draw calls.
+    """
+    # 3.1) Filter & scale
+    pts = _scale_points(seq_100, sx, sy)
+    if len(pts) < 1:
+        print("EMPTY GAZE PT LIST")
+        return
+
+    N = len(pts)
+    colors = list(map(tuple, colormap_lut(cmap_name, N).tolist()))
+    if dwell is None:
+        r = np.full((N, 1), _px(4, scale))
+    else:
+        r = np.minimum(np.rint(4 * scale * np.sqrt(np.asarray(dwell, dtype=np.float64))),
+                       _px(12, scale)).astype(np.int64)[:, None]
+    line_width, offset = _px(4, scale), _px(5, scale)
+    boxes = np.hstack([pts - r, pts + r]).tolist()
+    xy = pts.tolist()
+    segments = np.hstack([pts[:-1], pts[1:]]).tolist()
+
+    # 3.2) Draw each fixation & line (same order as always, so pixels don't change)
+    ellipse, line, text = draw.ellipse, draw.line, draw.text
+    for i in range(N):
+        ellipse(boxes[i], fill=colors[i])
+        if i > 0:
+            line(segments[i - 1], fill=colors[i], width=line_width)
+        if label:
+            x, y = xy[i]
+            text((x + offset, y - offset), str(i + 1), fill="white")
+
+    # 3.3) Outline the last fixation
+    fx, fy = xy[-1]
+    r2 = max(_px(6, scale), int(r[-1, 0]) + _px(2, scale))
+    draw.ellipse((fx - r2, fy - r2, fx + r2, fy + r2), outline=last_color, width=_px(3, scale))
+
+
+def draw_rec_point(
+    draw: ImageDraw.ImageDraw,
+    pt_100: list[float],
+    sx: float,
+    sy: float,
+    color: str = "yellow",
+    radius: int = 6,
+    scale: float = 1.0,
+):
+    """
+    pt_100: single [x,y] in 0–100 coords (list, or a (2,) array with NaN for none)
+    sx, sy: scale factors to convert 0–100 → pixels
+    scale: marker size relative to the full-size image, as in `draw_sequence`
+    Draws a filled circle at the scaled location.
+    """
+    if isinstance(pt_100, np.ndarray):
+        pt_100 = pt_100.tolist() if not np.isnan(pt_100).any() else None
+    if not isinstance(pt_100, (list, tuple)) or len(pt_100) != 2:
+        return
+    x100, y100 = pt_100
+    if not isinstance(x100, (int, float)) or not isinstance(y100, (int, float)):
+        return
+
+    x_px = int(round(x100 * sx))
+    y_px = int(round(y100 * sy))
+    r = _px(radius, scale)
+    draw.ellipse((x_px - r, y_px - r, x_px + r, y_px + r), fill=color, outline=color)
+
+
+def render_gaze_overlay(base_image: Image.Image, seq_100, **style) -> Image.Image:
+    """Copy of `base_image` with one gaze sequence drawn on it."""
+    img = base_image.copy()
+    sx, sy = img.width / 100.0, img.height / 100.0
+    draw_sequence(ImageDraw.Draw(img), seq_100, sx, sy, **{**GAZE_STYLE, **style})
+    return img
+
+
+def render_rec_overlay(base_image: Image.Image, pt_100, **style) -> Image.Image:
+    """Copy of `base_image` with one REC point drawn on it."""
+    img = base_image.copy()
+    sx, sy = img.width / 100.0, img.height / 100.0
+    draw_rec_point(ImageDraw.Draw(img), pt_100, sx, sy, **{**REC_STYLE, **style})
+    return img
@@ -0,0 +1,231 @@
+"""
+Headless evaluation of a gaze / REC scoring run.
+
+Builds (or reuses) the columnar store for a pair of scoring files and writes
+one report in the layout of analysis_results.json:
+
+  flat summary       gold@top-k, gold positions, MRR, distances and the
+                     reference-length metrics for rec / gaze / combined,
+                     from the per-example metric cache (incremental.refresh:
+                     only examples added or changed since the last run are
+                     scored), plus proportion_gold_*
+  example_analyses   per example: gold_positions, gold_in_top3,
+                     avg_distances and best_{rec,gaze,combined}_candidate
+
+The report also records the scoring files' (size, mtime) stamps, so
+rerank_vis.py can read it instead of recomputing and notice when it is
+stale. --parquet additionally writes the per-example analyses as a table
+(one row per example, gold positions as list columns; needs pyarrow).
+
+Ranks break exact ties by candidate order (`ranking_eval.candidate_ranks`),
+like the app's ranking tables.
+
+Usage:
+    python eval_report.py [--gaze G.json] [--rec R.json] [--out report.json] [--parquet examples.parquet]
+    python eval_report.py --cache output/metric_cache_new
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from incremental import refresh
+from ranking_eval import DEFAULT_KS, STORE_RANKINGS, best_gold_ranks, candidate_ranks
+from scoring_store import (
+    CAND_GOLD, CAND_TYPE_NAMES, ScoringStore, build_store, is_store, source_stamps,
+)
+
+REPORT_VERSION = 1
+TOP_K = 3  # gold_in_top3
+DEFAULT_METRIC_CACHE = Path("output/metric_cache_new")
+RANKINGS = tuple(STORE_RANKINGS)  # rec, gaze, combined
+
+
+class ExampleAnalyses(NamedTuple):
+    """
+    Per-example analyses as arrays (E examples, G gold candidates in total):
+    gold_offsets    (E+1,) example e owns gold entries gold_offsets[e]:gold_offsets[e+1]
+    gold_positions  ranking -> (G,) 1-based rank of each gold candidate
+    gold_in_top     ranking -> (E,) a gold candidate is ranked within the top TOP_K
+    avg_distances   ranking -> (E,) mean candidate score (NaN without candidates)
+    best            ranking -> (E,) candidate ranked first (-1 without candidates)
+    """
+    image_paths: list[str]
+    gold_offsets: np.ndarray
+    gold_positions: dict[str, np.ndarray]
+    gold_in_top: dict[str, np.ndarray]
+    avg_distances: dict[str, np.ndarray]
+    best: dict[str, np.ndarray]
+
+
+def analyze_examples(store: ScoringStore) -> ExampleAnalyses:
+    cand_offsets = np.asarray(store.cand_offsets, dtype=np.int64)
+    counts = np.diff(cand_offsets)
+    n_examples = len(counts)
+    is_gold = np.asarray(store.cand_type) == CAND_GOLD
+    example = np.repeat(np.arange(n_examples), counts)
+    gold_offsets = np.zeros(n_examples + 1, dtype=np.int64)
+    np.cumsum(np.bincount(example[is_gold], minlength=n_examples), out=gold_offsets[1:])
+    nonempty = counts > 0
+
+    gold_positions, gold_in_top, avg_distances, best = {}, {}, {}, {}
+    for name in RANKINGS:
+        scores = np.asarray(STORE_RANKINGS[name](store), dtype=np.float64)
+        ranks = candidate_ranks(scores, cand_offsets)
+        gold_positions[name] = ranks[is_gold]
+        best_gold = best_gold_ranks(ranks, cand_offsets, is_gold)
+        gold_in_top[name] = (best_gold > 0) & (best_gold <= TOP_K)
+        means = np.full(n_examples, np.nan)
+        if nonempty.any():
+            means[nonempty] = np.add.reduceat(scores, cand_offsets[:-1][nonempty]) / counts[nonempty]
+        avg_distances[name] = means
+        first = np.full(n_examples, -1, dtype=np.int64)
+        top = np.flatnonzero(ranks == 1)
+        first[example[top]] = top
+        best[name] = first
+    return ExampleAnalyses(store.image_paths.tolist(), gold_offsets, gold_positions, gold_in_top,
+                           avg_distances, best)
+
+
+def _candidate(store: ScoringStore, c: int, **scores) -> dict | None:
+    if c < 0:
+        return None
+    return {"text": store.texts[c], "type": CAND_TYPE_NAMES[int(store.cand_type[c])], **scores}
+
+
+def example_records(store: ScoringStore, analyses: ExampleAnalyses) -> list[dict]:
+    """`example_analyses` entries in the analysis_results.json layout."""
+    gaze = np.asarray(store.gaze_distance, dtype=np.float64)
+    rec = np.asarray(store.rec_distance, dtype=np.float64)
+    positions = {name: p.tolist() for name, p in analyses.gold_positions.items()}
+    in_top = {name: v.tolist() for name, v in analyses.gold_in_top.items()}
+    avg = {name: [None if np.isnan(x) else x for x in v.tolist()] for name, v in analyses.avg_distances.items()}
+    best = {name: v.tolist() for name, v in analyses.best.items()}
+    g = analyses.gold_offsets.tolist()
+
+    records = []
+    for e, image_path in enumerate(analyses.image_paths):
+        rb, gb, cb = best["rec"][e], best["gaze"][e], best["combined"][e]
+        records.append({
+            "image_path":     image_path,
+            "gold_positions": {name: positions[name][g[e]:g[e + 1]] for name in RANKINGS},
+            f"gold_in_top{TOP_K}": {name: in_top[name][e] for name in RANKINGS},
+            "avg_distances":  {name: avg[name][e] for name in RANKINGS},
+            "best_rec_candidate":  _candidate(store, rb, score=float(rec[rb])),
+            "best_gaze_candidate": _candidate(store, gb, score=float(gaze[gb])),
+            "best_combined_candidate": _candidate(
+                store, cb, rec_score=float(rec[cb]), gaze_score=float(gaze[cb]),
+                combined_score=float(gaze[cb] + rec[cb])),
+        })
+    return records
+
+
+def build_report(store: ScoringStore, gaze_path: Path | str, rec_path: Path | str,
+                 metric_cache: Path | str = DEFAULT_METRIC_CACHE,
+                 analyses: ExampleAnalyses | None = None) -> dict:
+    """
+    Summary + per-example analyses for `store` (built from `gaze_path` /
+    `rec_path`), stamped with its source files. The summary is brought up to
+    date through the metric cache in `metric_cache`.
+    """
+    if analyses is None:
+        analyses = analyze_examples(store)
+    summary, _ = refresh(gaze_path, rec_path, metric_cache, DEFAULT_KS)
+    n = summary["total_examples"]
+    for name in RANKINGS:
+        summary[f"proportion_gold_{name}"] = summary[f"gold_at_top_{name}"] / n if n else 0.0
+        summary[f"proportion_gold_top{TOP_K}_{name}"] = summary[f"gold_in_top{TOP_K}_{name}"] / n if n else 0.0
+    return {
+        "report_version": REPORT_VERSION,
+        "sources":        source_stamps(gaze_path, rec_path),
+        "generated":      time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **summary,
+        "example_analyses": example_records(store, analyses),
+    }
+
+
+def summary_of(report: dict) -> dict:
+    """The flat summary part of a report (no metadata, no per-example analyses)."""
+    return {k: v for k, v in report.items()
+            if k not in ("report_version", "sources", "generated", "example_analyses")}
+
+
+def load_report(path: Path | str, gaze_path: Path | str, rec_path: Path | str) -> dict | None:
+    """The report at `path` if it was built from the scoring files as they are now, else None."""
+    path = Path(path)
+    if not path.exists():
+        return None
+    report = json.loads(path.read_text())
+    if report.get("report_version") != REPORT_VERSION:
+        return None
+    # compare stamps only: the same files may be named by different relative paths
+    if list(report.get("sources", {}).values()) != list(source_stamps(gaze_path, rec_path).values()):
+        return None
+    return report
+
+
+def write_report(report: dict, path: Path | str) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2))
+    return path
+
+
+def write_parquet(store: ScoringStore, analyses: ExampleAnalyses, path: Path | str) -> Path:
+    """One row per example: image_path, then per ranking gold_positions / gold_in_top3 / avg_distance / best_*."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("--parquet needs pyarrow (pip install pyarrow)")
+    texts = store.texts
+    cand_type = np.asarray(store.cand_type)
+    columns = {"image_path": pa.array(analyses.image_paths)}
+    offsets = pa.array(analyses.gold_offsets.astype(np.int32))
+    for name in RANKINGS:
+        best = analyses.best[name]
+        has = best >= 0
+        columns[f"gold_positions_{name}"] = pa.ListArray.from_arrays(
+            offsets, pa.array(analyses.gold_positions[name].astype(np.int32)))
+        columns[f"gold_in_top{TOP_K}_{name}"] = pa.array(analyses.gold_in_top[name])
+        columns[f"avg_distance_{name}"] = pa.array(analyses.avg_distances[name], from_pandas=True)
+        columns[f"best_{name}_text"] = pa.array([texts[c] if c >= 0 else None for c in best.tolist()])
+        columns[f"best_{name}_type"] = pa.array(
+            [CAND_TYPE_NAMES[t] if ok else None for t, ok in zip(cand_type[np.maximum(best, 0)].tolist(), has)])
+        columns[f"best_{name}_score"] = pa.array(
+            np.where(has, np.asarray(STORE_RANKINGS[name](store), dtype=np.float64)[np.maximum(best, 0)], np.nan),
+            from_pandas=True)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pq.write_table(pa.table(columns), path)
+    return path
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--gaze", default="output/gaze_scoring_results_new.json")
+    ap.add_argument("--rec", default="output/rec_scoring_results_new.json")
+    ap.add_argument("--store", default="output/scoring_store_new",
+                    help="columnar store directory (built from --gaze/--rec if missing)")
+    ap.add_argument("--out", default="output/eval_report_new.json")
+    ap.add_argument("--parquet", default=None, help="also write the per-example analyses as Parquet")
+    ap.add_argument("--cache", default=str(DEFAULT_METRIC_CACHE),
+                    help="per-example metric cache (see incremental.py), updated in place")
+    args = ap.parse_args()
+
+    if not is_store(args.store, args.gaze, args.rec):
+        build_store(args.gaze, args.rec, args.store)
+    store = ScoringStore(args.store)
+    analyses = analyze_examples(store)
+    report = build_report(store, args.gaze, args.rec, args.cache, analyses)
+    print(f"wrote {write_report(report, args.out)}")
+    if args.parquet:
+        print(f"wrote {write_parquet(store, analyses, args.parquet)}")
+    print(json.dumps(summary_of(report), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Vectorized gaze metrics over ragged (values + offsets) arrays.
+
+All gaze sequences are packed once into a single float array of valid
+fixations in pixel coordinates plus per-candidate offsets; every metric from
+analyses.ipynb is then computed for every candidate in one batched pass with
+`np.*.reduceat` segment reductions instead of per-point Python loops.
+
+Scores follow the notebook's conventions: lower is better, and a candidate
+without enough valid fixations scores `inf`. Packed fixations may carry dwell
+counts (`gaze_preprocess`): averages are then weighted by dwell and a
+collapsed fixation counts as the samples it stands for, so collapsing dwell
+runs leaves every metric unchanged.
+"""
+from typing import Iterable, NamedTuple
+
+import numpy as np
+
+from ragged import CAND_GOLD, RaggedPoints, pack_points, type_codes
+
+TARGET_SIZE = (512, 320)
+INPUT_SIZE = (100, 100)
+
+# Weights of the notebook's weighted_composite metric
+COMPOSITE_WEIGHTS = {
+    "final_dist": 0.4,
+    "avg_dist": 0.4,
+    "pct_in_bbox": 0.2,
+}
+
+METRICS = (
+    "final_dist_to_center",
+    "avg_dist_to_center",
+    "min_dist_to_center",
+    "path_length",
+    "pct_in_bbox",
+    "norm_path_length",
+    "weighted_composite",
+)
+
+
+class PackedGaze(NamedTuple):
+    """
+    points        (F, 2) float64  valid fixations, pixel coords, all candidates back to back
+    offsets       (C+1,) int64    candidate c owns points[offsets[c]:offsets[c+1]]
+    cand_offsets  (E+1,) int64    example e owns candidates cand_offsets[e]:cand_offsets[e+1]
+    bbox          (E, 4) float64  x0, y0, w, h in pixel coords
+    is_gold       (C,)   bool
+    dwell         (F,)   int32    samples per fixation, None = 1 each
+    """
+    points: np.ndarray
+    offsets: np.ndarray
+    cand_offsets: np.ndarray
+    bbox: np.ndarray
+    is_gold: np.ndarray
+    dwell: np.ndarray | None = None
+
+    @property
+    def n_examples(self) -> int:
+        return len(self.cand_offsets) - 1
+
+    @property
+    def n_candidates(self) -> int:
+        return len(self.offsets) - 1
+
+
+def _scale(input_size=INPUT_SIZE, target_size=TARGET_SIZE) -> np.ndarray:
+    return np.array([target_size[0] / input_size[0], target_size[1] / input_size[1]])
+
+
+def _pack(gaze: RaggedPoints, cand_offsets, bbox, is_gold, target_size) -> PackedGaze:
+    # Re-base the offsets onto the valid rows only
+    valid = np.asarray(gaze.valid, dtype=bool)
+    valid_before = np.concatenate([[0], np.cumsum(valid, dtype=np.int64)])
+    return PackedGaze(
+        points=np.asarray(gaze.points, dtype=np.float64)[valid] * _scale(target_size=target_size),
+        offsets=valid_before[np.asarray(gaze.offsets)],
+        cand_offsets=np.asarray(cand_offsets, dtype=np.int64),
+        bbox=np.asarray(bbox, dtype=np.float64).reshape(-1, 4),
+        is_gold=np.asarray(is_gold, dtype=bool),
+    )
+
+
+def pack_entries(entries: Iterable[dict], target_size=TARGET_SIZE) -> PackedGaze:
+    """
+    Pack raw scoring entries (bbox / candidates / gaze_sequences) in one pass.
+    Null or malformed fixations are dropped, as the notebook's `if p` filter does.
+    """
+    sequences: list = []
+    cand_offsets = [0]
+    bbox: list[list[float]] = []
+    types: list[np.ndarray] = []
+
+    for entry in entries:
+        bbox.append(entry["bbox"])
+        n = min(len(entry["candidates"]), len(entry["gaze_sequences"]))
+        sequences.extend(entry["gaze_sequences"][:n])
+        types.append(type_codes(entry["candidates"][:n]))
+        cand_offsets.append(len(sequences))
+
+    is_gold = np.concatenate(types) == CAND_GOLD if types else np.zeros(0, dtype=bool)
+    return _pack(pack_points(sequences), cand_offsets, bbox, is_gold, target_size)
+
+
+def pack_store(store, target_size=TARGET_SIZE) -> PackedGaze:
+    """Pack a `scoring_store.ScoringStore` without any per-point Python work."""
+    return _pack(store.gaze, store.cand_offsets, store.bbox, np.asarray(store.cand_type) == CAND_GOLD, target_size)
+
+
+def pack_fixations(fix, cand_offsets, bbox, is_gold, target_size=TARGET_SIZE) -> PackedGaze:
+    """Pack preprocessed `gaze_preprocess.Fixations`, keeping their dwell counts."""
+    return PackedGaze(
+        points=np.asarray(fix.points, dtype=np.float64) * _scale(target_size=target_size),
+        offsets=np.asarray(fix.offsets, dtype=np.int64),
+        cand_offsets=np.asarray(cand_offsets, dtype=np.int64),
+        bbox=np.asarray(bbox, dtype=np.float64).reshape(-1, 4),
+        is_gold=np.asarray(is_gold, dtype=bool),
+        dwell=np.asarray(fix.dwell),
+    )
+
+
+def _segment_reduce(ufunc: np.ufunc, values: np.ndarray, offsets: np.ndarray,
+                    empty: float) -> np.ndarray:
+    """ufunc.reduceat over each [offsets[c], offsets[c+1]) segment, `empty` for empty ones."""
+    counts = np.diff(offsets)
+    out = np.full(len(counts), empty, dtype=np.float64)
+    nonempty = counts > 0
+    if nonempty.any():
+        out[nonempty] = ufunc.reduceat(values, offsets[:-1][nonempty])
+    return out
+
+
+def compute_all(packed: PackedGaze, weights: dict[str, float] = COMPOSITE_WEIGHTS) -> dict[str, np.ndarray]:
+    """Every metric in `METRICS` for every candidate, as (C,) float arrays."""
+    pts, offsets = packed.points, packed.offsets
+    n_cands = packed.n_candidates
+    counts = np.diff(offsets)
+    has_pts = counts > 0
+    # Samples per candidate: rows, or the dwell they stand for
+    if packed.dwell is None:
+        weight, samples = None, counts
+    else:
+        weight = packed.dwell.astype(np.float64)
+        samples = _segment_reduce(np.add, weight, offsets, 0.0)
+    has_path = samples >= 2
+
+    # Candidate / example id of each point
+    cand_example = np.repeat(np.arange(packed.n_examples), np.diff(packed.cand_offsets))
+    point_cand = np.repeat(np.arange(n_cands), counts)
+    x0, y0, w, h = packed.bbox.T
+    centers = np.stack([x0 + w / 2, y0 + h / 2], axis=1)
+    point_center = centers[cand_example[point_cand]]
+
+    # Distances to the bbox center
+    d_center = np.hypot(*(pts - point_center).T)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weighted_d = d_center if weight is None else d_center * weight
+        avg_d = _segment_reduce(np.add, weighted_d, offsets, np.inf) / np.where(has_pts, samples, 1)
+    avg_d[~has_pts] = np.inf
+    min_d = _segment_reduce(np.minimum, d_center, offsets, np.inf)
+    final_d = np.full(n_cands, np.inf)
+    final_d[has_pts] = d_center[offsets[1:][has_pts] - 1]
+
+    # Path length: step i joins point i-1 and i, zeroed where a new candidate starts
+    steps = np.zeros(len(pts))
+    if len(pts) > 1:
+        same = point_cand[1:] == point_cand[:-1]
+        steps[1:] = np.where(same, np.hypot(*np.diff(pts, axis=0).T), 0.0)
+    total = _segment_reduce(np.add, steps, offsets, 0.0)
+    path_len = np.where(has_path, total, np.inf)
+
+    first = pts[offsets[:-1][has_path]]
+    last = pts[offsets[1:][has_path] - 1]
+    net = np.hypot(*(last - first).T)
+    norm_path = np.full(n_cands, np.inf)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        norm_path[has_path] = np.where(net > 0, total[has_path] / net, np.inf)
+
+    # Fraction of fixations inside the bbox (inclusive edges)
+    px, py = pts.T
+    bx0, by0, bw, bh = packed.bbox[cand_example[point_cand]].T
+    inside = ((bx0 <= px) & (px <= bx0 + bw) & (by0 <= py) & (py <= by0 + bh)).astype(np.float64)
+    if weight is not None:
+        inside *= weight
+    pct_in = _segment_reduce(np.add, inside, offsets, 0.0) / np.maximum(samples, 1)
+    neg_pct = np.where(has_pts, -pct_in, np.inf)
+
+    composite = (
+        weights["final_dist"] * final_d +
+        weights["avg_dist"] * avg_d -
+        weights["pct_in_bbox"] * pct_in  # subtract: higher pct is better
+    )
+
+    return {
+        "final_dist_to_center": final_d,
+        "avg_dist_to_center":   avg_d,
+        "min_dist_to_center":   min_d,
+        "path_length":          path_len,
+        "pct_in_bbox":          neg_pct,
+        "norm_path_length":     norm_path,
+        "weighted_composite":   composite,
+    }
@@ -0,0 +1,140 @@
+"""
+Bulk preprocessing of gaze sequences: nulls out, dwell runs collapsed, paths
+optionally simplified.
+
+Recorded sequences repeat the same fixation for as long as the eye dwells on
+it (`[30.4, 46.4]` several times in a row) and interleave nulls. All stages
+work on the whole `ragged.RaggedPoints` table at once — boolean masks,
+`cumsum` run ids and `reduceat` segment sums, no per-sequence Python loop —
+and produce `Fixations`: the remaining points plus a dwell count per point,
+so the samples they stand for are never lost.
+
+  drop_nulls       valid rows only, dwell 1
+  collapse_dwell   consecutive fixations of a sequence closer than `eps` to
+                   the previous one (identical ones with the default 0) merge
+                   into one at their dwell-weighted mean, dwell summed
+  simplify_rdp     Ramer–Douglas–Peucker with `tolerance` (0–100 units),
+                   every recursion level of every sequence in one pass; a
+                   dropped point's dwell moves to the kept point before it
+
+With dwell weights the gaze metrics (`gaze_metrics.compute_all`) and the
+distance / in-bbox averages are unchanged by `collapse_dwell(eps=0)`; RDP is
+lossy by design (it keeps the path's shape, not every point).
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from ragged import RaggedPoints
+
+
+class Fixations(NamedTuple):
+    """
+    points   (F, 2) float32  valid fixations of all sequences back to back, 0–100 coords
+    offsets  (C+1,) int64    sequence c owns points[offsets[c]:offsets[c+1]]
+    dwell    (F,)   int32    raw samples each fixation stands for
+    """
+    points: np.ndarray
+    offsets: np.ndarray
+    dwell: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def sequence(self, c: int) -> tuple[np.ndarray, np.ndarray]:
+        """(points, dwell) of sequence `c`."""
+        a, b = int(self.offsets[c]), int(self.offsets[c + 1])
+        return self.points[a:b], self.dwell[a:b]
+
+    def point_sequence(self) -> np.ndarray:
+        """(F,) sequence index of every point."""
+        return np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.offsets))
+
+
+def _rebase(offsets: np.ndarray, keep: np.ndarray) -> np.ndarray:
+    """Offsets after keeping only the rows in `keep`."""
+    kept_before = np.concatenate([[0], np.cumsum(keep, dtype=np.int64)])
+    return kept_before[offsets]
+
+
+def drop_nulls(gaze: RaggedPoints) -> Fixations:
+    valid = np.asarray(gaze.valid, dtype=bool)
+    return Fixations(
+        points=np.asarray(gaze.points, dtype=np.float32)[valid],
+        offsets=_rebase(np.asarray(gaze.offsets, dtype=np.int64), valid),
+        dwell=np.ones(int(valid.sum()), dtype=np.int32),
+    )
+
+
+def collapse_dwell(fix: Fixations, eps: float = 0.0) -> Fixations:
+    """Merge runs of consecutive fixations within `eps` of their predecessor (same sequence only)."""
+    n = len(fix.points)
+    if n == 0:
+        return fix
+    seq = fix.point_sequence()
+    step = np.hypot(*np.diff(fix.points.astype(np.float64), axis=0).T)
+    starts = np.ones(n, dtype=bool)
+    starts[1:] = (seq[1:] != seq[:-1]) | (step > eps)
+    run_starts = np.flatnonzero(starts)
+
+    dwell = np.add.reduceat(fix.dwell.astype(np.int64), run_starts)
+    weighted = fix.points.astype(np.float64) * fix.dwell[:, None]
+    points = np.add.reduceat(weighted, run_starts, axis=0) / dwell[:, None]
+    return Fixations(points.astype(np.float32), _rebase(fix.offsets, starts), dwell.astype(np.int32))
+
+
+def simplify_rdp(fix: Fixations, tolerance: float) -> Fixations:
+    """Ramer–Douglas–Peucker on every sequence at once; endpoints are always kept."""
+    n = len(fix.points)
+    if n == 0 or tolerance <= 0:
+        return fix
+    pts = fix.points.astype(np.float64)
+    first, last = fix.offsets[:-1], fix.offsets[1:] - 1
+    nonempty = last >= first
+    keep = np.zeros(n, dtype=bool)
+    keep[first[nonempty]] = True
+    keep[last[nonempty]] = True
+
+    # Open segments (s, e): the points strictly between them are undecided
+    s, e = first[nonempty], last[nonempty]
+    while True:
+        open_ = e - s > 1
+        s, e = s[open_], e[open_]
+        if not len(s):
+            break
+        inner = e - s - 1
+        seg = np.repeat(np.arange(len(s)), inner)
+        seg_starts = np.concatenate([[0], np.cumsum(inner)[:-1]])
+        idx = np.arange(len(seg)) - seg_starts[seg] + s[seg] + 1
+
+        a, b = pts[s][seg], pts[e][seg]
+        ab = b - a
+        ap = pts[idx] - a
+        norm = np.hypot(*ab.T)
+        cross = np.abs(ab[:, 0] * ap[:, 1] - ab[:, 1] * ap[:, 0])
+        dist = np.where(norm > 0, cross / np.where(norm > 0, norm, 1.0), np.hypot(*ap.T))
+
+        peak = np.maximum.reduceat(dist, seg_starts)
+        # first point reaching the segment's maximum
+        at_peak = np.flatnonzero(dist == peak[seg])
+        _, first_hit = np.unique(seg[at_peak], return_index=True)
+        split = idx[at_peak[first_hit]]
+        far = peak > tolerance
+        keep[split[far]] = True
+        s, e = np.concatenate([s[far], split[far]]), np.concatenate([split[far], e[far]])
+
+    # Dropped points' dwell goes to the kept point before them (never across sequences:
+    # every sequence starts with a kept point)
+    owner = np.cumsum(keep) - 1
+    dwell = np.bincount(owner, weights=fix.dwell, minlength=int(keep.sum())).astype(np.int32)
+    return Fixations(fix.points[keep], _rebase(fix.offsets, keep), dwell)
+
+
+def preprocess(gaze: RaggedPoints, dwell_eps: float | None = 0.0, rdp_tolerance: float = 0.0) -> Fixations:
+    """drop_nulls → collapse_dwell (skipped for `dwell_eps=None`) → simplify_rdp (if tolerance > 0)."""
+    fix = drop_nulls(gaze)
+    if dwell_eps is not None:
+        fix = collapse_dwell(fix, dwell_eps)
+    if rdp_tolerance > 0:
+        fix = simplify_rdp(fix, rdp_tolerance)
+    return fix
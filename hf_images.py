@@ -0,0 +1,98 @@
+"""
+Lazy, on-demand access to the images of a Hugging Face dataset split.
+
+Instead of decoding every example up front, `HFImageSource` keeps a
+`file_name -> row` index (built once from the file_name column only and
+persisted next to the outputs) and decodes an image the first time it is
+asked for, keeping the most recent ones in a bounded LRU.
+
+`datasets` (and the pyarrow / fsspec stack behind it) is imported and the
+split loaded only when the first image is decoded; until then membership
+and length are answered from the persisted index, which is re-validated
+against the dataset fingerprint once the split is loaded.
+"""
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from PIL import Image
+
+DEFAULT_MAX_IMAGES = 64
+
+
+def build_file_index(ds) -> dict[str, int]:
+    """file_name -> row position, read from the file_name column alone (no image decode)."""
+    names = ds.select_columns(["file_name"])["file_name"]
+    return {name: row for row, name in enumerate(names)}
+
+
+def read_file_index(index_path: Path) -> dict | None:
+    """The persisted {"fingerprint", "rows"} index, or None if there is none yet."""
+    return json.loads(index_path.read_text()) if index_path.exists() else None
+
+
+def load_file_index(ds, index_path: Path) -> dict[str, int]:
+    """Persisted index for `ds`, rebuilt when the dataset fingerprint changes."""
+    fingerprint = getattr(ds, "_fingerprint", None)
+    cached = read_file_index(index_path)
+    if cached is not None and cached.get("fingerprint") == fingerprint:
+        return cached["rows"]
+    rows = build_file_index(ds)
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    index_path.write_text(json.dumps({"fingerprint": fingerprint, "rows": rows}))
+    return rows
+
+
+class HFImageSource:
+    """Mapping-like `file_name -> RGB image` over a dataset split, decoded on demand."""
+
+    def __init__(self, dataset: str, split: str, index_path: Path,
+                 max_images: int = DEFAULT_MAX_IMAGES):
+        self.dataset = dataset
+        self.split = split
+        self.index_path = index_path
+        self.max_images = max_images
+        self._ds = None
+        cached = read_file_index(index_path)
+        self._rows: dict[str, int] | None = cached["rows"] if cached is not None else None
+        self._decoded: OrderedDict[str, Image.Image] = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    @property
+    def ds(self):
+        """The dataset split, loaded (and the index re-validated) on first use."""
+        if self._ds is None:
+            with self._load_lock:
+                if self._ds is None:
+                    from datasets import load_dataset
+                    ds = load_dataset(self.dataset, split=self.split)
+                    self._rows = load_file_index(ds, self.index_path)
+                    self._ds = ds
+        return self._ds
+
+    @property
+    def rows(self) -> dict[str, int]:
+        if self._rows is None:
+            self.ds  # no persisted index yet: load the split to build it
+        return self._rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __contains__(self, file_name: str) -> bool:
+        return file_name in self.rows
+
+    def __getitem__(self, file_name: str) -> Image.Image:
+        with self._lock:
+            img = self._decoded.get(file_name)
+            if img is not None:
+                self._decoded.move_to_end(file_name)
+                return img
+        img = self.ds[self.rows[file_name]]["image"].convert("RGB")
+        with self._lock:
+            self._decoded[file_name] = img
+            while len(self._decoded) > self.max_images:
+                self._decoded.popitem(last=False)
+        return img
@@ -0,0 +1,191 @@
+"""
+Incremental evaluation of a growing scoring run.
+
+Each merged gaze/REC entry is hashed; its per-example partial aggregates
+(parallel_eval.partial_aggregate for rec / gaze / combined) are persisted
+together with that hash. A re-run re-hashes the stream but only recomputes
+examples that are new or whose content changed, and updates the running
+totals by subtracting the old partial and adding the new one, so appending
+2% more data costs ~2% of a full evaluation. Only the integer counts are
+updated that way; the float sums (example means, reciprocal ranks) are
+re-added exactly from the cached per-example values, because a gaze score
+is inf for candidates without gaze data (inf - inf would poison the total)
+and repeated float updates drift.
+
+Usage:
+    python incremental.py [--gaze G.json] [--rec R.json] [--cache DIR]
+"""
+import argparse
+import hashlib
+import json
+import math
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+from parallel_eval import (
+    finalize, merge_partials, partial_aggregate, subtract_partials, word_counts,
+)
+from ranking_eval import DEFAULT_KS, flatten_summary
+from scoring_stream import iter_merged
+
+CACHE_VERSION = 1
+RANKINGS = ("rec", "gaze", "combined")
+# Float fields of a partial, summed exactly over the cached examples instead of updated in place
+EXACT_SUMS = ("mean_sum", "rr_sum")
+
+
+def example_hash(entry: dict) -> str:
+    return hashlib.sha1(json.dumps(entry, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def example_partials(entry: dict, ks: tuple[int, ...]) -> dict[str, dict]:
+    """Partial aggregates of one merged entry for every ranking."""
+    gaze = np.asarray(entry["gaze_distances"], dtype=np.float64)
+    rec = np.asarray(entry["rec_distances"], dtype=np.float64)
+    scores = {"rec": rec, "gaze": gaze, "combined": gaze + rec}
+    offsets = np.array([0, len(gaze)], dtype=np.int64)
+    is_gold = np.array([c["type"] == "gold" for c in entry["candidates"]], dtype=bool)
+    lengths = word_counts(c["text"] for c in entry["candidates"])
+    return {name: partial_aggregate(scores[name], offsets, is_gold, lengths, ks) for name in RANKINGS}
+
+
+def empty_partial(ks: tuple[int, ...]) -> dict:
+    return {
+        "n_examples": 0, "hits": np.zeros(len(ks), dtype=np.int64), "gold_rank_sum": 0,
+        "n_gold": 0, "rr_sum": 0.0, "mean_sum": 0.0, "n_nonempty": 0, "top1_len_sum": 0,
+        "n_top1": 0, "short_in_top3": 0, "total_top3": 0,
+        "len_rank": np.zeros((1, 1), dtype=np.int64),
+    }
+
+
+def _to_json(partial: dict) -> dict:
+    out = {k: (v.tolist() if k == "hits" else v) for k, v in partial.items() if k != "len_rank"}
+    lr = partial["len_rank"]
+    nz = np.nonzero(lr)
+    out["len_rank"] = [list(map(int, t)) for t in zip(nz[0], nz[1], lr[nz])]
+    return out
+
+
+def _from_json(data: dict) -> dict:
+    out = {k: v for k, v in data.items() if k != "len_rank"}
+    out["hits"] = np.asarray(data["hits"], dtype=np.int64)
+    triples = np.asarray(data["len_rank"], dtype=np.int64).reshape(-1, 3)
+    shape = (int(triples[:, 0].max(initial=0)) + 1, int(triples[:, 1].max(initial=0)) + 1)
+    lr = np.zeros(shape, dtype=np.int64)
+    lr[triples[:, 0], triples[:, 1]] = triples[:, 2]
+    out["len_rank"] = lr
+    return out
+
+
+class IncrementalEvaluator:
+    """
+    Persistent per-example metric cache in `cache_dir`:
+      examples.jsonl  one {"key", "hash", "partials"} record per example
+      totals.json     merged partials for every ranking, plus the ks they were built for
+    """
+
+    def __init__(self, cache_dir: Path | str, ks: Iterable[int] = DEFAULT_KS):
+        self.cache_dir = Path(cache_dir)
+        self.ks = tuple(ks)
+        self.records: dict[str, dict] = {}
+        self.totals = {name: empty_partial(self.ks) for name in RANKINGS}
+
+        totals_path = self.cache_dir / "totals.json"
+        examples_path = self.cache_dir / "examples.jsonl"
+        # Both files or neither (e.g. an interrupted first save): otherwise start cold
+        if totals_path.exists() and examples_path.exists():
+            meta = json.loads(totals_path.read_text())
+            if meta.get("version") == CACHE_VERSION and tuple(meta["ks"]) == self.ks:
+                self.totals = {name: _from_json(p) for name, p in meta["totals"].items()}
+                with open(examples_path) as f:
+                    for line in f:
+                        rec = json.loads(line)
+                        self.records[rec["key"]] = rec
+
+    def update(self, entries: Iterable[dict]) -> dict[str, int]:
+        """
+        Bring the cache in line with `entries` (the full current run).
+        Returns how many examples were added / modified / removed / unchanged.
+        """
+        stats = {"added": 0, "modified": 0, "removed": 0, "unchanged": 0}
+        seen: dict[str, int] = {}
+        fresh: dict[str, dict] = {}
+        for entry in entries:
+            # image_path identifies an example; repeats get an occurrence suffix
+            n = seen.get(entry["image_path"], 0)
+            seen[entry["image_path"]] = n + 1
+            key = entry["image_path"] if n == 0 else f"{entry['image_path']}#{n}"
+
+            h = example_hash(entry)
+            old = self.records.get(key)
+            if old is not None and old["hash"] == h:
+                fresh[key] = old
+                stats["unchanged"] += 1
+                continue
+
+            partials = example_partials(entry, self.ks)
+            for name in RANKINGS:
+                if old is not None:
+                    self.totals[name] = subtract_partials(self.totals[name], _from_json(old["partials"][name]))
+                self.totals[name] = merge_partials(self.totals[name], partials[name])
+            fresh[key] = {"key": key, "hash": h, "partials": {k: _to_json(p) for k, p in partials.items()}}
+            stats["modified" if old is not None else "added"] += 1
+
+        for key, old in self.records.items():
+            if key not in fresh:
+                for name in RANKINGS:
+                    self.totals[name] = subtract_partials(self.totals[name], _from_json(old["partials"][name]))
+                stats["removed"] += 1
+
+        self.records = fresh
+        for name in RANKINGS:
+            for field in EXACT_SUMS:
+                self.totals[name][field] = math.fsum(r["partials"][name][field] for r in fresh.values())
+        return stats
+
+    def save(self) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_dir / "examples.jsonl", "w") as f:
+            for rec in self.records.values():
+                f.write(json.dumps(rec) + "\n")
+        (self.cache_dir / "totals.json").write_text(json.dumps({
+            "version": CACHE_VERSION,
+            "ks": list(self.ks),
+            "totals": {name: _to_json(p) for name, p in self.totals.items()},
+        }))
+
+    def report(self) -> dict[str, float]:
+        """Same flat layout as parallel_eval.store_report."""
+        results = {name: finalize(self.totals[name], self.ks) for name in RANKINGS}
+        flat = flatten_summary(results, self.totals["rec"]["n_examples"], self.ks)
+        for stat in ("avg_ref_length_at_top", "length_rank_corr", "pct_short_refs_in_top3"):
+            for name, res in results.items():
+                flat[f"{stat}_{name}"] = res[stat]
+        return flat
+
+
+def refresh(gaze_path: Path | str, rec_path: Path | str, cache_dir: Path | str,
+            ks: Iterable[int] = DEFAULT_KS) -> tuple[dict[str, float], dict[str, int]]:
+    """Update the cache from the current scoring files; returns (report, change stats)."""
+    evaluator = IncrementalEvaluator(cache_dir, ks)
+    stats = evaluator.update(iter_merged(gaze_path, rec_path))
+    if stats["added"] or stats["modified"] or stats["removed"]:
+        evaluator.save()
+    return evaluator.report(), stats
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--gaze", default="output/gaze_scoring_results_new.json")
+    ap.add_argument("--rec", default="output/rec_scoring_results_new.json")
+    ap.add_argument("--cache", default="output/metric_cache_new")
+    args = ap.parse_args()
+
+    report, stats = refresh(args.gaze, args.rec, args.cache)
+    print(json.dumps({"changes": stats, "report": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Opt-in timing instrumentation for the Streamlit apps.
+
+Wrap hot spots in `timer("draw:gaze")` (or decorate with `@timed(...)`) and
+bump `count(...)` for cache hits and the like. Nothing is recorded unless
+the current rerun called `start_run(enabled=True)`: a disabled `timer` is a
+shared no-op context manager, so instrumented code costs one thread-local
+lookup per call.
+
+Per-rerun numbers feed the sidebar breakdown (`finish_run`); every enabled
+rerun is also folded into process-wide totals that `dump_stats` writes as
+JSON. `start_profile` / `stop_profile` wrap a whole rerun in cProfile and
+write a .pstats file for `python -m pstats` or snakeviz.
+
+Set RERANK_PROFILE=1 to have the sidebar switch default to on.
+"""
+import cProfile
+import contextlib
+import json
+import os
+import threading
+import time
+from functools import wraps
+from pathlib import Path
+
+ENABLED_BY_DEFAULT = os.environ.get("RERANK_PROFILE", "") not in ("", "0")
+PROFILE_DIR = Path("output/profile")
+
+_NULL = contextlib.nullcontext()
+_local = threading.local()  # Streamlit serves each session's rerun on its own thread
+_totals: dict[str, list] = {}
+_totals_lock = threading.Lock()
+
+
+class _Timer:
+    __slots__ = ("stats", "name", "t0")
+
+    def __init__(self, stats: dict, name: str):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        entry = self.stats.setdefault(self.name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += time.perf_counter() - self.t0
+        return False
+
+
+def start_run(enabled: bool) -> None:
+    """Begin a rerun's stats on this thread (discarding the previous rerun's)."""
+    _local.stats = {} if enabled else None
+
+
+def enabled() -> bool:
+    return getattr(_local, "stats", None) is not None
+
+
+def timer(name: str):
+    """Context manager adding the block's wall time to `name` (no-op when disabled)."""
+    stats = getattr(_local, "stats", None)
+    return _NULL if stats is None else _Timer(stats, name)
+
+
+def timed(name: str):
+    """Decorator form of `timer`."""
+    def wrap(fn):
+        @wraps(fn)
+        def inner(*args, **kwargs):
+            with timer(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def count(name: str, n: int = 1) -> None:
+    """Counter without a duration (cache hits, items rendered, ...)."""
+    stats = getattr(_local, "stats", None)
+    if stats is not None:
+        stats.setdefault(name, [0, 0.0])[0] += n
+
+
+def finish_run() -> list[dict]:
+    """End this thread's rerun: fold it into the cumulative totals and return it, slowest first."""
+    stats = getattr(_local, "stats", None) or {}
+    _local.stats = None
+    with _totals_lock:
+        for name, (calls, total) in stats.items():
+            entry = _totals.setdefault(name, [0, 0.0, 0])
+            entry[0] += calls
+            entry[1] += total
+            entry[2] += 1
+    return sorted(
+        ({"name": name, "calls": calls, "total_ms": round(total * 1000, 3),
+          "mean_ms": round(total * 1000 / calls, 3) if total else 0.0}
+         for name, (calls, total) in stats.items()),
+        key=lambda r: -r["total_ms"],
+    )
+
+
+def cumulative_stats() -> dict[str, dict]:
+    with _totals_lock:
+        return {
+            name: {"calls": calls, "total_s": total, "reruns": reruns}
+            for name, (calls, total, reruns) in _totals.items()
+        }
+
+
+def dump_stats(path: Path | str | None = None) -> Path:
+    """Write the process-wide totals as JSON (default output/profile/stats_<time>.json)."""
+    path = Path(path or PROFILE_DIR / f"stats_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(cumulative_stats(), indent=2))
+    return path
+
+
+def start_profile() -> cProfile.Profile:
+    # A rerun cut short by st.stop() never reaches stop_profile; don't leave it running
+    stale = getattr(_local, "profiler", None)
+    if stale is not None:
+        stale.disable()
+    profiler = _local.profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def stop_profile(profiler: cProfile.Profile, path: Path | str | None = None) -> Path:
+    """Stop `profiler` and write its .pstats file (default output/profile/rerun_<time>.pstats)."""
+    profiler.disable()
+    _local.profiler = None
+    path = Path(path or PROFILE_DIR / f"rerun_{time.strftime('%Y%m%d_%H%M%S')}.pstats")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(str(path))
+    return path
@@ -0,0 +1,173 @@
+"""
+Persisted search index over candidate texts, for jumping between examples.
+
+`build_search_index` tokenizes every candidate text of a `ScoringStore` once
+and writes an inverted index (token -> sorted example ids) next to the store.
+`SearchIndex` memory-maps it and answers substring queries by scanning the
+(small) vocabulary and intersecting posting lists; when a query token matches
+nothing it falls back to fuzzy matching against the vocabulary. The fuzzy
+fallback first drops every token whose `difflib` quick ratio (an upper bound
+of the real ratio, computed here from per-token character counts) is below
+the cutoff, so `difflib` only scores the few plausible tokens and returns
+exactly what it would have returned over the whole vocabulary.
+"""
+import difflib
+import json
+import re
+from pathlib import Path
+
+import numpy as np
+
+from scoring_store import ScoringStore, _StringColumn
+
+INDEX_VERSION = 1
+_TOKEN = re.compile(r"\w+")
+# Character classes of the fuzzy prefilter: a-z, 0-9, _ and one bucket for everything else
+_CHAR_CLASS = np.full(128, 37, dtype=np.int64)
+for _i, _c in enumerate("abcdefghijklmnopqrstuvwxyz0123456789_"):
+    _CHAR_CLASS[ord(_c)] = _i
+N_CHAR_CLASSES = 38
+
+
+def char_classes(text: str) -> np.ndarray:
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    return _CHAR_CLASS[np.minimum(codes, 127)]
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def build_search_index(store: ScoringStore, out_dir: Path | str | None = None) -> Path:
+    """Write the inverted index for `store` (default: <store>/search)."""
+    out_dir = Path(out_dir) if out_dir else store.root / "search"
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    vocab: dict[str, int] = {}
+    token_ids: list[int] = []
+    example_ids: list[int] = []
+    # Candidate texts are interned, so each distinct text is tokenized once
+    text_tokens = [tokenize(t) for t in store.texts.unique()]
+    text_ids = np.asarray(store.texts.ids).tolist()
+    for e in range(len(store)):
+        c0, c1 = store.candidate_range(e)
+        tokens = set()
+        for c in range(c0, c1):
+            tokens.update(text_tokens[text_ids[c]])
+        for tok in tokens:
+            token_ids.append(vocab.setdefault(tok, len(vocab)))
+            example_ids.append(e)
+
+    # Postings grouped by token, example ids ascending within each token
+    token_ids_arr = np.asarray(token_ids, dtype=np.int64)
+    example_ids_arr = np.asarray(example_ids, dtype=np.int64)
+    order = np.lexsort((example_ids_arr, token_ids_arr))
+    postings = example_ids_arr[order].astype(np.int32)
+    post_offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(token_ids_arr, minlength=len(vocab)), out=post_offsets[1:])
+
+    encoded = [tok.encode("utf-8") for tok in vocab]
+    vocab_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=vocab_offsets[1:])
+
+    columns = {
+        "postings":      postings,
+        "post_offsets":  post_offsets,
+        "vocab.bytes":   np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        "vocab.offsets": vocab_offsets,
+    }
+    schema = {}
+    for name, arr in columns.items():
+        arr.tofile(out_dir / f"{name}.bin")
+        schema[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape)}
+    meta = {
+        "version": INDEX_VERSION,
+        "store": store.fingerprint(),
+        "n_examples": len(store),
+        "n_tokens": len(vocab),
+        "columns": schema,
+    }
+    (out_dir / "meta.json").write_text(json.dumps(meta, indent=2))
+    return out_dir
+
+
+class SearchIndex:
+    """Read side of `build_search_index`."""
+
+    def __init__(self, root: Path | str):
+        self.root = Path(root)
+        self.meta = json.loads((self.root / "meta.json").read_text())
+        if self.meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"{self.root}: search index version mismatch, rebuild it")
+        cols = {}
+        for name, spec in self.meta["columns"].items():
+            shape = tuple(spec["shape"])
+            cols[name] = (np.empty(shape, dtype=spec["dtype"]) if 0 in shape else
+                          np.memmap(self.root / f"{name}.bin", dtype=spec["dtype"], mode="r", shape=shape))
+        self.postings = cols["postings"]
+        self.post_offsets = cols["post_offsets"]
+        # The vocabulary is scanned on every query, so keep it decoded
+        self.vocab = _StringColumn(cols["vocab.bytes"], cols["vocab.offsets"]).tolist()
+        self._char_counts: np.ndarray | None = None
+
+    def _fuzzy_tables(self) -> tuple[np.ndarray, np.ndarray]:
+        """(token lengths, (V, N_CHAR_CLASSES) character counts), built on the first fuzzy query."""
+        if self._char_counts is None:
+            lengths = np.fromiter(map(len, self.vocab), dtype=np.int64, count=len(self.vocab))
+            rows = np.repeat(np.arange(len(self.vocab)), lengths)
+            flat = rows * N_CHAR_CLASSES + char_classes("".join(self.vocab))
+            counts = np.bincount(flat, minlength=len(self.vocab) * N_CHAR_CLASSES)
+            self._lengths = lengths
+            self._char_counts = counts.reshape(len(self.vocab), N_CHAR_CLASSES).astype(np.int32)
+        return self._lengths, self._char_counts
+
+    def fuzzy_candidates(self, query_token: str, cutoff: float) -> np.ndarray:
+        """
+        Vocabulary ids that can reach `cutoff` in `difflib.get_close_matches`.
+        The shared-character count per class bounds difflib's quick_ratio from
+        above (the catch-all class merges characters, which only over-counts),
+        and quick_ratio bounds the real ratio, so no match is ever dropped.
+        """
+        lengths, counts = self._fuzzy_tables()
+        q = np.bincount(char_classes(query_token), minlength=N_CHAR_CLASSES)
+        present = np.flatnonzero(q)
+        shared = np.minimum(counts[:, present], q[present]).sum(axis=1)
+        # Same float expression as difflib's _calculate_ratio
+        upper = 2.0 * shared / (lengths + len(query_token))
+        return np.flatnonzero(upper >= cutoff)
+
+    def _examples_for(self, token_ids: list[int]) -> np.ndarray:
+        parts = [self.postings[self.post_offsets[t]:self.post_offsets[t + 1]] for t in token_ids]
+        if not parts:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate(parts))
+
+    def match_tokens(self, query_token: str, fuzzy_cutoff: float = 0.75) -> list[int]:
+        """Vocabulary ids containing `query_token`, else its closest fuzzy matches."""
+        ids = [i for i, tok in enumerate(self.vocab) if query_token in tok]
+        if not ids and fuzzy_cutoff:
+            survivors = {self.vocab[i]: i for i in self.fuzzy_candidates(query_token, fuzzy_cutoff).tolist()}
+            close = difflib.get_close_matches(query_token, list(survivors), n=5, cutoff=fuzzy_cutoff)
+            ids = sorted(survivors[tok] for tok in close)
+        return ids
+
+    def search(self, query: str, limit: int | None = None) -> np.ndarray:
+        """Example ids whose candidates contain every query token (ascending)."""
+        result = None
+        for qt in tokenize(query):
+            hits = self._examples_for(self.match_tokens(qt))
+            result = hits if result is None else np.intersect1d(result, hits, assume_unique=True)
+            if not len(result):
+                break
+        if result is None:
+            result = np.arange(self.meta["n_examples"])
+        return result[:limit] if limit else result
+
+
+def open_search_index(store: ScoringStore) -> SearchIndex:
+    """Search index stored alongside `store`, (re)built when missing or stale."""
+    root = store.root / "search"
+    meta_path = root / "meta.json"
+    if not meta_path.exists() or json.loads(meta_path.read_text()).get("store") != store.fingerprint():
+        build_search_index(store, root)
+    return SearchIndex(root)
@@ -0,0 +1,287 @@
+"""
+Sharded evaluation across CPU cores.
+
+Examples are split into contiguous shards and scored by a process pool. The
+input arrays (candidate table, score columns, packed gaze points) are placed
+in `multiprocessing.shared_memory` once and attached by each worker, so
+nothing proportional to the data is pickled per task. Each shard returns a
+small partial aggregate; partials merge exactly, including the Spearman
+length/rank correlation, which is rebuilt from a (length × rank) count table
+instead of the full `lengths` / `ranks` lists.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from typing import Iterable
+
+import numpy as np
+
+from gaze_metrics import PackedGaze, compute_all
+from ragged import CAND_GOLD
+from ranking_eval import DEFAULT_KS, STORE_RANKINGS, candidate_ranks, flatten_summary
+
+# Below this many examples a pool costs more than it saves
+MIN_PARALLEL_EXAMPLES = 20_000
+SHORT_REF_WORDS = 3
+
+
+def word_counts(texts: Iterable[str]) -> np.ndarray:
+    """Whitespace word count of every candidate text."""
+    return np.fromiter((len(t.split()) for t in texts), dtype=np.int64)
+
+
+# ─── Mergeable partial aggregates ──────────────────────────────────────────────
+def partial_aggregate(
+    scores: np.ndarray,
+    cand_offsets: np.ndarray,
+    is_gold: np.ndarray,
+    lengths: np.ndarray,
+    ks: tuple[int, ...],
+) -> dict:
+    """Sums and counts for one ranking over one shard."""
+    n_examples = len(cand_offsets) - 1
+    counts = np.diff(cand_offsets)
+    ranks = candidate_ranks(scores, cand_offsets)
+    example = np.repeat(np.arange(n_examples), counts)
+
+    best_gold = np.full(n_examples, np.iinfo(np.int64).max)
+    np.minimum.at(best_gold, example[is_gold], ranks[is_gold])
+    has_gold = best_gold != np.iinfo(np.int64).max
+
+    nonempty = counts > 0
+    example_means = np.add.reduceat(scores, cand_offsets[:-1][nonempty]) / counts[nonempty] \
+        if nonempty.any() else np.zeros(0)
+
+    top3 = ranks <= 3
+    len_rank = np.zeros((int(lengths.max(initial=0)) + 1, int(ranks.max(initial=0)) + 1), dtype=np.int64)
+    np.add.at(len_rank, (lengths, ranks), 1)
+
+    return {
+        "n_examples":    n_examples,
+        "hits":          np.array([int((has_gold & (best_gold <= k)).sum()) for k in ks]),
+        "gold_rank_sum": int(ranks[is_gold].sum()),
+        "n_gold":        int(is_gold.sum()),
+        "rr_sum":        float((1.0 / best_gold[has_gold]).sum()),
+        "mean_sum":      float(example_means.sum()),
+        "n_nonempty":    int(nonempty.sum()),
+        "top1_len_sum":  int(lengths[ranks == 1].sum()),
+        "n_top1":        int((ranks == 1).sum()),
+        "short_in_top3": int((top3 & (lengths <= SHORT_REF_WORDS)).sum()),
+        "total_top3":    int(top3.sum()),
+        "len_rank":      len_rank,
+    }
+
+
+def _pad_add(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    shape = tuple(max(x, y) for x, y in zip(a.shape, b.shape))
+    out = np.zeros(shape, dtype=a.dtype)
+    out[:a.shape[0], :a.shape[1]] += a
+    out[:b.shape[0], :b.shape[1]] += b
+    return out
+
+
+def merge_partials(a: dict, b: dict) -> dict:
+    out = {key: a[key] + b[key] for key in a if key != "len_rank"}
+    out["len_rank"] = _pad_add(a["len_rank"], b["len_rank"])
+    return out
+
+
+def subtract_partials(a: dict, b: dict) -> dict:
+    """Inverse of `merge_partials`: remove `b`'s contribution from `a`."""
+    neg = {key: -b[key] for key in b}
+    return merge_partials(a, neg)
+
+
+def spearman_from_counts(table: np.ndarray) -> float:
+    """
+    Spearman correlation of (x, y) pairs given as a count table
+    table[x, y] = number of pairs; ties get average ranks, as in scipy.
+    """
+    n = table.sum()
+    if n < 2:
+        return float("nan")
+
+    def avg_ranks(marginal: np.ndarray) -> np.ndarray:
+        before = np.cumsum(marginal) - marginal
+        return before + (marginal + 1) / 2.0
+
+    rx = avg_ranks(table.sum(axis=1))
+    ry = avg_ranks(table.sum(axis=0))
+    mx = (rx * table.sum(axis=1)).sum() / n
+    my = (ry * table.sum(axis=0)).sum() / n
+    dx, dy = rx - mx, ry - my
+    cov = (table * np.outer(dx, dy)).sum()
+    var_x = (table.sum(axis=1) * dx ** 2).sum()
+    var_y = (table.sum(axis=0) * dy ** 2).sum()
+    if var_x == 0 or var_y == 0:
+        return float("nan")
+    return float(cov / np.sqrt(var_x * var_y))
+
+
+def finalize(partial: dict, ks: tuple[int, ...]) -> dict[str, float]:
+    """Turn a merged partial into the same fields as `ranking_eval.summarize`, plus length metrics."""
+    p = partial
+    out: dict[str, float] = {"total_examples": p["n_examples"]}
+    for k, hits in zip(ks, p["hits"]):
+        out[f"gold_at_top_{k}"] = int(hits)
+    out["avg_gold_position"] = p["gold_rank_sum"] / p["n_gold"] if p["n_gold"] else float("nan")
+    out["mrr"] = p["rr_sum"] / p["n_examples"] if p["n_examples"] else 0.0
+    out["avg_distance"] = p["mean_sum"] / p["n_nonempty"] if p["n_nonempty"] else float("nan")
+    out["avg_ref_length_at_top"] = p["top1_len_sum"] / p["n_top1"] if p["n_top1"] else float("nan")
+    out["length_rank_corr"] = spearman_from_counts(p["len_rank"])
+    out["pct_short_refs_in_top3"] = 100 * p["short_in_top3"] / p["total_top3"] if p["total_top3"] else float("nan")
+    return out
+
+
+# ─── Shared-memory plumbing ────────────────────────────────────────────────────
+_SHARED: dict[str, np.ndarray] = {}
+_SEGMENTS: list[shared_memory.SharedMemory] = []
+
+
+def _share(arrays: dict[str, np.ndarray]) -> tuple[list[shared_memory.SharedMemory], dict]:
+    segments, specs = [], {}
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        segments.append(shm)
+        specs[name] = (shm.name, arr.shape, arr.dtype.str)
+    return segments, specs
+
+
+def _attach(specs: dict, untrack: bool) -> None:
+    """Pool initializer: map every shared array once per worker process."""
+    for name, (shm_name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        if untrack:
+            # Spawned workers get their own resource tracker, which would
+            # unlink the parent's segment when the worker exits
+            resource_tracker.unregister(shm._name, "shared_memory")
+        _SEGMENTS.append(shm)
+        _SHARED[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _shard_partials(
+    arrays: dict[str, np.ndarray],
+    e0: int,
+    e1: int,
+    score_names: tuple[str, ...],
+    with_gaze: bool,
+    ks: tuple[int, ...],
+) -> dict[str, dict]:
+    cand_offsets = arrays["cand_offsets"]
+    c0, c1 = int(cand_offsets[e0]), int(cand_offsets[e1])
+    shard_offsets = cand_offsets[e0:e1 + 1] - c0
+    is_gold = arrays["is_gold"][c0:c1]
+    lengths = arrays["lengths"][c0:c1]
+
+    scores = {name: arrays[f"score:{name}"][c0:c1] for name in score_names}
+    if with_gaze:
+        offsets = arrays["gaze_offsets"]
+        g0, g1 = int(offsets[c0]), int(offsets[c1])
+        shard = PackedGaze(
+            points=arrays["gaze_points"][g0:g1],
+            offsets=offsets[c0:c1 + 1] - g0,
+            cand_offsets=shard_offsets,
+            bbox=arrays["bbox"][e0:e1],
+            is_gold=is_gold,
+        )
+        scores.update(compute_all(shard))
+
+    return {name: partial_aggregate(s, shard_offsets, is_gold, lengths, ks) for name, s in scores.items()}
+
+
+def _run_shard(e0: int, e1: int, score_names: tuple[str, ...], with_gaze: bool,
+               ks: tuple[int, ...]) -> dict[str, dict]:
+    return _shard_partials(_SHARED, e0, e1, score_names, with_gaze, ks)
+
+
+# ─── Public entry points ───────────────────────────────────────────────────────
+def evaluate_parallel(
+    cand_offsets: np.ndarray,
+    is_gold: np.ndarray,
+    lengths: np.ndarray,
+    scores: dict[str, np.ndarray] | None = None,
+    packed: PackedGaze | None = None,
+    ks: Iterable[int] = DEFAULT_KS,
+    n_workers: int | None = None,
+    shards_per_worker: int = 4,
+) -> dict[str, dict[str, float]]:
+    """
+    Evaluate precomputed `scores` columns and, when `packed` is given, every
+    gaze metric from gaze_metrics.py, sharded over `n_workers` processes.
+    Small inputs (or n_workers=1) are evaluated inline with the same code path.
+    """
+    ks = tuple(ks)
+    scores = scores or {}
+    n_examples = len(cand_offsets) - 1
+    n_workers = n_workers or os.cpu_count() or 1
+    if n_examples < MIN_PARALLEL_EXAMPLES:
+        n_workers = 1
+
+    arrays = {
+        "cand_offsets": np.asarray(cand_offsets, dtype=np.int64),
+        "is_gold":      np.asarray(is_gold, dtype=bool),
+        "lengths":      np.asarray(lengths, dtype=np.int64),
+    }
+    for name, s in scores.items():
+        arrays[f"score:{name}"] = np.asarray(s, dtype=np.float64)
+    if packed is not None:
+        arrays.update(gaze_points=packed.points, gaze_offsets=packed.offsets, bbox=packed.bbox)
+    score_names = tuple(scores)
+    with_gaze = packed is not None
+
+    n_shards = max(1, min(n_examples, n_workers * shards_per_worker))
+    bounds = np.linspace(0, n_examples, n_shards + 1).astype(int)
+    # no examples: one empty shard, so every ranking still finalizes (to zero counts / NaN means)
+    ranges = [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:]) if b > a] or [(0, 0)]
+
+    if n_workers == 1:
+        parts = [_shard_partials(arrays, e0, e1, score_names, with_gaze, ks) for e0, e1 in ranges]
+    else:
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        untrack = ctx.get_start_method() != "fork"
+        segments, specs = _share(arrays)
+        try:
+            with ProcessPoolExecutor(n_workers, mp_context=ctx, initializer=_attach,
+                                     initargs=(specs, untrack)) as pool:
+                futures = [
+                    pool.submit(_run_shard, e0, e1, score_names, with_gaze, ks)
+                    for e0, e1 in ranges
+                ]
+                parts = [f.result() for f in futures]
+        finally:
+            for shm in segments:
+                shm.close()
+                shm.unlink()
+
+    merged = parts[0]
+    for part in parts[1:]:
+        merged = {name: merge_partials(merged[name], part[name]) for name in merged}
+    return {name: finalize(p, ks) for name, p in merged.items()}
+
+
+def store_report(store, ks: Iterable[int] = DEFAULT_KS, n_workers: int | None = None) -> dict[str, float]:
+    """
+    Sidebar-style flat report for a `scoring_store.ScoringStore`: gold@top-k,
+    positions, MRR and the length metrics for rec / gaze / combined.
+    """
+    ks = tuple(ks)
+    results = evaluate_parallel(
+        store.cand_offsets,
+        np.asarray(store.cand_type) == CAND_GOLD,
+        # texts are interned: count each distinct text once
+        word_counts(store.texts.unique())[np.asarray(store.texts.ids)],
+        scores={name: fn(store) for name, fn in STORE_RANKINGS.items()},
+        ks=ks,
+        n_workers=n_workers,
+    )
+    flat = flatten_summary(results, len(store), ks)
+    for stat, label in (("avg_ref_length_at_top", "avg_ref_length_at_top"),
+                        ("length_rank_corr", "length_rank_corr"),
+                        ("pct_short_refs_in_top3", "pct_short_refs_in_top3")):
+        for name, res in results.items():
+            flat[f"{label}_{name}"] = res[stat]
+    return flat
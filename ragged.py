@@ -0,0 +1,103 @@
+"""
+Compact in-memory representation of candidates and gaze sequences.
+
+Scoring files hold each fixation as a two-float JSON list inside a list per
+candidate inside a dict per example — 100+ bytes per point once parsed, and
+every consumer re-checks each point for nulls. Here:
+
+  RaggedPoints     all sequences back to back as float32 (F, 2) x/y, with
+                   (C+1,) offsets and a (F,) validity mask computed once
+  InternedStrings  candidate texts as int32 ids into a table of unique texts
+  CAND_TYPES       gold / generated as a uint8 code
+
+The scoring store persists exactly these arrays; the apps and the analysis
+code slice them instead of walking nested lists.
+"""
+from typing import Iterable, NamedTuple
+
+import numpy as np
+
+CAND_GENERATED = 0
+CAND_GOLD = 1
+CAND_TYPES = {"generated": CAND_GENERATED, "gold": CAND_GOLD}
+CAND_TYPE_NAMES = {v: k for k, v in CAND_TYPES.items()}
+
+
+def as_point(pt) -> tuple[float, float]:
+    """(x, y) for a valid 2-number point, (nan, nan) for nulls/garbage."""
+    if isinstance(pt, (list, tuple)) and len(pt) == 2:
+        x, y = pt
+        if isinstance(x, (int, float)) and isinstance(y, (int, float)):
+            return float(x), float(y)
+    return float("nan"), float("nan")
+
+
+def type_codes(candidates: Iterable[dict]) -> np.ndarray:
+    return np.fromiter((CAND_TYPES.get(c["type"], CAND_GENERATED) for c in candidates), dtype=np.uint8)
+
+
+class RaggedPoints(NamedTuple):
+    """
+    points   (F, 2) float32  fixations of all sequences back to back, NaN where invalid
+    offsets  (C+1,) int64    sequence c owns points[offsets[c]:offsets[c+1]]
+    valid    (F,)   bool     row holds a real point
+    """
+    points: np.ndarray
+    offsets: np.ndarray
+    valid: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def sequence(self, c: int) -> np.ndarray:
+        """Valid fixations of sequence `c` as an (n, 2) float32 array."""
+        a, b = int(self.offsets[c]), int(self.offsets[c + 1])
+        return np.asarray(self.points[a:b])[np.asarray(self.valid[a:b])]
+
+    def raw(self, c: int) -> list:
+        """Sequence `c` as nested lists, nulls restored as None."""
+        a, b = int(self.offsets[c]), int(self.offsets[c + 1])
+        pts = np.asarray(self.points[a:b]).tolist()
+        return [pt if ok else None for pt, ok in zip(pts, np.asarray(self.valid[a:b]).tolist())]
+
+
+def pack_points(sequences: Iterable[Iterable]) -> RaggedPoints:
+    """Pack nested point lists in one pass, validating every point exactly once."""
+    xy: list[tuple[float, float]] = []
+    offsets = [0]
+    for seq in sequences:
+        xy.extend(as_point(pt) for pt in seq)
+        offsets.append(len(xy))
+    points = np.asarray(xy, dtype=np.float32).reshape(-1, 2)
+    return RaggedPoints(
+        points=points,
+        offsets=np.asarray(offsets, dtype=np.int64),
+        valid=~np.isnan(points).any(axis=1),
+    )
+
+
+class InternedStrings:
+    """Sequence of strings stored as int32 ids into a table of unique values."""
+
+    def __init__(self, ids: np.ndarray, table):
+        self.ids = ids
+        self.table = table
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, i: int) -> str:
+        return self.table[int(self.ids[i])]
+
+    def unique(self) -> list[str]:
+        return self.table if isinstance(self.table, list) else self.table.tolist()
+
+    def tolist(self) -> list[str]:
+        table = self.unique()
+        return [table[i] for i in np.asarray(self.ids).tolist()]
+
+
+def intern_strings(strings: Iterable[str]) -> InternedStrings:
+    table: dict[str, int] = {}
+    ids = np.fromiter((table.setdefault(s, len(table)) for s in strings), dtype=np.int32)
+    return InternedStrings(ids, list(table))
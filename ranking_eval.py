@@ -0,0 +1,193 @@
+"""
+Single-pass ranking evaluation over per-candidate score arrays.
+
+Every ranking (gaze, REC, combined, any notebook metric...) is a (C,) score
+array aligned with the candidate table, lower is better. `evaluate` computes
+each ranking's scores once and reports, for any list of k:
+
+  gold_at_top_k      examples with a gold candidate ranked within the top k
+  avg_gold_position  mean 1-based rank over all gold candidates
+  mrr                mean reciprocal rank of each example's best gold (0 if none)
+  avg_distance       mean over examples of the mean candidate score
+
+Ranks come from counting, for each candidate, the rivals in its example that
+beat it — a selection that never sorts the full list and keeps the tie rule
+exact, which matters because missing gaze data makes `inf` ties common.
+"""
+from typing import Any, Callable, Iterable
+
+import numpy as np
+
+from ragged import CAND_GOLD
+
+DEFAULT_KS = (1, 3)
+
+# Bounds the (candidates × max candidates) comparison block held at once
+_CHUNK_ELEMS = 1 << 22
+
+
+def to_matrix(values: np.ndarray, cand_offsets: np.ndarray, fill) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Scatter a per-candidate array into an (examples × max candidates) matrix.
+    Returns the matrix (padding set to `fill`) and the mask of real slots.
+    """
+    counts = np.diff(cand_offsets)
+    width = int(counts.max()) if len(counts) else 0
+    mask = np.arange(width) < counts[:, None]
+    out = np.full(mask.shape, fill, dtype=np.asarray(values).dtype)
+    out[mask] = values
+    return out, mask
+
+
+def candidate_ranks(
+    scores: np.ndarray,
+    cand_offsets: np.ndarray,
+    is_gold: np.ndarray | None = None,
+    gold_last_on_ties: bool = False,
+) -> np.ndarray:
+    """
+    1-based rank of every candidate within its example (lower score = better).
+    Ties keep candidate order, like Python's stable `sorted(..., key=dist)` in
+    rerank_vis.py; with `gold_last_on_ties` generated candidates win ties
+    instead, matching the notebook's sort on (score, type).
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    counts = np.diff(cand_offsets)
+    S, mask = to_matrix(scores, cand_offsets, np.inf)
+    width = S.shape[1]
+    if gold_last_on_ties:
+        G, _ = to_matrix(np.asarray(is_gold, dtype=bool), cand_offsets, False)
+
+    example = np.repeat(np.arange(len(counts)), counts)
+    column = np.arange(len(scores)) - np.repeat(cand_offsets[:-1], counts)
+    slots = np.arange(width)
+
+    ranks = np.empty(len(scores), dtype=np.int64)
+    step = max(1, _CHUNK_ELEMS // max(width, 1))
+    for start in range(0, len(scores), step):
+        c = slice(start, start + step)
+        rows, row_mask = S[example[c]], mask[example[c]]
+        s, j = scores[c, None], column[c, None]
+        earlier = slots < j
+        if gold_last_on_ties:
+            g = np.asarray(is_gold[c], dtype=bool)[:, None]
+            rival_gold = G[example[c]]
+            # a generated rival always wins the tie against gold; same type -> order
+            wins_tie = np.where(g == rival_gold, earlier, g & ~rival_gold)
+        else:
+            wins_tie = earlier
+        ahead = ((rows < s) | ((rows == s) & wins_tie)) & row_mask
+        ranks[c] = ahead.sum(axis=1) + 1
+    return ranks
+
+
+def best_gold_ranks(ranks: np.ndarray, cand_offsets: np.ndarray, is_gold: np.ndarray) -> np.ndarray:
+    """Per example, the best rank among its gold candidates; 0 for an example without gold."""
+    n_examples = len(cand_offsets) - 1
+    example = np.repeat(np.arange(n_examples), np.diff(cand_offsets))
+    best_gold = np.full(n_examples, np.iinfo(np.int64).max)
+    np.minimum.at(best_gold, example[is_gold], ranks[is_gold])
+    best_gold[best_gold == np.iinfo(np.int64).max] = 0
+    return best_gold
+
+
+def summarize(
+    scores: np.ndarray,
+    cand_offsets: np.ndarray,
+    is_gold: np.ndarray,
+    ks: Iterable[int] = DEFAULT_KS,
+    gold_last_on_ties: bool = False,
+    ranks: np.ndarray | None = None,
+) -> dict[str, float]:
+    """
+    Top-k hit counts, mean gold position, MRR and mean score for one ranking.
+    `ranks` reuses a `candidate_ranks` result the caller already has.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    is_gold = np.asarray(is_gold, dtype=bool)
+    n_examples = len(cand_offsets) - 1
+    counts = np.diff(cand_offsets)
+    if ranks is None:
+        ranks = candidate_ranks(scores, cand_offsets, is_gold, gold_last_on_ties)
+
+    # Best gold rank per example; 0 marks an example without any gold
+    best_gold = best_gold_ranks(ranks, cand_offsets, is_gold)
+    has_gold = best_gold > 0
+
+    nonempty = counts > 0
+    per_example_mean = np.zeros(n_examples)
+    if nonempty.any():
+        per_example_mean[nonempty] = (
+            np.add.reduceat(scores, cand_offsets[:-1][nonempty]) / counts[nonempty]
+        )
+
+    out: dict[str, float] = {"total_examples": n_examples}
+    for k in ks:
+        out[f"gold_at_top_{k}"] = int((has_gold & (best_gold <= k)).sum())
+    out["avg_gold_position"] = float(ranks[is_gold].mean()) if is_gold.any() else float("nan")
+    reciprocal = np.zeros(n_examples)
+    reciprocal[has_gold] = 1.0 / best_gold[has_gold]
+    out["mrr"] = float(reciprocal.mean()) if n_examples else 0.0
+    out["avg_distance"] = float(per_example_mean[nonempty].mean()) if nonempty.any() else float("nan")
+    return out
+
+
+def evaluate(
+    source: Any,
+    metrics: dict[str, Callable[[Any], np.ndarray]],
+    cand_offsets: np.ndarray,
+    is_gold: np.ndarray,
+    ks: Iterable[int] = DEFAULT_KS,
+    gold_last_on_ties: bool = False,
+) -> dict[str, dict[str, float]]:
+    """
+    Evaluate several rankings over the same candidate table.
+    Each metric function maps `source` (a ScoringStore, PackedGaze, ...) to a
+    (C,) score array; results are keyed by metric name.
+    """
+    ks = tuple(ks)
+    cand_offsets = np.asarray(cand_offsets, dtype=np.int64)
+    return {
+        name: summarize(fn(source), cand_offsets, is_gold, ks, gold_last_on_ties)
+        for name, fn in metrics.items()
+    }
+
+
+# Rankings available straight from a `scoring_store.ScoringStore`
+STORE_RANKINGS: dict[str, Callable[[Any], np.ndarray]] = {
+    "rec":      lambda store: np.asarray(store.rec_distance),
+    "gaze":     lambda store: np.asarray(store.gaze_distance),
+    "combined": lambda store: np.asarray(store.gaze_distance) + np.asarray(store.rec_distance),
+}
+# "combined" ranks by the summed gaze + REC distance (same order as their mean),
+# but its distance to center is reported as the mean of the two distances
+REPORTED_DISTANCE_SCALE = {"combined": 0.5}
+
+
+def flatten_summary(results: dict[str, dict[str, float]], n_examples: int,
+                    ks: Iterable[int] = DEFAULT_KS) -> dict[str, float]:
+    """
+    Flatten per-ranking results into the key layout of analysis_results.json
+    (gold_at_top_rec, gold_in_top3_gaze, avg_gold_position_combined, ...).
+    """
+    flat: dict[str, float] = {"total_examples": n_examples}
+    for k in ks:
+        for name, res in results.items():
+            key = f"gold_at_top_{name}" if k == 1 else f"gold_in_top{k}_{name}"
+            flat[key] = res[f"gold_at_top_{k}"]
+    for stat, label in (("avg_gold_position", "avg_gold_position"),
+                        ("mrr", "mrr"),
+                        ("avg_distance", "avg_distance_to_center")):
+        for name, res in results.items():
+            scale = REPORTED_DISTANCE_SCALE.get(name, 1.0) if stat == "avg_distance" else 1.0
+            flat[f"{label}_{name}"] = res[stat] * scale
+    return flat
+
+
+def store_summary(store, ks: Iterable[int] = DEFAULT_KS) -> dict[str, float]:
+    """Flat gaze/REC/combined summary for a `scoring_store.ScoringStore`."""
+    ks = tuple(ks)
+    results = evaluate(
+        store, STORE_RANKINGS, store.cand_offsets, np.asarray(store.cand_type) == CAND_GOLD, ks
+    )
+    return flatten_summary(results, len(store), ks)
@@ -0,0 +1,138 @@
+"""
+Offline batch renderer for candidate gaze / REC overlays.
+
+Renders every candidate's gaze and REC overlay for a whole scoring run with a
+process pool, decoding each example's base image once and sharing it across
+its candidates. Files are written under the same input-derived keys
+(`render_cache.overlay_key`) the app uses, so pointing --out at
+output/render_cache with the app's --format (WEBP) warms the app's disk
+tier; any other directory gives a static artifact set. A `manifest.jsonl` lists every file written.
+
+Like the app, overlays are drawn on the thumbnail level that fills
+--panel-width (`thumbnails.ThumbnailPyramid`, built if missing); 0 draws on
+the full-size images.
+
+Usage:
+    python render_batch.py --out output/render_cache
+    python render_batch.py --gaze G.json --rec R.json --out report/overlays --workers 32
+    python render_batch.py --out report/full_size --panel-width 0 --format JPEG
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from drawing import GAZE_STYLE, REC_STYLE, render_gaze_overlay, render_rec_overlay, scaled_style
+from render_cache import RenderCache, encode_image, load_base_image, overlay_key
+from scoring_store import ScoringStore, build_store, is_store
+from thumbnails import DEFAULT_THUMB_DIR, ThumbnailPyramid
+
+PANEL_WIDTH = 352  # rerank_vis.PANEL_WIDTH
+
+_worker: dict = {}
+
+
+def _init_worker(store_dir: str, image_dir: str, out_dir: str, fmt: str, overwrite: bool,
+                 thumb_dir: str, panel_width: int) -> None:
+    _worker["store"] = ScoringStore(store_dir)
+    _worker["image_dir"] = Path(image_dir)
+    _worker["thumbnails"] = ThumbnailPyramid(thumb_dir) if panel_width else None
+    _worker["panel_width"] = panel_width
+    _worker["cache"] = RenderCache(max_bytes=0, disk_dir=out_dir)  # disk tier only
+    _worker["fmt"] = fmt
+    _worker["overwrite"] = overwrite
+
+
+def _render_examples(indices: list[int]) -> list[dict]:
+    store: ScoringStore = _worker["store"]
+    cache: RenderCache = _worker["cache"]
+    records = []
+    for i in indices:
+        example = store.example(i)
+        image_path = _worker["image_dir"] / Path(example.image_path).name
+        if not image_path.exists():
+            records.append({"example": i, "image_path": str(image_path), "error": "missing image"})
+            continue
+        scale = 1.0
+        if _worker["thumbnails"] is not None:
+            thumbs, width = _worker["thumbnails"], _worker["panel_width"]
+            image_path, scale = thumbs.path(image_path, width), thumbs.scale(image_path, width)
+        gaze_style, rec_style = scaled_style(GAZE_STYLE, scale), scaled_style(REC_STYLE, scale)
+
+        base = None
+        jobs = []
+        for c, (seq, pt) in enumerate(zip(example.gaze, example.rec_point)):
+            jobs.append(("gaze", c, seq, gaze_style, render_gaze_overlay))
+            jobs.append(("rec", c, pt, rec_style, render_rec_overlay))
+        for kind, c, data, style, render in jobs:
+            key = overlay_key(kind, image_path, c, style, data, _worker["fmt"])
+            if _worker["overwrite"] or key not in cache:
+                if base is None:
+                    base = load_base_image(str(image_path))  # one decode per example
+                cache.put(key, encode_image(render(base, data, **style), fmt=_worker["fmt"]))
+            records.append({
+                "example":    i,
+                "image_path": str(image_path),
+                "candidate":  c,
+                "kind":       kind,
+                "key":        key,
+                "file":       f"{key[:2]}/{key}",
+            })
+    return records
+
+
+def render_all(
+    store_dir: Path,
+    image_dir: Path,
+    out_dir: Path,
+    workers: int | None = None,
+    fmt: str = "WEBP",
+    overwrite: bool = False,
+    chunk: int = 64,
+    thumb_dir: Path = DEFAULT_THUMB_DIR,
+    panel_width: int = PANEL_WIDTH,
+) -> int:
+    """Render every overlay of the store into `out_dir`; returns the number of records."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    n = len(ScoringStore(store_dir))
+    chunks = [list(range(s, min(s + chunk, n))) for s in range(0, n, chunk)]
+    n_records = 0
+    with open(out_dir / "manifest.jsonl", "w") as manifest, ProcessPoolExecutor(
+        workers or os.cpu_count(),
+        initializer=_init_worker,
+        initargs=(str(store_dir), str(image_dir), str(out_dir), fmt, overwrite, str(thumb_dir), panel_width),
+    ) as pool:
+        for records in pool.map(_render_examples, chunks):
+            for rec in records:
+                manifest.write(json.dumps(rec) + "\n")
+            n_records += len(records)
+    return n_records
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--gaze", default="output/gaze_scoring_results_new.json")
+    ap.add_argument("--rec", default="output/rec_scoring_results_new.json")
+    ap.add_argument("--store", default="output/scoring_store_new",
+                    help="columnar store directory (built from --gaze/--rec if missing)")
+    ap.add_argument("--images", default="output/overlayed_images")
+    ap.add_argument("--out", required=True)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--format", default="WEBP", choices=["JPEG", "PNG", "WEBP"])
+    ap.add_argument("--thumbs", default=str(DEFAULT_THUMB_DIR), help="thumbnail pyramid directory")
+    ap.add_argument("--panel-width", type=int, default=PANEL_WIDTH,
+                    help="draw on the smallest thumbnail level at least this wide (0 = full size)")
+    ap.add_argument("--overwrite", action="store_true", help="re-render files that already exist")
+    args = ap.parse_args()
+
+    store_dir = Path(args.store)
+    if not is_store(store_dir, args.gaze, args.rec):
+        build_store(args.gaze, args.rec, store_dir)
+    n = render_all(store_dir, Path(args.images), Path(args.out), args.workers, args.format, args.overwrite,
+                   thumb_dir=Path(args.thumbs), panel_width=args.panel_width)
+    print(f"{n} overlays listed in {Path(args.out) / 'manifest.jsonl'}")
+
+
+if __name__ == "__main__":
+    main()
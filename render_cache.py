@@ -0,0 +1,226 @@
+"""
+Keyed cache of encoded overlay images.
+
+Rendering a candidate overlay means copying the base image, drawing on it and
+encoding the result; with ~15 candidates per example that is 30 draw+encode
+operations per click. `RenderCache` keeps the *encoded* bytes (ready for
+`st.image`) in a size-bounded LRU, optionally backed by a directory so the
+work also survives app restarts.
+
+Keys are built from everything that affects the bytes — base image (path,
+modification time and size), candidate, overlay kind, style parameters, the
+drawn data itself and the encoding (format, quality) — so a regenerated
+image, a changed scoring file, style or output format never serves a stale
+image.
+"""
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Hashable, Iterable
+
+import numpy as np
+from PIL import Image
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_FORMAT = "JPEG"
+DEFAULT_QUALITY = {"JPEG": 90, "WEBP": 80}  # lossy formats only
+# WebP effort (0–6): 2 is within ~2% of the default 4's size at half the encode time
+WEBP_METHOD = 2
+
+
+def encode_options(fmt: str = DEFAULT_FORMAT, quality: int | None = None) -> dict:
+    """PIL save options `encode_image` uses for `fmt`."""
+    if fmt not in DEFAULT_QUALITY:
+        return {}
+    extra = {"method": WEBP_METHOD} if fmt == "WEBP" else {}
+    return {"quality": quality or DEFAULT_QUALITY[fmt], **extra}
+
+
+def encode_image(img: Image.Image, fmt: str = DEFAULT_FORMAT, quality: int | None = None) -> bytes:
+    buf = io.BytesIO()
+    if fmt in DEFAULT_QUALITY:
+        img = img.convert("RGB")
+    img.save(buf, format=fmt, **encode_options(fmt, quality))
+    return buf.getvalue()
+
+
+def overlay_key(kind: str, image_path: Path | str, cand_idx: int, style: dict, data,
+                fmt: str = DEFAULT_FORMAT, quality: int | None = None) -> str:
+    """Cache key of one candidate overlay encoded as `fmt`; shared by the app and render_batch.py."""
+    if isinstance(data, np.ndarray):
+        # repr() elides long arrays; hash the exact values instead
+        data = (data.dtype.str, data.shape, hashlib.sha1(data.tobytes()).hexdigest())
+    st = os.stat(image_path)  # a regenerated base image gets new keys
+    return RenderCache.make_key(kind, str(image_path), st.st_mtime_ns, st.st_size, cand_idx,
+                                sorted(style.items()), data, fmt, sorted(encode_options(fmt, quality).items()))
+
+
+@lru_cache(maxsize=8)
+def load_base_image(path: str) -> Image.Image:
+    """Decoded base image, kept for the few examples currently being rendered."""
+    with Image.open(path) as img:
+        return img.convert("RGB")
+
+
+class RenderCache:
+    """
+    Size-bounded LRU of encoded image bytes with an optional on-disk tier.
+    Thread-safe: Streamlit serves each session from its own thread.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, disk_dir: Path | str | None = None):
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+        self._items: OrderedDict[str, bytes] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = self.disk_hits = self.misses = 0
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / key
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            if key in self._items:
+                return True
+        return bool(self.disk_dir) and self._disk_path(key).exists()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return data
+        if self.disk_dir:
+            p = self._disk_path(key)
+            if p.exists():
+                data = p.read_bytes()
+                self._put_memory(key, data)
+                self.disk_hits += 1
+                return data
+        return None
+
+    def _put_memory(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._items[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
+    def put(self, key: str, data: bytes) -> None:
+        self._put_memory(key, data)
+        if self.disk_dir:
+            p = self._disk_path(key)
+            p.parent.mkdir(exist_ok=True)
+            # unique per writer: prefetch threads, sessions and render_batch workers
+            # may write the same key at once; whichever replace lands last wins
+            tmp = p.with_name(f"{p.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            try:
+                tmp.replace(p)
+            except OSError:
+                # lost the race (e.g. the target is held open on Windows): the winner's
+                # bytes are the same rendering, keys are derived from every input
+                tmp.unlink(missing_ok=True)
+
+    def get_or_render(self, key: str, render: Callable[[], bytes]) -> bytes:
+        data = self.get(key)
+        if data is None:
+            with self._lock:
+                self.misses += 1
+            data = render()
+            self.put(key, data)
+        return data
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._items),
+                "bytes": self._size,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
+
+
+class Prefetcher:
+    """
+    Runs groups of render jobs (typically: one example's overlays) on a small
+    background pool. A group is given as a callable that builds its job list,
+    so even listing the jobs (loading the example, hashing cache keys) happens
+    on the pool, not in the caller's rerun. Each `schedule` call supersedes
+    the previous one of the same owner (e.g. one app session): its groups
+    still queued are cancelled and a group already running stops before its
+    next job, so jumping around never leaves stale work ahead of fresh work.
+    Other owners' work is left alone; all of them share the pool.
+    """
+
+    def __init__(self, workers: int = 2):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._generations: dict[Hashable, int] = {}
+        self._futures: dict[Hashable, list[Future]] = {}
+        self.completed = self.cancelled = 0
+
+    def schedule(self, groups: Iterable[Callable[[], list[Callable[[], object]]]], owner: Hashable = None) -> None:
+        """Replace `owner`'s pending work with `groups` (job-list builders), run in the given order."""
+        with self._lock:
+            generation = self._generations.get(owner, 0) + 1
+            self._generations[owner] = generation
+            for f in self._futures.pop(owner, []):
+                if f.cancel():
+                    self.cancelled += 1
+            futures = [self._pool.submit(self._run, owner, generation, group) for group in groups]
+            if futures:
+                self._futures[owner] = futures
+            # forget owners (closed sessions) with nothing left to cancel
+            for other in [o for o, fs in self._futures.items() if all(f.done() for f in fs)]:
+                del self._futures[other]
+            self._generations = {o: g for o, g in self._generations.items()
+                                 if o in self._futures or o == owner}
+
+    def _current(self, owner: Hashable, generation: int) -> bool:
+        return self._generations.get(owner) == generation
+
+    def _run(self, owner: Hashable, generation: int, group: Callable[[], list[Callable[[], object]]]) -> None:
+        if not self._current(owner, generation):
+            return
+        try:
+            jobs = group()
+        except Exception:
+            jobs = []  # e.g. the example's image is gone: nothing to prefetch
+        for job in jobs:
+            if not self._current(owner, generation):
+                with self._lock:
+                    self.cancelled += 1
+                return
+            try:
+                job()
+            except Exception:
+                pass  # a failed prefetch only means the overlay is rendered on demand later
+        with self._lock:
+            self.completed += 1
+
+    def stats(self, owner: Hashable = None) -> dict:
+        """Pending groups of `owner`, completed / cancelled groups of every owner."""
+        with self._lock:
+            pending = sum(not f.done() for f in self._futures.get(owner, []))
+            return {"pending": pending, "completed": self.completed, "cancelled": self.cancelled}
@@ -1,24 +1,45 @@
 import streamlit as st
 import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import NamedTuple
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
-from datasets import load_dataset
-import matplotlib.cm as cm
+
+import instrument
+from drawing import draw_sequence
+from hf_images import HFImageSource
+from gaze_preprocess import Fixations, collapse_dwell, drop_nulls
+from ragged import InternedStrings, intern_strings, pack_points
+from render_cache import encode_image
 
 # --- CONFIG ---
 RERANK_PATH = Path("rerank_results_10.json")
 HF_DATASET  = "lmms-lab/RefCOCO"
 HF_SPLIT    = "val"
+HF_INDEX    = Path("output/hf_index_refcoco_val.json")
 TARGET_SIZE = (512, 320)
 DISPLAY_W   = 600
+IMAGE_FORMAT = "WEBP"  # st.image would send the drawn PIL images as PNG
+PAGE_SIZE   = 10    # default examples per page
+MAX_PADDED  = 64    # padded base images kept in memory
 
-# --- Load HF dataset images once ---
-@st.cache_data
+# --- Opt-in timing instrumentation (breakdown at the bottom of the sidebar) ---
+with st.sidebar:
+    profiling = st.checkbox("⏱ Timing breakdown", value=instrument.ENABLED_BY_DEFAULT)
+    cprofile_run = profiling and st.checkbox("Write a cProfile .pstats for this rerun")
+instrument.start_run(profiling)
+profiler = instrument.start_profile() if cprofile_run else None
+
+# --- HF dataset images: file_name index built once, images decoded on demand ---
+@st.cache_resource
 def load_refcoco_images():
-    ds = load_dataset(HF_DATASET, split=HF_SPLIT)
-    return {ex["file_name"]: ex["image"].convert("RGB") for ex in ds}
+    return HFImageSource(HF_DATASET, HF_SPLIT, HF_INDEX)
 
-hf_images = load_refcoco_images()
+with instrument.timer("load:hf_dataset"):
+    hf_images = load_refcoco_images()
 
 def pad_to_target(img: Image.Image, size=TARGET_SIZE, color=(255,255,255)):
     W, H = size
@@ -31,58 +52,172 @@ def pad_to_target(img: Image.Image, size=TARGET_SIZE, color=(255,255,255)):
     out.paste(resized, (x, y))
     return out, x, y
 
-def draw_sequence(draw, seq, cmap_name="viridis", last_color="red", label=True):
-    clean_seq = [tuple(pt) for pt in seq if isinstance(pt, (list, tuple)) and len(pt) == 2 and all(isinstance(v, (int, float)) for v in pt)]
-    if not clean_seq:
-        return
+class PaddedImages:
+    """
+    LRU of `pad_to_target` results keyed by file name, filled on demand or in
+    the background by `prefetch` so the next page is ready before it's opened.
+    """
 
-    N = len(clean_seq)
-    cmap = cm.get_cmap(cmap_name, N)
+    def __init__(self, images, max_items=MAX_PADDED):
+        self.images = images
+        self.max_items = max_items
+        self._items: OrderedDict[str, tuple] = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=2)
 
-    for i, (x, y) in enumerate(clean_seq):
-        color = tuple(int(255 * c) for c in cmap(i)[:3])
-        r = 4
-        draw.ellipse((x - r, y - r, x + r, y + r), fill=color)
-        if i > 0:
-            draw.line([clean_seq[i - 1], (x, y)], fill=color, width=4)  # thicker line
-        if label:
-            draw.text((x + 5, y - 5), str(i + 1), fill="white")
+    def get(self, fname: str):
+        with self._lock:
+            hit = self._items.get(fname)
+            if hit is not None:
+                self._items.move_to_end(fname)
+                return hit
+        padded = pad_to_target(self.images[fname])
+        with self._lock:
+            self._items[fname] = padded
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        return padded
 
-    fx, fy = clean_seq[-1]
-    draw.ellipse((fx - 6, fy - 6, fx + 6, fy + 6), outline=last_color, width=3)
+    def prefetch(self, fnames):
+        for fname in fnames:
+            if fname in self.images and fname not in self._items:
+                self._pool.submit(self.get, fname)
 
-@st.cache_data
-def load_rerank(path: Path):
-    return json.loads(path.read_text())
+@st.cache_resource
+def get_padded_images():
+    return PaddedImages(hf_images)
+
+padded_images = get_padded_images()
+
+class RerankTable(NamedTuple):
+    """
+    rerank results as flat arrays (E examples, C candidates in total):
+    imagefiles    E file names
+    cand_offsets  (E+1,) example e owns candidates cand_offsets[e]:cand_offsets[e+1]
+    texts         C interned candidate texts
+    gaze          C denormalized gaze sequences, nulls dropped (dwell 1 per sample;
+                  `collapsed_gaze` merges repeated fixations, opt-in in the sidebar)
+    orders        "order_rec" / "order_gaze" -> (values, offsets), local candidate indices
+    """
+    imagefiles: list[str]
+    cand_offsets: np.ndarray
+    texts: InternedStrings
+    gaze: Fixations
+    orders: dict[str, tuple[np.ndarray, np.ndarray]]
+
+    def __len__(self) -> int:
+        return len(self.imagefiles)
+
+    def order(self, key: str, e: int) -> list[int]:
+        values, offsets = self.orders[key]
+        return values[offsets[e]:offsets[e + 1]].tolist()
+
+def _ragged_ints(lists) -> tuple[np.ndarray, np.ndarray]:
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    np.cumsum([len(v) for v in lists], out=offsets[1:])
+    return np.fromiter((i for v in lists for i in v), dtype=np.int32, count=int(offsets[-1])), offsets
 
-data = load_rerank(RERANK_PATH)
+@st.cache_resource
+def load_rerank(path: Path) -> RerankTable:
+    items = json.loads(path.read_text())
+    n_cands = [len(item["all_candidates"]) for item in items]
+    cand_offsets = np.zeros(len(items) + 1, dtype=np.int64)
+    np.cumsum(n_cands, out=cand_offsets[1:])
+    return RerankTable(
+        imagefiles=[item["imagefile"] for item in items],
+        cand_offsets=cand_offsets,
+        texts=intern_strings(t for item in items for t in item["all_candidates"]),
+        gaze=drop_nulls(pack_points(
+            (item["denorm_gaze_sequences"][c] if c < len(item["denorm_gaze_sequences"]) else [])
+            for item, n in zip(items, n_cands) for c in range(n)
+        )),
+        orders={key: _ragged_ints([item[key] for item in items]) for key in ("order_rec", "order_gaze")},
+    )
+
+with instrument.timer("load:rerank_results"):
+    data = load_rerank(RERANK_PATH)
+
+@st.cache_resource
+def collapsed_gaze(path: Path) -> Fixations:
+    # Dwell runs merged once, for the whole file
+    return collapse_dwell(load_rerank(path).gaze)
+
+with st.sidebar:
+    collapse = st.checkbox("Collapse repeated fixations (circle size = dwell)")
+
+@st.cache_data
+def image_positions(path: Path) -> dict[str, int]:
+    return {fname: i for i, fname in enumerate(load_rerank(path).imagefiles)}
 
 st.title("Reranking Visualization (REC vs Gaze)")
 
 font = ImageFont.load_default()
 
-for item in data:
-    fname = item["imagefile"]
+# --- Pagination: only the current window of examples is rendered ---
+with st.sidebar:
+    page_size = int(st.number_input("Examples per page", min_value=1, value=PAGE_SIZE, step=1))
+    n_pages = max(1, -(-len(data) // page_size))
+    jump_to = st.text_input("Jump to image file", "")
+    if jump_to:
+        pos = image_positions(RERANK_PATH).get(jump_to.strip())
+        if pos is None:
+            st.warning(f"{jump_to} is not in {RERANK_PATH}")
+        elif st.session_state.get("jumped_to") != jump_to:
+            st.session_state["jumped_to"] = jump_to
+            st.session_state["page"] = pos // page_size + 1
+    st.session_state.setdefault("page", 1)
+    if st.session_state["page"] > n_pages:
+        st.session_state["page"] = n_pages
+    page = int(st.number_input("Page", min_value=1, max_value=n_pages, key="page"))
+    st.caption(f"{n_pages} pages")
+
+start = (page - 1) * page_size
+page_examples = range(start, min(start + page_size, len(data)))
+st.caption(f"Examples {start + 1}–{page_examples.stop} of {len(data)}")
+
+# Warm the padded images of the next page while this one renders
+padded_images.prefetch(data.imagefiles[start + page_size:start + 2 * page_size])
+
+for e in page_examples:
+    fname = data.imagefiles[e]
+    c0 = int(data.cand_offsets[e])
     st.header(fname)
     if fname not in hf_images:
         st.error(f"Missing HF image for {fname}")
         continue
 
-    base, dx, dy = pad_to_target(hf_images[fname])
+    with instrument.timer("image_io:padded_base"):
+        base, dx, dy = padded_images.get(fname)
 
     for title, key in [("REC Ranking", "order_rec"), ("Gaze Ranking", "order_gaze")]:
         st.subheader(title)
-        order = item[key]
-        sequences = item["denorm_gaze_sequences"]
-        candidates = item["all_candidates"]
+        order = data.order(key, e)
     
         for rank_idx, cand_idx in enumerate(order):
-            label = candidates[cand_idx]
+            label = data.texts[c0 + cand_idx]
             st.markdown(f"**{rank_idx+1}. {label}**")
     
             if key == "order_gaze":
-                seq = sequences[cand_idx]
-                img = base.copy()
-                draw = ImageDraw.Draw(img)
-                draw_sequence(draw, seq, cmap_name="plasma")
-                st.image(img, width=DISPLAY_W)
+                gaze = collapsed_gaze(RERANK_PATH) if collapse else data.gaze
+                seq, dwell = gaze.sequence(c0 + cand_idx)
+                with instrument.timer("draw:gaze"):
+                    img = base.copy()
+                    draw = ImageDraw.Draw(img)
+                    if len(seq):  # already in pixel coords: no scaling
+                        draw_sequence(draw, seq, 1.0, 1.0, cmap_name="plasma",
+                                      dwell=dwell if collapse else None)
+                with instrument.timer("encode:overlay"):
+                    img = encode_image(img, IMAGE_FORMAT)
+                with instrument.timer("st.image"):
+                    st.image(img, width=DISPLAY_W)
+
+# --- Timing breakdown of this rerun ---
+if profiling:
+    timings = instrument.finish_run()
+    with st.sidebar:
+        st.write("### ⏱ This rerun")
+        st.dataframe(timings, use_container_width=True, hide_index=True)
+        if st.button("Dump cumulative stats"):
+            st.caption(f"Wrote {instrument.dump_stats()}")
+        if profiler is not None:
+            st.caption(f"cProfile written to {instrument.stop_profile(profiler)}")
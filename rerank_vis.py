@@ -1,296 +1,447 @@
 import streamlit as st
-import json
-from PIL import Image, ImageDraw
+from functools import partial
 from pathlib import Path
-from matplotlib import cm
+import uuid
+
+import numpy as np
+
+import instrument
+from drawing import GAZE_STYLE, REC_STYLE, render_gaze_overlay, render_rec_overlay, scaled_style
+from eval_report import build_report, load_report, summary_of, write_report
+from gaze_preprocess import Fixations, preprocess
+from heatmap import SELECTIONS, render_heatmap, selection_heat
+from label_index import SearchIndex, open_search_index
+from ranking_eval import best_gold_ranks, candidate_ranks, to_matrix
+from render_cache import Prefetcher, RenderCache, encode_image, load_base_image, overlay_key
+from run_diff import RunDiff, diff_runs, open_run
+from score_fusion import METHODS, best_setting, fuse, search_weights, stack_scores, weight_grid
+from significance import DEFAULT_RESAMPLES, store_significance
+from spatial_index import SpatialIndex, open_spatial_index
+from thumbnails import ThumbnailPyramid
+from scoring_store import CAND_GOLD, CAND_TYPE_NAMES, ScoringStore, build_store, is_store, source_stamps
 
 st.title("Gaze vs REC: Reranking + Detailed Overlays")
 #st.image(base_image, width=600)
 
+# ─── 0) Opt-in timing instrumentation (breakdown at the bottom of the sidebar) ─
+with st.sidebar:
+    profiling = st.checkbox("⏱ Timing breakdown", value=instrument.ENABLED_BY_DEFAULT)
+    cprofile_run = profiling and st.checkbox("Write a cProfile .pstats for this rerun")
+instrument.start_run(profiling)
+profiler = instrument.start_profile() if cprofile_run else None
+
+def show_image(data, **kwargs):
+    with instrument.timer("st.image"):
+        st.image(data, **kwargs)
+
+
+# ─── 1) Open the columnar scoring store (built once from the JSON files) ───────
+GAZE_PATH = Path("output/gaze_scoring_results_new.json")
+REC_PATH  = Path("output/rec_scoring_results_new.json")
+STORE_DIR = Path("output/scoring_store_new")
+
+@st.cache_resource
+def open_store(gaze_path: Path, rec_path: Path, store_dir: Path, stamps: dict) -> ScoringStore:
+    if not is_store(store_dir, gaze_path, rec_path):
+        with instrument.timer("load:json_merge_build_store"):
+            build_store(gaze_path, rec_path, store_dir)
+    return ScoringStore(store_dir)
+
+# Rebuilt whenever either scoring file changes on disk
+with instrument.timer("load:open_store"):
+    source_version = source_stamps(GAZE_PATH, REC_PATH)
+    store = open_store(GAZE_PATH, REC_PATH, STORE_DIR, source_version)
+
+@st.cache_resource
+def get_search_index(store_dir: Path, stamps: dict) -> SearchIndex:
+    return open_search_index(store)
+
+with instrument.timer("load:search_index"):
+    search_index = get_search_index(STORE_DIR, source_version)
+
+@st.cache_resource
+def get_spatial_index(store_dir: Path, stamps: dict) -> SpatialIndex:
+    return open_spatial_index(store)
+
+with instrument.timer("load:spatial_index"):
+    spatial_index = get_spatial_index(STORE_DIR, source_version)
+
+# ─── 2) Helper: locate images in local “output/overlayed_images/” ─────────────
+IMAGE_DIR = Path("output/overlayed_images")
+
+def get_image_path(filename: str) -> Path | None:
+    p = IMAGE_DIR / filename
+    return p if p.exists() else None
+
+# ─── 3) Rendered overlays, cached as encoded bytes (memory LRU + disk) ─────────
+RENDER_CACHE_DIR = Path("output/render_cache")
+
+@st.cache_resource
+def get_render_cache() -> RenderCache:
+    return RenderCache(disk_dir=RENDER_CACHE_DIR)
+
+render_cache = get_render_cache()
+
+# Overlays are drawn on the smallest thumbnail level that fills a half-width
+# column (Streamlit's centered layout is 704 px wide) and sent as WebP
+THUMB_DIR = Path("output/thumbnails")
+PANEL_WIDTH = 352
+IMAGE_FORMAT = "WEBP"
+
+@st.cache_resource
+def get_thumbnails() -> ThumbnailPyramid:
+    return ThumbnailPyramid(THUMB_DIR)
+
+def panel_image(image_path: Path) -> tuple[Path, float]:
+    # Built on first use when `python thumbnails.py` hasn't been run; markers are
+    # drawn at the thumbnail's scale so they keep their size relative to the image
+    thumbs = get_thumbnails()
+    with instrument.timer("image_io:thumbnail"):
+        return thumbs.path(image_path, PANEL_WIDTH), thumbs.scale(image_path, PANEL_WIDTH)
+
+def _render(kind: str, image_path: Path, render, data, style: dict) -> bytes:
+    # Only runs on a render-cache miss
+    instrument.count(f"render_cache:miss:{kind}")
+    with instrument.timer("image_io:base_image"):
+        base = load_base_image(str(image_path))
+    with instrument.timer(f"draw:{kind}"):
+        img = render(base, data, **style)
+    with instrument.timer("encode:overlay"):
+        return encode_image(img, IMAGE_FORMAT)
+
+def gaze_overlay(image_path: Path, cand_idx: int, seq_100, style: dict = GAZE_STYLE) -> bytes:
+    key = overlay_key("gaze", image_path, cand_idx, style, seq_100, IMAGE_FORMAT)
+    with instrument.timer("overlay:gaze"):
+        return render_cache.get_or_render(
+            key, lambda: _render("gaze", image_path, render_gaze_overlay, seq_100, style))
+
+def rec_overlay(image_path: Path, cand_idx: int, pt_100, style: dict = REC_STYLE) -> bytes:
+    key = overlay_key("rec", image_path, cand_idx, style, pt_100, IMAGE_FORMAT)
+    with instrument.timer("overlay:rec"):
+        return render_cache.get_or_render(
+            key, lambda: _render("rec", image_path, render_rec_overlay, pt_100, style))
+
+@st.cache_resource
+def get_fixations(store_dir: Path, stamps: dict) -> Fixations:
+    # Nulls dropped and dwell runs collapsed once, for the whole store
+    return preprocess(store.gaze)
 
+with st.sidebar:
+    collapse_dwell = st.checkbox("Collapse repeated fixations (circle size = dwell)")
+# None draws the raw sequences; resolved here, so prefetch jobs see this rerun's choice
+fixations = get_fixations(STORE_DIR, source_version) if collapse_dwell else None
+
+def candidate_gaze(fixations: Fixations | None, cand: int, seq_100: np.ndarray,
+                   scale: float = 1.0) -> tuple[np.ndarray, dict]:
+    # What to draw for global candidate `cand`, and with which style
+    if fixations is None:
+        return seq_100, scaled_style(GAZE_STYLE, scale)
+    points, dwell = fixations.sequence(cand)
+    return points, scaled_style({**GAZE_STYLE, "dwell": tuple(dwell.tolist())}, scale)
+
+# ─── 4) Score fusion: gaze + REC combined ranking ──────────────────────────────
+@st.cache_data
+def fusion_grid(stamps: dict, method: str, steps: int = 200) -> tuple[list, dict]:
+    # Every gaze weight on the grid, scored against gold@top-k in one vectorized pass
+    S, mask = stack_scores([store.gaze_distance, store.rec_distance], store.cand_offsets)
+    gold, _ = to_matrix(np.asarray(store.cand_type) == CAND_GOLD, store.cand_offsets, False)
+    weights = weight_grid(2, steps)
+    results = search_weights(S, mask, gold, weights, method)
+    return weights.tolist(), {k: v.tolist() for k, v in results.items()}
+
+@st.cache_data
+def fused_scores(stamps: dict, method: str, gaze_weight: float) -> np.ndarray:
+    S, mask = stack_scores([store.gaze_distance, store.rec_distance], store.cand_offsets)
+    return fuse(S, mask, [gaze_weight, 1.0 - gaze_weight], method)[mask]
 
-# ─── 1) Load JSON files (containing "gaze_sequences" with possible nulls) ───────
-with open("output/gaze_scoring_results_new.json") as f:
-    gaze_data = json.load(f)
-
-with open("output/rec_scoring_results_new.json") as f:
-    rec_data = json.load(f)
-
-# Build a dict keyed by image_path
-data = {}
-for g_entry, r_entry in zip(gaze_data, rec_data):
-    image_path = g_entry["image_path"]
-    assert image_path == r_entry["image_path"], "Mismatch between gaze and rec entries"
-
-    raw_gaze_sequences = g_entry.get("gaze_sequences", [])
-    raw_rec_points     = r_entry.get("rec_points", [])
-
-    n_candidates = len(g_entry["candidates"])
-    # If lengths don’t match, pad with empties/None
-    if not isinstance(raw_gaze_sequences, list) or len(raw_gaze_sequences) != n_candidates:
-        raw_gaze_sequences = [[] for _ in range(n_candidates)]
-    if not isinstance(raw_rec_points, list) or len(raw_rec_points) != n_candidates:
-        raw_rec_points = [None for _ in range(n_candidates)]
+with st.sidebar:
+    st.write("### Combined ranking")
+    fusion_method = st.selectbox("Fusion", METHODS, help=(
+        "sum: raw gaze + REC distances · minmax / zscore: per-example normalized · "
+        "rrf: reciprocal rank fusion · borda: summed ranks"
+    ))
+    with instrument.timer("fusion:grid_search"):
+        grid_weights, grid_results = fusion_grid(source_version, fusion_method)
+    best = best_setting({k: np.asarray(v) for k, v in grid_results.items()},
+                        np.asarray(grid_weights), "gold_at_top_1")
+    gaze_weight = st.slider("Gaze weight (REC = 1 − gaze)", 0.0, 1.0,
+                            0.5 if fusion_method == "sum" else float(best["weights"][0]), 0.005)
+    st.caption(f"Grid best for gold@1: gaze weight {best['weights'][0]:.3f} → "
+               f"{best['gold_at_top_1']} gold@1, {best['gold_at_top_3']} gold@3, MRR {best['mrr']:.3f}")
+    st.line_chart({"gold@1": grid_results["gold_at_top_1"], "gold@3": grid_results["gold_at_top_3"]})
+
+with instrument.timer("fusion:fuse"):
+    fused = fused_scores(source_version, fusion_method, gaze_weight)
+
+# ─── 5) Streamlit UI ───────────────────────────────────────────────────────────
+# 5.0 – Old vs new run comparison (replaces the per-example view while on)
+OLD_GAZE_PATH = Path("output/gaze_scoring_results_old.json")
+OLD_REC_PATH  = Path("output/rec_scoring_results_old.json")
+OLD_STORE_DIR = Path("output/scoring_store_old")
+
+@st.cache_resource
+def get_run_diff(old_stamps: dict, new_stamps: dict) -> RunDiff:
+    # Aligned by image_path, candidates by text; the store itself is reused for "new"
+    return diff_runs(open_run(OLD_GAZE_PATH, OLD_REC_PATH, OLD_STORE_DIR), store)
 
-    # Now store
-    data[image_path] = {
-        "candidates":     g_entry["candidates"],
-        "gaze_distances": g_entry["gaze_distances"],
-        "rec_distances":  r_entry["rec_distances"],
-        "gaze_sequences": raw_gaze_sequences,
-        "rec_points":     raw_rec_points,
-    }
+with st.sidebar:
+    compare_runs = st.checkbox("🔀 Compare old vs new run",
+                               disabled=not (OLD_GAZE_PATH.exists() and OLD_REC_PATH.exists()))
+if compare_runs:
+    with instrument.timer("diff:runs"):
+        run_diff = get_run_diff(source_stamps(OLD_GAZE_PATH, OLD_REC_PATH), source_version)
+    st.markdown("## Old vs New Run")
+    st.caption(f"{len(run_diff.old_idx)} examples in both runs · {run_diff.unmatched_old} only in old · "
+               f"{run_diff.unmatched_new} only in new")
+    if len(run_diff.old_idx) == 0:
+        st.warning("The runs share no image_path; nothing to compare.")
+        st.stop()
+    st.write("#### Summary deltas (new − old)")
+    st.dataframe([{"ranking": name, **deltas} for name, deltas in run_diff.summary_deltas().items()],
+                 use_container_width=True, hide_index=True)
+    dcol1, dcol2 = st.columns(2)
+    with dcol1:
+        diff_ranking = st.selectbox("Ranking", list(run_diff.rankings), index=list(run_diff.rankings).index("gaze"))
+    with dcol2:
+        diff_top = st.slider("Worst regressions", 5, 200, 20, 5)
+    regressed = run_diff.regressions(diff_ranking)
+    st.write(f"#### Worst regressions ({len(regressed)} examples got worse)")
+    st.dataframe(run_diff.rows(regressed[:diff_top], diff_ranking), use_container_width=True, hide_index=True)
+    st.stop()
 
-# ─── 2) Helper: load from local “output/overlayed_images/” ────────────────────
-def get_image_by_filename(filename: str) -> Image.Image | None:
-    p = Path("output/overlayed_images") / filename
-    return Image.open(p) if p.exists() else None
-
-# ─── 3) Drawing functions ──────────────────────────────────────────────────────
-def draw_sequence(
-    draw: ImageDraw.ImageDraw,
-    seq_100: list[tuple[float, float]],
-    sx: float,
-    sy: float,
-    cmap_name: str = "viridis",
-    last_color: str = "red",
-    label: bool = True
-):
-    """
-    seq_100: list of (x,y) pairs in 0–100 coordinates (floats)
-    sx, sy: scale factors to convert 0–100 → pixel coords
-    This function:
-      - Filters out any invalid or null entries
-      - Scales each (x, y) by (sx, sy)
-      - Draws a colored circle for each fixation (colormap by index)
-      - Draws a thick line between consecutive fixations
-      - Labels each fixation with its 1-based index
-      - Outlines the final fixation in `last_color`
-    """
-    # 3.1) Filter & scale
-    scaled_pts: list[tuple[int, int]] = []
-    for pt in seq_100:
-        if isinstance(pt, (list, tuple)) and len(pt) == 2:
-            x100, y100 = pt
-            if isinstance(x100, (int, float)) and isinstance(y100, (int, float)):
-                xp = int(round(x100 * sx))
-                yp = int(round(y100 * sy))
-                scaled_pts.append((xp, yp))
-
-    if len(scaled_pts) < 1:
-        print("EMPTY GAZE PT LIST")
-        return
-
-    N = len(scaled_pts)
-    cmap = cm.get_cmap(cmap_name, N)
-
-    # 3.2) Draw each fixation & line
-    for i, (x, y) in enumerate(scaled_pts):
-        rgb = tuple(int(255 * c) for c in cmap(i)[:3])
-        r = 4
-        draw.ellipse((x - r, y - r, x + r, y + r), fill=rgb)
-        if i > 0:
-            x_prev, y_prev = scaled_pts[i - 1]
-            draw.line([(x_prev, y_prev), (x, y)], fill=rgb, width=4)
-        if label:
-            draw.text((x + 5, y - 5), str(i + 1), fill="white")
-
-    # 3.3) Outline the last fixation
-    fx, fy = scaled_pts[-1]
-    r2 = 6
-    draw.ellipse((fx - r2, fy - r2, fx + r2, fy + r2), outline=last_color, width=3)
-
-def draw_rec_point(
-    draw: ImageDraw.ImageDraw,
-    pt_100: list[float],
-    sx: float,
-    sy: float,
-    color: str = "yellow",
-    radius: int = 6
-):
-    """
-    pt_100: single [x,y] in 0–100 coords
-    sx, sy: scale factors to convert 0–100 → pixels
-    Draws a filled circle at the scaled location.
-    """
-    if not isinstance(pt_100, (list, tuple)) or len(pt_100) != 2:
-        return
-    x100, y100 = pt_100
-    if not isinstance(x100, (int, float)) or not isinstance(y100, (int, float)):
-        return
-
-    x_px = int(round(x100 * sx))
-    y_px = int(round(y100 * sy))
-    r = radius
-    draw.ellipse((x_px - r, y_px - r, x_px + r, y_px + r), fill=color, outline=color)
-
-# ─── 4) Streamlit UI ───────────────────────────────────────────────────────────
-# Build readable labels using the first gold reference from gaze reranking
-example_labels = []
-example_keys = []
-
-for img_path, entry in data.items():
-    candidates = entry["candidates"]
-    gaze_distances = entry["gaze_distances"]
-
-    # Sort by gaze distance
-    sorted_indices = sorted(range(len(candidates)), key=lambda i: gaze_distances[i])
-    gold_text = None
-    for i in sorted_indices:
-        if candidates[i]["type"] == "gold":
-            gold_text = candidates[i]["text"]
-            break
-    label = gold_text if gold_text else "[No Gold]"
-
-    # Create a display label and keep mapping to real path
-    example_labels.append(f"{label}")
-    example_keys.append(img_path)
-    
-selected_label = st.selectbox("🔎 Choose an example:", example_labels)
-selected_image_path = example_keys[example_labels.index(selected_label)]
-
-entry = data[selected_image_path]
-filename = Path(selected_image_path).name
-candidates = entry["candidates"]
-gaze_distances = entry["gaze_distances"]
-rec_distances = entry["rec_distances"]
-gaze_sequences = entry["gaze_sequences"]
-rec_points     = entry["rec_points"]
-
-# 4.1 – Load the overlayed image (512×320, with bbox already drawn)
-base_image = get_image_by_filename(filename)
-if base_image is None:
+# Readable labels (first gold reference under gaze reranking) are precomputed in the
+# store; the selectbox works on example indices, so duplicate labels stay distinct.
+MAX_OPTIONS = 5000
+
+query = st.text_input("🔎 Search candidate texts (substring, typo-tolerant):", "")
+with instrument.timer("search"):
+    matches = search_index.search(query) if query.strip() else np.arange(len(store))
+
+# Region filter: keep examples with fixations inside a rectangle (0–100 gaze coords)
+with st.sidebar.expander("🎯 Gaze region filter"):
+    region_on = st.checkbox("Only examples with fixations in this region")
+    rx = st.slider("x range", 0.0, 100.0, (40.0, 60.0), 0.5, disabled=not region_on)
+    ry = st.slider("y range", 0.0, 100.0, (40.0, 60.0), 0.5, disabled=not region_on)
+    final_only = st.checkbox("Final fixation only", disabled=not region_on)
+if region_on:
+    with instrument.timer("region_filter"):
+        hits = spatial_index.rect(rx[0], ry[0], rx[1], ry[1], final_only=final_only)
+        matches = np.intersect1d(matches, hits.examples())
+    st.sidebar.caption(f"{len(hits.fixation)} fixations from {len(hits.candidates())} candidates "
+                       f"in {len(hits.examples())} examples")
+if len(matches) == 0:
+    st.warning(f"No example matches “{query}”.")
+    st.stop()
+if len(matches) > MAX_OPTIONS:
+    st.caption(f"Showing the first {MAX_OPTIONS} of {len(matches)} examples — refine the search to narrow it down.")
+
+with instrument.timer("labels:selectbox"):
+    selected_idx = int(st.selectbox(
+        "Choose an example:",
+        matches[:MAX_OPTIONS].tolist(),
+        format_func=lambda i: store.labels[i],
+    ))
+
+# Array slices of the store: fixations come pre-validated, texts interned
+with instrument.timer("load:example"):
+    example = store.example(selected_idx)
+filename = Path(example.image_path).name
+texts = example.texts
+is_gold = example.cand_type == CAND_GOLD
+gaze_distances = example.gaze_distance
+rec_distances = example.rec_distance
+
+# 5.1 – Locate the overlayed image (512×320, with bbox already drawn)
+base_path = get_image_path(filename)
+if base_path is None:
     st.error(f"Could not find '{filename}' in output/overlayed_images/.")
     st.stop()
 
-img_w, img_h = base_image.size  # expected (512, 320)
-sx = img_w / 100.0
-sy = img_h / 100.0
-
 # ────────────────────────────────────────────────────────────────────────────────
-# 4.2 – Show the single overlayed image at the top
+# 5.2 – Show the single overlayed image at the top
 st.subheader("① Overlayed Image (with bounding box already)")
-st.image(base_image, use_container_width=True)
+with instrument.timer("image_io:overlayed_image"):
+    base_bytes = base_path.read_bytes()
+show_image(base_bytes, use_container_width=True)
 
 # ────────────────────────────────────────────────────────────────────────────────
-# 4.3 – Show reranked tables side by side
-def reranked_table(cands, dists, title: str):
+# 5.3 – Show reranked tables side by side
+def reranked_table(dists: np.ndarray, title: str):
     st.write(f"#### {title}")
-    for dist, cand in sorted(zip(dists, cands), key=lambda x: x[0]):
-        tag = "🟡 Gold" if cand["type"] == "gold" else "⚪️ Gen"
-        st.markdown(f"- `{dist:.2f}`  **{cand['text']}** ({tag})")
+    for i in np.argsort(dists, kind="stable"):
+        tag = "🟡 Gold" if is_gold[i] else "⚪️ Gen"
+        st.markdown(f"- `{dists[i]:.2f}`  **{texts[i]}** ({tag})")
 
 st.markdown("## Reranked Lists")
-col1, col2 = st.columns(2)
+col1, col2, col3 = st.columns(3)
 with col1:
-    reranked_table(candidates, gaze_distances, "👁️ Gaze-Based Ranking")
+    reranked_table(gaze_distances, "👁️ Gaze-Based Ranking")
 with col2:
-    reranked_table(candidates, rec_distances, "📍 REC-Based Ranking")
+    reranked_table(rec_distances, "📍 REC-Based Ranking")
+with col3:
+    c0, c1 = store.candidate_range(selected_idx)
+    reranked_table(fused[c0:c1], f"🔀 Combined ({fusion_method})")
 
 # ────────────────────────────────────────────────────────────────────────────────
-# 4.4 – Detailed Overlays in Gaze‐ranked order (lowest distance first)
+# 5.4 – Aggregate gaze heatmap over many candidates, on this example's image
+@st.cache_data
+def aggregate_heat(stamps: dict, selection: str, sigma: float, examples: np.ndarray | None,
+                   final_only: bool) -> tuple[np.ndarray, int]:
+    example_mask = None
+    if examples is not None:
+        example_mask = np.zeros(len(store), dtype=bool)
+        example_mask[examples] = True
+    return selection_heat(store, selection, sigma, example_mask=example_mask, final_only=final_only)
+
+with st.expander("🔥 Aggregate gaze heatmap"):
+    hcol1, hcol2 = st.columns(2)
+    with hcol1:
+        heat_selection = st.selectbox("Candidates", list(SELECTIONS), index=1)
+        heat_scope = st.radio("Examples", ["all", "current search / region filter"], horizontal=True)
+    with hcol2:
+        heat_sigma = st.slider("Blur (σ, bins)", 0.0, 10.0, 3.0, 0.5)
+        heat_final = st.checkbox("Final fixations only", key="heat_final")
+    with instrument.timer("heatmap:accumulate"):
+        heat, n_fix = aggregate_heat(source_version, heat_selection, heat_sigma,
+                                     matches if heat_scope != "all" else None, heat_final)
+    with instrument.timer("heatmap:render"):
+        heat_img = encode_image(render_heatmap(load_base_image(str(base_path)), heat), IMAGE_FORMAT)
+    show_image(heat_img, use_container_width=True)
+    st.caption(f"{n_fix} fixations · {heat_selection}")
+
+# ────────────────────────────────────────────────────────────────────────────────
+# 5.5 – Detailed Overlays in Gaze‐ranked order (lowest distance first)
 st.markdown("## Detailed Overlays per Candidate (Gaze‐ranked order)")
 
-# Build a list of indices sorted by gaze_distance
-gaze_sorted_indices = [i for _, i in sorted((d, i) for i, d in enumerate(gaze_distances))]
+# Indices sorted by gaze_distance (stable, like the tables above)
+gaze_sorted_indices = np.argsort(gaze_distances, kind="stable").tolist()
+panel_path, panel_scale = panel_image(base_path)
 
 for idx in gaze_sorted_indices:
-    cand = candidates[idx]
-    st.write(f"**Reference:** {cand['text']}  (`{cand['type']}`)")
-
-    # 4.4.1 – Draw gaze path (filtering out nulls)
-    raw_seq = gaze_sequences[idx] if idx < len(gaze_sequences) else []
-    img_gaze = base_image.copy()
-    draw_g   = ImageDraw.Draw(img_gaze)
-    draw_sequence(draw_g, raw_seq, sx, sy, cmap_name="viridis", last_color="red", label=True)
+    st.write(f"**Reference:** {texts[idx]}  (`{CAND_TYPE_NAMES[int(example.cand_type[idx])]}`)")
 
-    # 4.4.2 – Draw REC point (if present)
-    raw_rec = rec_points[idx] if idx < len(rec_points) else None
-    img_rec = base_image.copy()
-    draw_r  = ImageDraw.Draw(img_rec)
-    draw_rec_point(draw_r, raw_rec, sx, sy, color="yellow", radius=6)
+    # 5.5.1 – Gaze path (valid fixations only) and 5.5.2 – REC point (NaN if absent)
+    img_gaze = gaze_overlay(panel_path, idx, *candidate_gaze(fixations, c0 + idx, example.gaze[idx], panel_scale))
+    img_rec  = rec_overlay(panel_path, idx, example.rec_point[idx], scaled_style(REC_STYLE, panel_scale))
 
     col1, col2 = st.columns(2)
     with col1:
-        st.image(img_gaze, use_container_width=True)
+        show_image(img_gaze, use_container_width=True)
         st.write(f"- Gaze distance: `{gaze_distances[idx]:.2f}`")
     with col2:
-        st.image(img_rec, use_container_width=True)
+        show_image(img_rec, use_container_width=True)
         st.write(f"- REC distance: `{rec_distances[idx]:.2f}`")
 
     st.write("---")
 
-from scipy.stats import spearmanr
-
-def compute_length_metrics(sort_by: str):
-    top1_lens = []
-    lengths = []
-    ranks = []
-    short_in_top3 = 0
-    total_top3 = 0
-
-    for d in data.values():
-        cands = d["candidates"]
-        dists = d[f"{sort_by}_distances"]
-        sorted_idxs = sorted(range(len(dists)), key=lambda j: dists[j])
-
-        # Top-1
-        top1_idx = sorted_idxs[0]
-        top1_lens.append(len(cands[top1_idx]["text"].split()))
+REPORT_PATH = Path("output/eval_report_new.json")
+METRIC_CACHE_DIR = Path("output/metric_cache_new")
 
-        # Length vs Rank
-        for rank, idx in enumerate(sorted_idxs):
-            lengths.append(len(cands[idx]["text"].split()))
-            ranks.append(rank + 1)
+@st.cache_data
+def evaluation_report(stamps: dict) -> dict:
+    # gold@top-k / gold position / MRR and reference-length metrics for
+    # rec, gaze and combined (= gaze + REC distance), precomputed by
+    # `python eval_report.py`; rebuilt here (and saved for the next session)
+    # only when that report is missing or older than the scoring files, and
+    # then the per-example metric cache re-scores only the changed examples
+    report = load_report(REPORT_PATH, GAZE_PATH, REC_PATH)
+    if report is None:
+        report = build_report(store, GAZE_PATH, REC_PATH, METRIC_CACHE_DIR)
+        write_report(report, REPORT_PATH)
+    return summary_of(report)
 
-        # Short in top-3
-        for idx in sorted_idxs[:3]:
-            if len(cands[idx]["text"].split()) <= 3:
-                short_in_top3 += 1
-            total_top3 += 1
 
-    avg_len_top1 = sum(top1_lens) / len(top1_lens)
-    corr_len_rank, _ = spearmanr(lengths, ranks)
-    pct_short_top3 = 100 * short_in_top3 / total_top3
-
-    return avg_len_top1, corr_len_rank, pct_short_top3
-
-# Get metrics for all three ranking types
-avg_len_gaze, corr_gaze, pct_short_gaze = compute_length_metrics("gaze")
-avg_len_rec, corr_rec, pct_short_rec = compute_length_metrics("rec")
-
-# For "combined", define combined_distances dynamically
-for d in data.values():
-    d["combined_distances"] = [a + b for a, b in zip(d["gaze_distances"], d["rec_distances"])]
-
-avg_len_comb, corr_comb, pct_short_comb = compute_length_metrics("combined")
+with st.sidebar:
+    with instrument.timer("eval:report"):
+        report = evaluation_report(source_version)
+    st.write(report)
+
+@st.cache_data
+def significance_report(stamps: dict, n_resamples: int, alpha: float) -> dict[str, list[dict]]:
+    # Bootstrap CIs (rates, not counts) and paired gaze / REC / combined tests
+    return store_significance(store, n_resamples=n_resamples, alpha=alpha)
+
+with st.sidebar.expander("📏 Confidence intervals & significance"):
+    n_resamples = st.select_slider("Resamples", [1000, 2000, 5000, 10000, 20000], value=DEFAULT_RESAMPLES)
+    confidence = st.select_slider("Confidence", [0.80, 0.90, 0.95, 0.99], value=0.95)
+    with instrument.timer("eval:significance"):
+        significance = significance_report(source_version, n_resamples, round(1 - confidence, 4))
+    st.dataframe(significance["intervals"], use_container_width=True, hide_index=True)
+    st.caption("Paired differences a − b: bootstrap CI and sign-flip permutation p-value")
+    st.dataframe(significance["comparisons"], use_container_width=True, hide_index=True)
+
+# ─── 6) Background prefetch of the examples likely to be opened next ──────────
+# Neighbours in the selectbox order first, then the top-N by the chosen
+# criterion; a new selection cancels whatever is still queued.
+PREFETCH_CRITERIA = {
+    "none":                          None,
+    "worst combined gold rank":      lambda r: r["combined"],
+    "largest gaze vs REC rank gap":  lambda r: np.abs(r["gaze"] - r["rec"]),
+}
+
+@st.cache_resource
+def get_prefetcher() -> Prefetcher:
+    # One pool for the process; each session schedules (and cancels) only its own work
+    return Prefetcher(workers=2)
+
+if "prefetch_owner" not in st.session_state:
+    st.session_state.prefetch_owner = uuid.uuid4().hex
+
+@st.cache_data
+def gold_rank_table(stamps: dict, method: str, gaze_weight: float) -> dict[str, np.ndarray]:
+    is_gold_all = np.asarray(store.cand_type) == CAND_GOLD
+    scores = {"gaze": store.gaze_distance, "rec": store.rec_distance,
+              "combined": fused_scores(stamps, method, gaze_weight)}
+    return {
+        name: best_gold_ranks(candidate_ranks(np.asarray(s), store.cand_offsets), store.cand_offsets, is_gold_all)
+        for name, s in scores.items()
+    }
 
+def overlay_jobs(store: ScoringStore, thumbs: ThumbnailPyramid, fixations: Fixations | None, e: int) -> list:
+    # Runs on a pool thread (no Streamlit context): everything it needs is passed in
+    ex = store.example(e)
+    path = get_image_path(Path(ex.image_path).name)
+    if path is None:
+        return []
+    path, scale = thumbs.path(path, PANEL_WIDTH), thumbs.scale(path, PANEL_WIDTH)
+    c0 = store.candidate_range(e)[0]
+    jobs = []
+    for c in np.argsort(ex.gaze_distance, kind="stable").tolist():  # display order
+        jobs.append(partial(gaze_overlay, path, c, *candidate_gaze(fixations, c0 + c, ex.gaze[c], scale)))
+        jobs.append(partial(rec_overlay, path, c, ex.rec_point[c], scaled_style(REC_STYLE, scale)))
+    return jobs
 
 with st.sidebar:
-    st.write({
-        "total_examples": 100,
-        "gold_at_top_rec": 36,
-        "gold_at_top_gaze": 32,
-        "gold_at_top_combined": 36,
-        "gold_in_top3_rec": 57,
-        "gold_in_top3_gaze": 71,
-        "gold_in_top3_combined": 74,
-        "avg_gold_position_rec": 5.8901098901098905,
-        "avg_gold_position_gaze": 5.4322344322344325,
-        "avg_gold_position_combined": 5.2967032967032965,
-        "avg_distance_to_center_rec": 67.3057957222177,
-        "avg_distance_to_center_gaze": 80.43525600992326,
-        "avg_distance_to_center_combined": 73.8705258661,
-        "avg_ref_length_at_top_gaze": avg_len_gaze,
-        "avg_ref_length_at_top_rec": avg_len_rec,
-        "avg_ref_length_at_top_combined": avg_len_comb,
-        "length_rank_corr_gaze": corr_gaze,
-        "length_rank_corr_rec": corr_rec,
-        "length_rank_corr_combined": corr_comb,
-        "pct_short_refs_in_top3_gaze": pct_short_gaze,
-        "pct_short_refs_in_top3_rec": pct_short_rec,
-        "pct_short_refs_in_top3_combined": pct_short_comb,
-    })
+    st.write("### Prefetch")
+    criterion = st.selectbox("Also pre-render the top examples by", list(PREFETCH_CRITERIA))
+    top_n = st.slider("How many", 0, 20, 5, disabled=criterion == "none")
+
+options = matches[:MAX_OPTIONS]
+pos = int(np.searchsorted(options, selected_idx))
+targets = [int(options[p]) for p in (pos + 1, pos - 1) if 0 <= p < len(options)]
+if PREFETCH_CRITERIA[criterion] is not None and top_n:
+    with instrument.timer("prefetch:rank_examples"):
+        key = PREFETCH_CRITERIA[criterion](gold_rank_table(source_version, fusion_method, gaze_weight))
+    for e in np.argsort(-key, kind="stable")[:top_n + len(targets) + 1].tolist():
+        if e != selected_idx and e not in targets and len(targets) < 2 + top_n:
+            targets.append(e)
+with instrument.timer("prefetch:schedule"):
+    # job lists are built on the pool threads, not in this rerun
+    build_jobs = partial(overlay_jobs, store, get_thumbnails(), fixations)
+    get_prefetcher().schedule((partial(build_jobs, e) for e in targets), owner=st.session_state.prefetch_owner)
+st.sidebar.caption(f"Pre-rendering {len(targets)} examples · "
+                   f"{get_prefetcher().stats(st.session_state.prefetch_owner)}")
+
+# ─── 7) Timing breakdown of this rerun ─────────────────────────────────────────
+if profiling:
+    timings = instrument.finish_run()
+    with st.sidebar:
+        st.write("### ⏱ This rerun")
+        st.dataframe(timings, use_container_width=True, hide_index=True)
+        if st.button("Dump cumulative stats"):
+            st.caption(f"Wrote {instrument.dump_stats()}")
+        if profiler is not None:
+            st.caption(f"cProfile written to {instrument.stop_profile(profiler)}")
 
 
 
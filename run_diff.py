@@ -0,0 +1,247 @@
+"""
+Old vs new scoring run comparison.
+
+Both runs are opened as columnar stores. Examples are aligned by
+`image_path` with a hash join, and candidates within an aligned pair by
+text: 64-bit hashes of the stores' UTF-8 bytes, so matching is a sorted-key
+intersection with no string decoding and no nested loops. Then, for every
+ranking (rec / gaze / combined) and every aligned example at once:
+
+  best gold rank   old and new rank of the example's best gold candidate
+                   (0 = no gold), and the reciprocal-rank change
+  Kendall tau-b    agreement of the old and new orderings of the candidates
+                   both runs share, from one (pairs × M·(M−1)/2) sign comparison
+  summary deltas   gold@k / MRR / mean gold position over the aligned
+                   examples, new − old
+
+Regressions are aligned examples whose best gold got worse (reciprocal
+rank dropped), largest drop first.
+
+Usage:
+    python run_diff.py [--old-gaze G.json --old-rec R.json] [--new-gaze ... --new-rec ...] [--top 20]
+"""
+import argparse
+import json
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from ranking_eval import DEFAULT_KS, STORE_RANKINGS, best_gold_ranks, candidate_ranks, summarize, to_matrix
+from scoring_store import CAND_GOLD, ScoringStore, build_store, is_store
+
+RANKINGS = tuple(STORE_RANKINGS)
+
+# Bounds the (pairs × M·(M−1)/2) sign block held at once
+_CHUNK_ELEMS = 1 << 22
+
+
+class RankingDiff(NamedTuple):
+    """Per aligned example (P pairs) for one ranking."""
+    best_gold_old: np.ndarray  # (P,) 0 = no gold
+    best_gold_new: np.ndarray
+    rr_delta: np.ndarray       # (P,) new − old reciprocal rank of the best gold; < 0 is a regression
+    kendall_tau: np.ndarray    # (P,) NaN with fewer than two shared, untied candidates
+    summary_old: dict
+    summary_new: dict
+
+
+class RunDiff(NamedTuple):
+    old_idx: np.ndarray      # (P,) example index in the old store
+    new_idx: np.ndarray      # (P,) aligned example index in the new store
+    image_paths: list[str]   # (P,)
+    n_common: np.ndarray     # (P,) candidates both runs share
+    unmatched_old: int
+    unmatched_new: int
+    rankings: dict[str, RankingDiff]
+
+    def summary_deltas(self) -> dict[str, dict[str, float]]:
+        """ranking -> stat -> new − old over the aligned examples."""
+        return {
+            name: {k: r.summary_new[k] - r.summary_old[k] for k in r.summary_new if k != "total_examples"}
+            for name, r in self.rankings.items()
+        }
+
+    def regressions(self, ranking: str = "gaze") -> np.ndarray:
+        """Pair indices whose best gold got worse under `ranking`, largest drop first."""
+        r = self.rankings[ranking]
+        worse = np.flatnonzero(r.rr_delta < 0)
+        tau = np.nan_to_num(r.kendall_tau[worse], nan=1.0)
+        return worse[np.lexsort((tau, r.rr_delta[worse]))]
+
+    def rows(self, pairs: np.ndarray, ranking: str = "gaze") -> list[dict]:
+        """Table rows for `pairs` (e.g. `regressions(...)[:20]`)."""
+        r = self.rankings[ranking]
+        return [
+            {"image_path": self.image_paths[p],
+             "best_gold_old": int(r.best_gold_old[p]), "best_gold_new": int(r.best_gold_new[p]),
+             "rr_delta": float(r.rr_delta[p]), "kendall_tau": float(r.kendall_tau[p]),
+             "shared_candidates": int(self.n_common[p])}
+            for p in np.asarray(pairs).tolist()
+        ]
+
+
+def align_examples(old_paths: list[str], new_paths: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Hash join on image_path: (old_idx, new_idx) of every example present in both (first occurrence)."""
+    build: dict[str, int] = {}
+    for i, path in enumerate(old_paths):
+        build.setdefault(path, i)
+    old_idx, new_idx, seen = [], [], set()
+    for j, path in enumerate(new_paths):
+        i = build.get(path)
+        if i is not None and path not in seen:
+            seen.add(path)
+            old_idx.append(i)
+            new_idx.append(j)
+    return np.asarray(old_idx, dtype=np.int64), np.asarray(new_idx, dtype=np.int64)
+
+
+def _text_hashes(store: ScoringStore) -> np.ndarray:
+    """
+    (C,) int64 hash of every candidate text: each unique text's UTF-8 bytes
+    are hashed straight from the store's blob, never decoded. Python's
+    bytes hash is seeded per process, so only compare hashes computed in
+    the same process.
+    """
+    table = store.texts.table
+    blob = bytes(np.asarray(table.blob))
+    offsets = np.asarray(table.offsets, dtype=np.int64).tolist()
+    texts = map(blob.__getitem__, map(slice, offsets[:-1], offsets[1:]))
+    hashes = np.fromiter(map(hash, texts), dtype=np.int64, count=len(offsets) - 1)
+    return hashes[np.asarray(store.texts.ids)]
+
+
+def _example_rows(store: ScoringStore, idx: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Candidate rows of examples `idx`, back to back, and their (len(idx)+1,) offsets."""
+    offsets = np.asarray(store.cand_offsets, dtype=np.int64)
+    counts = np.diff(offsets)[idx]
+    sub_offsets = np.zeros(len(idx) + 1, dtype=np.int64)
+    np.cumsum(counts, out=sub_offsets[1:])
+    rows = np.repeat(offsets[idx] - sub_offsets[:-1], counts) + np.arange(sub_offsets[-1])
+    return rows, sub_offsets
+
+
+_PAIR_MIX = np.uint64(0x9E3779B97F4A7C15)  # odd, so distinct pairs shift a text's key apart
+
+
+def _candidate_keys(rows: np.ndarray, sub_offsets: np.ndarray,
+                    text_hashes: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    One uint64 key per (pair, text), sorted, and each key's pair and row
+    (first occurrence of a text within a pair).
+    """
+    pair = np.repeat(np.arange(len(sub_offsets) - 1), np.diff(sub_offsets))
+    keys = text_hashes[rows].view(np.uint64) + pair.astype(np.uint64) * _PAIR_MIX
+    keys, first = np.unique(keys, return_index=True)
+    return keys, pair[first], rows[first]
+
+
+def _reciprocal(best_gold: np.ndarray) -> np.ndarray:
+    return np.divide(1.0, best_gold, out=np.zeros(len(best_gold)), where=best_gold > 0)
+
+
+def _kendall_tau_b(old_s: np.ndarray, new_s: np.ndarray) -> np.ndarray:
+    """
+    Row-wise tau-b of two (P, M) score matrices padded with NaN; NaN where
+    undefined. Pair signs come from comparisons, so inf ties with inf and
+    padding compares as a tie with everything.
+    """
+    n, width = old_s.shape
+    i, j = np.triu_indices(width, 1)
+    tau = np.full(n, np.nan)
+    step = max(1, _CHUNK_ELEMS // max(len(i), 1))
+    for start in range(0, n, step):
+        c = slice(start, start + step)
+        o, w = old_s[c], new_s[c]
+        a = (o[:, i] > o[:, j]).astype(np.int8) - (o[:, i] < o[:, j])
+        b = (w[:, i] > w[:, j]).astype(np.int8) - (w[:, i] < w[:, j])
+        num = (a * b).sum(axis=1, dtype=np.int64)
+        den = np.sqrt(np.count_nonzero(a, axis=1) * np.count_nonzero(b, axis=1))
+        ok = den > 0
+        tau[c][ok] = num[ok] / den[ok]
+    return tau
+
+
+def diff_runs(old: ScoringStore, new: ScoringStore, ks=DEFAULT_KS) -> RunDiff:
+    ks = tuple(ks)
+    new_paths = new.image_paths.tolist()
+    old_idx, new_idx = align_examples(old.image_paths.tolist(), new_paths)
+    n_pairs = len(old_idx)
+
+    old_sub, old_sub_offsets = _example_rows(old, old_idx)
+    new_sub, new_sub_offsets = _example_rows(new, new_idx)
+
+    # Candidate alignment: same text (hash) within an aligned pair
+    old_keys, _, old_rows = _candidate_keys(old_sub, old_sub_offsets, _text_hashes(old))
+    new_keys, new_pair, new_rows = _candidate_keys(new_sub, new_sub_offsets, _text_hashes(new))
+    _, oi, ni = np.intersect1d(old_keys, new_keys, assume_unique=True, return_indices=True)
+    ni_sorted = np.argsort(new_pair[ni], kind="stable")  # group shared candidates by pair
+    oi, ni = oi[ni_sorted], ni[ni_sorted]
+    shared_old, shared_new = old_rows[oi], new_rows[ni]
+    n_common = np.bincount(new_pair[ni], minlength=n_pairs)
+    shared_offsets = np.zeros(n_pairs + 1, dtype=np.int64)
+    np.cumsum(n_common, out=shared_offsets[1:])
+
+    old_gold = np.asarray(old.cand_type)[old_sub] == CAND_GOLD
+    new_gold = np.asarray(new.cand_type)[new_sub] == CAND_GOLD
+
+    rankings = {}
+    for name in RANKINGS:
+        old_scores = np.asarray(STORE_RANKINGS[name](old), dtype=np.float64)
+        new_scores = np.asarray(STORE_RANKINGS[name](new), dtype=np.float64)
+        so, sn = old_scores[old_sub], new_scores[new_sub]
+        ro, rn = candidate_ranks(so, old_sub_offsets), candidate_ranks(sn, new_sub_offsets)
+        bo = best_gold_ranks(ro, old_sub_offsets, old_gold)
+        bn = best_gold_ranks(rn, new_sub_offsets, new_gold)
+        O, _ = to_matrix(old_scores[shared_old], shared_offsets, np.nan)
+        N, _ = to_matrix(new_scores[shared_new], shared_offsets, np.nan)
+        rankings[name] = RankingDiff(
+            best_gold_old=bo, best_gold_new=bn, rr_delta=_reciprocal(bn) - _reciprocal(bo),
+            kendall_tau=_kendall_tau_b(O, N),
+            summary_old=summarize(so, old_sub_offsets, old_gold, ks, ranks=ro),
+            summary_new=summarize(sn, new_sub_offsets, new_gold, ks, ranks=rn),
+        )
+    return RunDiff(
+        old_idx=old_idx, new_idx=new_idx,
+        image_paths=[new_paths[j] for j in new_idx.tolist()],
+        n_common=n_common,
+        unmatched_old=len(old) - n_pairs, unmatched_new=len(new) - n_pairs,
+        rankings=rankings,
+    )
+
+
+def open_run(gaze: Path | str, rec: Path | str, store_dir: Path | str) -> ScoringStore:
+    if not is_store(store_dir, gaze, rec):
+        build_store(gaze, rec, store_dir)
+    return ScoringStore(store_dir)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--old-gaze", default="output/gaze_scoring_results_old.json")
+    ap.add_argument("--old-rec", default="output/rec_scoring_results_old.json")
+    ap.add_argument("--old-store", default="output/scoring_store_old")
+    ap.add_argument("--new-gaze", default="output/gaze_scoring_results_new.json")
+    ap.add_argument("--new-rec", default="output/rec_scoring_results_new.json")
+    ap.add_argument("--new-store", default="output/scoring_store_new")
+    ap.add_argument("--ranking", default="gaze", choices=RANKINGS, help="ranking to list regressions for")
+    ap.add_argument("--top", type=int, default=20, help="regressions to list")
+    args = ap.parse_args()
+
+    diff = diff_runs(open_run(args.old_gaze, args.old_rec, args.old_store),
+                     open_run(args.new_gaze, args.new_rec, args.new_store))
+    r = diff.rankings[args.ranking]
+    print(json.dumps({
+        "aligned_examples": len(diff.old_idx),
+        "unmatched_old":    diff.unmatched_old,
+        "unmatched_new":    diff.unmatched_new,
+        "mean_kendall_tau": {name: float(np.nanmean(d.kendall_tau)) if np.isfinite(d.kendall_tau).any() else None
+                             for name, d in diff.rankings.items()},
+        "summary_deltas":   diff.summary_deltas(),
+        f"regressions_{args.ranking}": int((r.rr_delta < 0).sum()),
+        "worst":            diff.rows(diff.regressions(args.ranking)[:args.top], args.ranking),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
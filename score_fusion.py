@@ -0,0 +1,380 @@
+"""
+Vectorized score fusion and weight search for combined rankings.
+
+Rankings are stacked into a (K rankings × E examples × M candidates) matrix,
+padded per example with a mask. Supported fusions (all lower = better):
+
+  sum       weighted sum of the raw scores (rerank_vis.py's gaze + REC)
+  minmax    weighted sum of per-example min-max normalized scores
+  zscore    weighted sum of per-example z-scores
+  rrf       reciprocal rank fusion, -Σ w / (k + rank)
+  borda     weighted Borda count, Σ w · rank
+
+`search_weights` evaluates many weight vectors at once. For two rankings
+(the gaze + REC case) a candidate's fused score crosses a gold candidate's
+at one weight ratio, so each (candidate, gold) pair is solved once and the
+settings, sorted by ratio, are swept by counting crossings; the cost barely
+depends on the number of settings. Otherwise the fused scores of a chunk of
+settings are computed at once, and gold@k / MRR are read off the rank of each
+example's best gold candidate without sorting.
+
+Usage:
+    python score_fusion.py [--method minmax] [--steps 100] [--random N]
+"""
+import argparse
+import json
+from itertools import product
+from typing import Iterable
+
+import numpy as np
+
+from ranking_eval import DEFAULT_KS, to_matrix
+from scoring_store import CAND_GOLD, ScoringStore, build_store, is_store
+
+METHODS = ("sum", "minmax", "zscore", "rrf", "borda")
+RRF_K = 60
+
+# Bounds the (settings × examples × candidates) block evaluated at once
+_CHUNK_ELEMS = 1 << 23
+# Stand-in for inf scores inside weighted sums (0 · inf would be NaN)
+_INF_SCORE = 1e12
+
+
+def stack_scores(columns: list[np.ndarray], cand_offsets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(K, E, M) score stack padded with +inf, and the (E, M) mask of real candidates."""
+    mats = []
+    mask = None
+    for col in columns:
+        m, mask = to_matrix(np.asarray(col, dtype=np.float64), cand_offsets, np.inf)
+        mats.append(m)
+    return np.stack(mats), mask
+
+
+def _finite_extremes(S: np.ndarray, mask: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    finite = np.isfinite(S) & mask
+    lo = np.where(finite, S, np.inf).min(axis=-1, keepdims=True)
+    hi = np.where(finite, S, -np.inf).max(axis=-1, keepdims=True)
+    return lo, hi
+
+
+def minmax_normalize(S: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """Per example and ranking to [0, 1]; inf (no data) maps to 1, constant rows to 0."""
+    lo, hi = _finite_extremes(S, mask)
+    span = np.where(hi > lo, hi - lo, 1.0)
+    with np.errstate(invalid="ignore"):
+        out = (S - lo) / span
+    out = np.where(np.isfinite(S), out, 1.0)
+    out = np.where(np.isfinite(lo), out, 1.0)
+    return np.where(mask, out, np.inf)
+
+
+def zscore_normalize(S: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """Per example and ranking z-scores; inf maps one unit above the worst finite score."""
+    finite = np.isfinite(S) & mask
+    n = np.maximum(finite.sum(axis=-1, keepdims=True), 1)
+    vals = np.where(finite, S, 0.0)
+    mean = vals.sum(axis=-1, keepdims=True) / n
+    std = np.sqrt((np.where(finite, S - mean, 0.0) ** 2).sum(axis=-1, keepdims=True) / n)
+    z = np.where(finite, (vals - mean) / np.where(std > 0, std, 1.0), 0.0)
+    worst = np.where(finite, z, -np.inf).max(axis=-1, keepdims=True)
+    z = np.where(finite, z, np.where(np.isfinite(worst), worst, 0.0) + 1.0)
+    return np.where(mask, z, np.inf)
+
+
+def rank_stack(S: np.ndarray) -> np.ndarray:
+    """1-based ranks along the candidate axis (stable: ties keep candidate order)."""
+    order = np.argsort(S, axis=-1, kind="stable")
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(1, S.shape[-1] + 1), axis=-1)
+    return ranks
+
+
+def prepare(S: np.ndarray, mask: np.ndarray, method: str) -> np.ndarray:
+    """Per-ranking term that `fuse` combines linearly with the weights."""
+    if method == "sum":
+        return S
+    if method == "minmax":
+        return minmax_normalize(S, mask)
+    if method == "zscore":
+        return zscore_normalize(S, mask)
+    if method == "rrf":
+        return -1.0 / (RRF_K + rank_stack(S))
+    if method == "borda":
+        return rank_stack(S).astype(np.float64)
+    raise ValueError(f"unknown fusion method {method!r}, expected one of {METHODS}")
+
+
+def _linear_terms(S: np.ndarray, mask: np.ndarray, method: str) -> np.ndarray:
+    """`prepare` with padding zeroed and inf capped, so weights of 0 never make NaN."""
+    terms = prepare(S, mask, method)
+    return np.where(mask, np.where(np.isfinite(terms), terms, _INF_SCORE), 0.0)
+
+
+def _weighted_sum(weights: np.ndarray, terms: np.ndarray) -> np.ndarray:
+    """
+    Σ_k w_k · terms_k for weights (..., K), accumulated in ranking order. Every
+    path rounds fused scores this way, so all of them break the same ties.
+    """
+    fused = weights[..., 0, None, None] * terms[0]
+    for k in range(1, len(terms)):
+        fused = fused + weights[..., k, None, None] * terms[k]
+    return fused
+
+
+def fuse(S: np.ndarray, mask: np.ndarray, weights, method: str = "minmax") -> np.ndarray:
+    """Fused (E, M) scores for one weight vector; padding stays +inf."""
+    w = np.asarray(weights, dtype=np.float64)
+    return np.where(mask, _weighted_sum(w, _linear_terms(S, mask, method)), np.inf)
+
+
+def gold_ranks(
+    F: np.ndarray,
+    mask: np.ndarray,
+    gold: np.ndarray,
+    gold_last_on_ties: bool = False,
+) -> np.ndarray:
+    """
+    Rank of each example's best gold candidate under fused scores F (..., E, M),
+    0 where an example has no gold. Tie rules follow `ranking_eval.candidate_ranks`.
+    """
+    best = np.where(gold, F, np.inf).argmin(axis=-1)[..., None]
+    best_score = np.take_along_axis(F, best, axis=-1)
+    earlier = np.arange(F.shape[-1]) < best
+    wins_tie = (earlier & gold) | ~gold if gold_last_on_ties else earlier
+    ahead = ((F < best_score) | ((F == best_score) & wins_tie)) & mask
+    return np.where(gold.any(axis=-1), ahead.sum(axis=-1) + 1, 0)
+
+
+# Relative width of the band around a crossing where rounding can decide the order
+_ROUNDING_BAND = 32 * np.finfo(np.float64).eps
+
+
+def _band_bounds(a: np.ndarray, b: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """The interval [low, high] of t with t · a <= b (empty when low > high)."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bound = b / a
+    low = np.where(a < 0, bound, -np.inf)
+    high = np.where(a > 0, bound, np.where((a == 0) & (b < 0), -np.inf, np.inf))
+    return low, high
+
+
+def _pair_events(
+    terms: np.ndarray,
+    mask: np.ndarray,
+    gold: np.ndarray,
+    weights: np.ndarray,
+    ratios: np.ndarray,
+    gold_last_on_ties: bool,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    For every (gold g, candidate c) pair of an example, where over the sorted
+    settings (`weights`, gaze shares t = w0 / (w0 + w1) in `ratios`) c starts
+    or stops ranking ahead of g. Returns (example, gold slot, setting, ±1).
+
+    The fused difference d(t) = D1 + t · (D0 - D1) is linear, so c is ahead on
+    one side of the crossing. Only settings so close to it that the rounded
+    fused scores may disagree with the sign of d are checked with the fused
+    scores themselves, rounded as `fuse` rounds them.
+    """
+    M = mask.shape[1]
+    eg, mg = np.nonzero(gold & mask)
+    slot = np.arange(len(eg)) - np.searchsorted(eg, eg)  # gold index within its example
+    # One entry per pair from here on
+    pairs = mask[eg] & (np.arange(M) != mg[:, None])
+    n_cands = pairs.sum(axis=1)
+    e, g, mg = np.repeat(eg, n_cands), np.repeat(slot, n_cands), np.repeat(mg, n_cands)
+    c = np.broadcast_to(np.arange(M), pairs.shape)[pairs]
+    T0c, T0g, T1c, T1g = terms[0, e, c], terms[0, e, mg], terms[1, e, c], terms[1, e, mg]
+    D0, D1 = T0c - T0g, T1c - T1g
+    if gold_last_on_ties:
+        cand_gold = gold[e, c]
+        wins_tie = ((c < mg) & cand_gold) | ~cand_gold
+    else:
+        wins_tie = c < mg
+
+    # Side of the crossing: slope > 0 ahead before it, slope < 0 after it, 0 everywhere or nowhere
+    slope = D0 - D1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cross = -D1 / slope
+    n = len(ratios)
+    split = np.searchsorted(ratios, cross)
+    start = np.where(slope < 0, split, 0)
+    stop = np.where(slope > 0, split, n)
+    stop = np.where((slope == 0) & ((D1 > 0) | ((D1 == 0) & ~wins_tie)), 0, stop)
+
+    # Rounding band |d(t)| <= B(t) = band · (t · A0 + (1 - t) · A1), an interval [low, high] of t
+    A0 = _ROUNDING_BAND * (np.abs(T0c) + np.abs(T0g))
+    A1 = _ROUNDING_BAND * (np.abs(T1c) + np.abs(T1g))
+    low1, high1 = _band_bounds(slope - (A0 - A1), A1 - D1)
+    low2, high2 = _band_bounds(-slope - (A0 - A1), A1 + D1)
+    low, high = np.maximum(low1, low2), np.minimum(high1, high2)
+    high[(D0 == 0) & (D1 == 0)] = -np.inf  # identical terms: the fused scores tie exactly too
+    # Usually the band holds at most the two settings around the crossing; search the rest
+    padded = np.r_[-np.inf, -np.inf, ratios, np.inf, np.inf]
+    lo = np.where(padded[split + 1] >= low, split - 1, split)
+    hi = np.where(padded[split + 2] <= high, split + 1, split)
+    wide = (padded[split] >= low) | (padded[split + 3] <= high)
+    lo[wide] = np.searchsorted(ratios, low[wide], side="left")
+    hi[wide] = np.searchsorted(ratios, high[wide], side="right")
+    lo, hi = np.maximum(lo, 0), np.minimum(hi, n)
+    width = np.maximum(hi - lo, 0)
+    near = np.repeat(np.arange(len(e)), width)
+    i = lo[near] + np.arange(len(near)) - np.repeat(np.cumsum(width) - width, width)
+    w = weights[i]
+    Fc = w[:, 0] * T0c[near] + w[:, 1] * T1c[near]
+    Fg = w[:, 0] * T0g[near] + w[:, 1] * T1g[near]
+    rounded = (Fc < Fg) | ((Fc == Fg) & wins_tie[near])
+    # Where the rounded order differs: flip that one setting
+    fix = rounded != ((start[near] <= i) & (i < stop[near]))
+    near, i, flip = near[fix], i[fix], np.where(rounded[fix], 1, -1)
+    after = i + 1 < n
+
+    interval = start < stop
+    ev_pair = np.concatenate([np.flatnonzero(interval), np.flatnonzero(interval & (stop < n)), near, near[after]])
+    ev_pos = np.concatenate([start[interval], stop[interval & (stop < n)], i, i[after] + 1])
+    ev_delta = np.concatenate([np.ones(int(interval.sum()), dtype=np.int64),
+                               -np.ones(int((interval & (stop < n)).sum()), dtype=np.int64),
+                               flip, -flip[after]])
+    return e[ev_pair], g[ev_pair], ev_pos, ev_delta
+
+
+def _search_two(
+    terms: np.ndarray,
+    mask: np.ndarray,
+    gold: np.ndarray,
+    weights: np.ndarray,
+    ks: tuple[int, ...],
+    gold_last_on_ties: bool,
+) -> dict[str, np.ndarray]:
+    """`search_weights` for K = 2 and nonnegative weights: a sweep over the crossings."""
+    E, _ = mask.shape
+    ratios = weights[:, 0] / weights.sum(axis=1)
+    order = np.argsort(ratios, kind="stable")
+    n = len(ratios)
+    e, g, pos, delta = _pair_events(terms, mask, gold, weights[order], ratios[order], gold_last_on_ties)
+
+    # Each gold's rank at the first setting, then +1 / -1 where a candidate passes it
+    n_gold = (gold & mask).sum(axis=1)
+    width = max(int(n_gold.max(initial=0)), 1)
+    rank0 = np.full((E, width), np.iinfo(np.int64).max // 2, dtype=np.int64)
+    rank0[np.arange(width) < n_gold[:, None]] = 1
+    at_first = pos == 0
+    np.add.at(rank0, (e[at_first], g[at_first]), delta[at_first])
+    ev_e, ev_g, ev_pos, ev_delta = e[~at_first], g[~at_first], pos[~at_first], delta[~at_first]
+    # By example, then setting; within a setting +1 before -1, so no running rank drops below 1
+    by = np.argsort((ev_e * n + ev_pos) * 2 + (ev_delta < 0))
+    ev_e, ev_g, ev_pos, ev_delta = ev_e[by], ev_g[by], ev_pos[by], ev_delta[by]
+
+    # Running rank of every gold of the event's example, after each event
+    steps = np.zeros((len(by), width), dtype=np.int64)
+    steps[np.arange(len(by)), ev_g] = ev_delta
+    running = np.cumsum(steps, axis=0)
+    first = np.r_[True, ev_e[1:] != ev_e[:-1]] if len(by) else np.zeros(0, dtype=bool)
+    before_example = np.vstack([np.zeros((1, width), dtype=np.int64), running[:-1]])[first]
+    running -= np.repeat(before_example, np.diff(np.r_[np.flatnonzero(first), len(by)]), axis=0)
+    best_after = (rank0[ev_e] + running).min(axis=1)
+    best_before = np.where(first, rank0.min(axis=1)[ev_e], np.r_[0, best_after[:-1]])
+    best0 = rank0.min(axis=1)[n_gold > 0]
+
+    # Metric = its value at the first setting + the changes of each event, accumulated
+    def sweep(f) -> np.ndarray:
+        change = np.bincount(ev_pos, weights=f(best_after) - f(best_before), minlength=n)
+        swept = f(best0).sum() + np.cumsum(change)
+        out = np.empty(n)
+        out[order] = swept
+        return out
+
+    out = {f"gold_at_top_{k}": np.rint(sweep(lambda r, k=k: (r <= k).astype(np.float64))).astype(np.int64)
+           for k in ks}
+    out["mrr"] = sweep(lambda r: 1.0 / r) / E if E else np.zeros(n)
+    return out
+
+
+def search_weights(
+    S: np.ndarray,
+    mask: np.ndarray,
+    gold: np.ndarray,
+    weights: np.ndarray,
+    method: str = "minmax",
+    ks: Iterable[int] = DEFAULT_KS,
+    gold_last_on_ties: bool = False,
+) -> dict[str, np.ndarray]:
+    """
+    Evaluate every row of `weights` (n_settings × K). Returns, per setting,
+    gold_at_top_{k} for each k and mrr, as in `ranking_eval.summarize`.
+    Two rankings with nonnegative weights take the crossing sweep; every
+    path ranks by the fused scores `fuse` returns, ties included.
+    """
+    ks = tuple(ks)
+    terms = _linear_terms(S, mask, method)
+    weights = np.asarray(weights, dtype=np.float64)
+    if len(weights) and weights.shape[1] == 2 and (weights >= 0).all() and (weights.sum(axis=1) > 0).all():
+        return _search_two(terms, mask, gold, weights, ks, gold_last_on_ties)
+    n_settings = len(weights)
+    E, M = mask.shape
+
+    out = {f"gold_at_top_{k}": np.zeros(n_settings, dtype=np.int64) for k in ks}
+    out["mrr"] = np.zeros(n_settings)
+    step = max(1, _CHUNK_ELEMS // max(E * M, 1))
+    for s0 in range(0, n_settings, step):
+        s = slice(s0, s0 + step)
+        F = np.where(mask, _weighted_sum(weights[s], terms), np.inf)
+        ranks = gold_ranks(F, mask, gold, gold_last_on_ties)
+        for k in ks:
+            out[f"gold_at_top_{k}"][s] = ((ranks > 0) & (ranks <= k)).sum(axis=-1)
+        if E:
+            out["mrr"][s] = np.where(ranks > 0, 1.0 / np.maximum(ranks, 1), 0.0).mean(axis=-1)
+    return out
+
+
+def weight_grid(n_rankings: int, steps: int) -> np.ndarray:
+    """All weight vectors on the simplex with resolution 1/steps."""
+    if n_rankings == 1:
+        return np.ones((1, 1))
+    if n_rankings == 2:
+        a = np.linspace(0.0, 1.0, steps + 1)
+        return np.stack([a, 1.0 - a], axis=1)
+    rows = [c for c in product(range(steps + 1), repeat=n_rankings - 1) if sum(c) <= steps]
+    head = np.asarray(rows, dtype=np.float64)
+    return np.concatenate([head, steps - head.sum(axis=1, keepdims=True)], axis=1) / steps
+
+
+def random_weights(n_rankings: int, n: int, seed: int = 0) -> np.ndarray:
+    """`n` weight vectors drawn uniformly from the simplex."""
+    return np.random.default_rng(seed).dirichlet(np.ones(n_rankings), size=n)
+
+
+def best_setting(results: dict[str, np.ndarray], weights: np.ndarray, objective: str) -> dict:
+    i = int(np.argmax(results[objective]))
+    return {
+        "weights": weights[i].tolist(),
+        **{name: (float(v[i]) if name == "mrr" else int(v[i])) for name, v in results.items()},
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--gaze", default="output/gaze_scoring_results_new.json")
+    ap.add_argument("--rec", default="output/rec_scoring_results_new.json")
+    ap.add_argument("--store", default="output/scoring_store_new",
+                    help="columnar store directory (built from --gaze/--rec if missing)")
+    ap.add_argument("--method", default="minmax", choices=METHODS)
+    ap.add_argument("--steps", type=int, default=100, help="grid resolution per weight")
+    ap.add_argument("--random", type=int, default=0, help="use N random weight vectors instead of the grid")
+    ap.add_argument("--objective", default="gold_at_top_1")
+    args = ap.parse_args()
+
+    if not is_store(args.store, args.gaze, args.rec):
+        build_store(args.gaze, args.rec, args.store)
+    store = ScoringStore(args.store)
+    S, mask = stack_scores([store.gaze_distance, store.rec_distance], store.cand_offsets)
+    gold, _ = to_matrix(np.asarray(store.cand_type) == CAND_GOLD, store.cand_offsets, False)
+    weights = random_weights(2, args.random) if args.random else weight_grid(2, args.steps)
+    results = search_weights(S, mask, gold, weights, args.method)
+    best = best_setting(results, weights, args.objective)
+    best["weights"] = dict(zip(("gaze", "rec"), best["weights"]))
+    print(json.dumps({"method": args.method, "settings": len(weights), "best": best}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""
+Columnar, memory-mapped store for gaze/REC scoring results.
+
+`build_store` converts a gaze scoring file and a REC scoring file (the
+`output/*_scoring_results_*.json` pair) into a directory of flat binary
+columns; `ScoringStore` memory-maps that directory, so opening it costs the
+same for 100 or 100k examples and reading one example only touches its rows.
+
+Layout (all row counts are recorded in meta.json):
+  example level    cand_offsets (E+1), bbox (E×4), image_path, plain_path, label
+  candidate level  text_id, type (uint8), gaze_distance, rec_distance,
+                   rec_point (C×2 float32), rec_valid, gaze_offsets (C+1)
+  fixation level   gaze_points (F×2 float32), NaN rows where the source had a
+                   null, and gaze_valid marking the real ones
+  text table       text: each distinct candidate text once, indexed by text_id
+
+Validity is decided once at build time (`ragged.as_point`); readers get the
+arrays back as `ragged.RaggedPoints` / `ragged.InternedStrings`.
+
+Usage:
+    python scoring_store.py output/gaze_scoring_results_new.json \\
+        output/rec_scoring_results_new.json output/scoring_store_new
+"""
+import hashlib
+import json
+import sys
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+import numpy as np
+
+from ragged import (
+    CAND_GENERATED, CAND_GOLD, CAND_TYPE_NAMES, CAND_TYPES, InternedStrings, RaggedPoints, as_point,
+)
+from scoring_stream import iter_merged
+
+STORE_VERSION = 2
+
+
+def top_gold_label(candidates: list[dict], gaze_distances: list[float]) -> str:
+    """Text of the best gaze-ranked gold candidate, or "[No Gold]"."""
+    sorted_indices = sorted(range(len(candidates)), key=lambda i: gaze_distances[i])
+    for i in sorted_indices:
+        if candidates[i]["type"] == "gold":
+            return candidates[i]["text"]
+    return "[No Gold]"
+
+
+# ─── Writer ────────────────────────────────────────────────────────────────────
+# name -> (dtype, row width); every column is appended to its own .bin file
+_COLUMNS = {
+    "cand_offsets":  (np.int64, 1),
+    "gaze_offsets":  (np.int64, 1),
+    "bbox":          (np.float32, 4),
+    "text_id":       (np.int32, 1),
+    "type":          (np.uint8, 1),
+    "gaze_distance": (np.float64, 1),
+    "rec_distance":  (np.float64, 1),
+    "rec_point":     (np.float32, 2),
+    "rec_valid":     (np.bool_, 1),
+    "gaze_points":   (np.float32, 2),
+    "gaze_valid":    (np.bool_, 1),
+}
+_STRING_COLUMNS = ("image_path", "plain_path", "label", "text")
+
+
+class _StoreWriter:
+    """
+    Appends merged entries to the store's column files in fixed-size batches,
+    so memory stays bounded no matter how many entries are written.
+    """
+
+    def __init__(self, root: Path, flush_every: int = 4096):
+        self.root = root
+        self.flush_every = flush_every
+        root.mkdir(parents=True, exist_ok=True)
+        (root / "meta.json").unlink(missing_ok=True)
+
+        self.rows = {name: 0 for name in _COLUMNS}
+        self.files = {name: open(root / f"{name}.bin", "wb") for name in _COLUMNS}
+        self.buffers: dict[str, list] = {name: [] for name in _COLUMNS}
+        for name in _STRING_COLUMNS:
+            for part in ("offsets", "bytes"):
+                key = f"{name}.{part}"
+                self.rows[key] = 0
+                self.files[key] = open(root / f"{key}.bin", "wb")
+            self.buffers[name] = []
+        self.string_bytes = {name: 0 for name in _STRING_COLUMNS}
+        self.text_ids: dict[str, int] = {}
+
+        self.n_examples = self.n_candidates = self.n_fixations = 0
+        self.pending = 0
+        for name in ("cand_offsets", "gaze_offsets"):
+            self.buffers[name].append(0)
+        for name in _STRING_COLUMNS:
+            self._append(f"{name}.offsets", np.zeros(1, dtype=np.int64))
+
+    def _append(self, key: str, arr: np.ndarray) -> None:
+        arr.tofile(self.files[key])
+        self.rows[key] += len(arr)
+
+    def add(self, entry: dict) -> None:
+        candidates = entry["candidates"]
+        bbox = entry.get("bbox") or [np.nan] * 4
+        self.buffers["bbox"].append(tuple(float(v) for v in bbox))
+        self.buffers["image_path"].append(entry["image_path"])
+        self.buffers["plain_path"].append(entry.get("plain_path") or "")
+        self.buffers["label"].append(top_gold_label(candidates, entry["gaze_distances"]))
+
+        for cand, gd, rd, seq, rp in zip(
+            candidates, entry["gaze_distances"], entry["rec_distances"],
+            entry["gaze_sequences"], entry["rec_points"],
+        ):
+            text_id = self.text_ids.get(cand["text"])
+            if text_id is None:
+                text_id = self.text_ids[cand["text"]] = len(self.text_ids)
+                self.buffers["text"].append(cand["text"])
+            self.buffers["text_id"].append(text_id)
+            self.buffers["type"].append(CAND_TYPES.get(cand["type"], CAND_GENERATED))
+            self.buffers["gaze_distance"].append(float(gd))
+            self.buffers["rec_distance"].append(float(rd))
+            rec_point = as_point(rp)
+            self.buffers["rec_point"].append(rec_point)
+            self.buffers["rec_valid"].append(rec_point[0] == rec_point[0])  # False for NaN
+            for pt in seq:
+                xy = as_point(pt)
+                self.buffers["gaze_points"].append(xy)
+                self.buffers["gaze_valid"].append(xy[0] == xy[0])
+            self.n_fixations += len(seq)
+            self.buffers["gaze_offsets"].append(self.n_fixations)
+            self.n_candidates += 1
+        self.buffers["cand_offsets"].append(self.n_candidates)
+        self.n_examples += 1
+
+        self.pending += 1
+        if self.pending >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        for name, (dtype, width) in _COLUMNS.items():
+            arr = np.asarray(self.buffers[name], dtype=dtype)
+            if width > 1:
+                arr = arr.reshape(-1, width)
+            self._append(name, arr)
+            self.buffers[name].clear()
+        for name in _STRING_COLUMNS:
+            encoded = [s.encode("utf-8") for s in self.buffers[name]]
+            ends = np.cumsum([len(b) for b in encoded], dtype=np.int64) + self.string_bytes[name]
+            self._append(f"{name}.bytes", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+            self._append(f"{name}.offsets", ends)
+            if len(ends):
+                self.string_bytes[name] = int(ends[-1])
+            self.buffers[name].clear()
+        self.pending = 0
+
+    def close(self, sources: dict | None = None) -> None:
+        self.flush()
+        for fh in self.files.values():
+            fh.close()
+
+        schema = {}
+        for key, rows in self.rows.items():
+            dtype, width = _COLUMNS.get(key, (np.int64 if key.endswith(".offsets") else np.uint8, 1))
+            shape = [rows, width] if width > 1 else [rows]
+            schema[key] = {"dtype": np.dtype(dtype).str, "shape": shape}
+
+        meta = {
+            "version":      STORE_VERSION,
+            "n_examples":   self.n_examples,
+            "n_candidates": self.n_candidates,
+            "n_fixations":  self.n_fixations,
+            "columns":      schema,
+            "sources":      sources or {},
+        }
+        # meta.json goes last so a half-written store is never picked up
+        (self.root / "meta.json").write_text(json.dumps(meta, indent=2))
+
+
+def build_store(gaze_path: Path | str, rec_path: Path | str, out_dir: Path | str) -> Path:
+    """
+    One-time conversion of a gaze/REC scoring pair into a columnar store.
+    Both inputs are streamed, so this runs in bounded memory.
+    """
+    out_dir = Path(out_dir)
+    writer = _StoreWriter(out_dir)
+    for entry in iter_merged(gaze_path, rec_path):
+        writer.add(entry)
+    writer.close(sources=source_stamps(gaze_path, rec_path))
+    return out_dir
+
+
+def source_stamps(*paths: Path | str) -> dict[str, list]:
+    """(size, mtime_ns) of each input file, recorded so stale stores can be detected."""
+    stamps = {}
+    for p in paths:
+        st = Path(p).stat()
+        stamps[str(p)] = [st.st_size, st.st_mtime_ns]
+    return stamps
+
+
+def is_store(path: Path | str, *sources: Path | str) -> bool:
+    """True if `path` holds a complete store, built from `sources` as they are now (if given)."""
+    meta_path = Path(path) / "meta.json"
+    if not meta_path.exists():
+        return False
+    meta = json.loads(meta_path.read_text())
+    if meta.get("version") != STORE_VERSION:
+        return False
+    return not sources or meta.get("sources") == source_stamps(*sources)
+
+
+# ─── Reader ────────────────────────────────────────────────────────────────────
+class _StringColumn:
+    """Variable-length UTF-8 strings stored as one byte blob plus offsets."""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.blob[start:end].tobytes().decode("utf-8")
+
+    def tolist(self) -> list[str]:
+        data = self.blob.tobytes()
+        offs = self.offsets.tolist()
+        return [data[a:b].decode("utf-8") for a, b in zip(offs[:-1], offs[1:])]
+
+
+class Example(NamedTuple):
+    """
+    One example as compact arrays (C = its candidates):
+      texts          candidate texts
+      cand_type      (C,) uint8, CAND_GOLD / CAND_GENERATED
+      gaze_distance  (C,) float64; rec_distance likewise
+      gaze           per candidate, its valid fixations as (n, 2) float32 in 0–100 coords
+      rec_point      (C, 2) float32, NaN where rec_valid is False
+    """
+    image_path: str
+    bbox: np.ndarray
+    texts: list[str]
+    cand_type: np.ndarray
+    gaze_distance: np.ndarray
+    rec_distance: np.ndarray
+    gaze: list[np.ndarray]
+    rec_point: np.ndarray
+    rec_valid: np.ndarray
+
+
+class ScoringStore:
+    """
+    Read-only view over a store written by `build_store`.
+    Every column is an `np.memmap`; nothing is read until it is indexed.
+    """
+
+    def __init__(self, root: Path | str):
+        self.root = Path(root)
+        self.meta = json.loads((self.root / "meta.json").read_text())
+        if self.meta.get("version") != STORE_VERSION:
+            raise ValueError(
+                f"{self.root}: store version {self.meta.get('version')} != {STORE_VERSION}, rebuild it"
+            )
+
+        cols = {name: self._map(name, spec) for name, spec in self.meta["columns"].items()}
+        self.cand_offsets  = cols["cand_offsets"]
+        self.gaze_offsets  = cols["gaze_offsets"]
+        self.bbox          = cols["bbox"]
+        self.cand_type     = cols["type"]
+        self.gaze_distance = cols["gaze_distance"]
+        self.rec_distance  = cols["rec_distance"]
+        self.rec_point     = cols["rec_point"]
+        self.rec_valid     = cols["rec_valid"]
+        self.gaze_points   = cols["gaze_points"]
+        self.gaze_valid    = cols["gaze_valid"]
+        self.gaze = RaggedPoints(self.gaze_points, self.gaze_offsets, self.gaze_valid)
+        self.image_paths = _StringColumn(cols["image_path.bytes"], cols["image_path.offsets"])
+        self.plain_paths = _StringColumn(cols["plain_path.bytes"], cols["plain_path.offsets"])
+        self.labels      = _StringColumn(cols["label.bytes"], cols["label.offsets"])
+        self.texts = InternedStrings(cols["text_id"], _StringColumn(cols["text.bytes"], cols["text.offsets"]))
+
+    def _map(self, name: str, spec: dict) -> np.ndarray:
+        shape = tuple(spec["shape"])
+        if 0 in shape:  # np.memmap refuses empty files
+            return np.empty(shape, dtype=spec["dtype"])
+        return np.memmap(self.root / f"{name}.bin", dtype=spec["dtype"], mode="r", shape=shape)
+
+    def __len__(self) -> int:
+        return self.meta["n_examples"]
+
+    def fingerprint(self) -> str:
+        """Changes whenever the store is rebuilt; derived indexes record it to detect staleness."""
+        return hashlib.sha1((self.root / "meta.json").read_bytes()).hexdigest()
+
+    def candidate_range(self, i: int) -> tuple[int, int]:
+        return int(self.cand_offsets[i]), int(self.cand_offsets[i + 1])
+
+    def entry(self, i: int) -> dict:
+        """
+        Example `i` in the same shape rerank_vis.py has always used:
+        candidates / gaze_distances / rec_distances / gaze_sequences / rec_points,
+        with nulls restored as None.
+        """
+        c0, c1 = self.candidate_range(i)
+        candidates = [
+            {"text": self.texts[c], "type": CAND_TYPE_NAMES[int(self.cand_type[c])]}
+            for c in range(c0, c1)
+        ]
+        rec_points = [
+            pt if ok else None
+            for pt, ok in zip(np.asarray(self.rec_point[c0:c1]).tolist(), np.asarray(self.rec_valid[c0:c1]).tolist())
+        ]
+        return {
+            "image_path":     self.image_paths[i],
+            "plain_path":     self.plain_paths[i],
+            "bbox":           np.asarray(self.bbox[i]).tolist(),
+            "candidates":     candidates,
+            "gaze_distances": np.asarray(self.gaze_distance[c0:c1]).tolist(),
+            "rec_distances":  np.asarray(self.rec_distance[c0:c1]).tolist(),
+            "gaze_sequences": [self.gaze.raw(c) for c in range(c0, c1)],
+            "rec_points":     rec_points,
+        }
+
+    def example(self, i: int) -> "Example":
+        """Example `i` as array slices: no per-point lists, no re-validation."""
+        c0, c1 = self.candidate_range(i)
+        return Example(
+            image_path=self.image_paths[i],
+            bbox=np.asarray(self.bbox[i]),
+            texts=[self.texts[c] for c in range(c0, c1)],
+            cand_type=np.asarray(self.cand_type[c0:c1]),
+            gaze_distance=np.asarray(self.gaze_distance[c0:c1]),
+            rec_distance=np.asarray(self.rec_distance[c0:c1]),
+            gaze=[self.gaze.sequence(c) for c in range(c0, c1)],
+            rec_point=np.asarray(self.rec_point[c0:c1]),
+            rec_valid=np.asarray(self.rec_valid[c0:c1]),
+        )
+
+    def iter_entries(self) -> Iterator[dict]:
+        for i in range(len(self)):
+            yield self.entry(i)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        sys.exit(f"usage: {sys.argv[0]} GAZE_JSON REC_JSON OUT_DIR")
+    out = build_store(*sys.argv[1:])
+    print(f"wrote {out} ({ScoringStore(out).meta['n_examples']} examples)")
@@ -0,0 +1,136 @@
+"""
+Streaming readers for scoring result files.
+
+`iter_entries` yields one entry at a time from either a JSON array file
+(the `output/*_scoring_results_*.json` format) or a JSONL file, holding at
+most one entry plus a read buffer in memory. `iter_merged` walks a gaze file
+and a REC file in lockstep and merges them pairwise with `merge_entries`,
+which applies the same image_path assertion and padding rules rerank_vis.py
+always has.
+"""
+import json
+from pathlib import Path
+from typing import Iterator
+
+CHUNK_SIZE = 1 << 20
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+def _skip_ws(buf: str, pos: int) -> int:
+    while pos < len(buf) and buf[pos] in _WHITESPACE:
+        pos += 1
+    return pos
+
+
+def iter_json_array(path: Path | str, chunk_size: int = CHUNK_SIZE) -> Iterator:
+    """
+    Incrementally parse a file holding one top-level JSON array and yield its
+    elements. Memory is bounded by the largest single element, not the file.
+    """
+    with open(path, encoding="utf-8") as f:
+        buf = ""
+        pos = 0
+        eof = False
+
+        def fill() -> bool:
+            nonlocal buf, pos, eof
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+                return False
+            buf = buf[pos:] + chunk
+            pos = 0
+            return True
+
+        # Opening bracket
+        while True:
+            pos = _skip_ws(buf, pos)
+            if pos < len(buf) or not fill():
+                break
+        if pos >= len(buf) or buf[pos] != "[":
+            raise ValueError(f"{path}: expected a top-level JSON array")
+        pos += 1
+
+        expect_value = True  # after "[" or ","
+        while True:
+            pos = _skip_ws(buf, pos)
+            if pos >= len(buf):
+                if fill():
+                    continue
+                raise ValueError(f"{path}: unexpected end of file inside array")
+
+            if buf[pos] == "]":
+                return
+            if buf[pos] == "," and not expect_value:
+                pos += 1
+                expect_value = True
+                continue
+
+            try:
+                value, end = _decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if fill():
+                    continue
+                raise
+            # A value ending exactly at the buffer edge may be a truncated
+            # scalar ("12" of "123"); only trust it once we can see what follows.
+            if _skip_ws(buf, end) >= len(buf) and not eof:
+                fill()
+                continue
+            pos = end
+            expect_value = False
+            yield value
+
+
+def iter_jsonl(path: Path | str) -> Iterator:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def iter_entries(path: Path | str) -> Iterator[dict]:
+    """Stream entries from a `.jsonl` file or a JSON array file."""
+    path = Path(path)
+    if path.suffix == ".jsonl":
+        return iter_jsonl(path)
+    return iter_json_array(path)
+
+
+def merge_entries(g_entry: dict, r_entry: dict) -> dict:
+    """
+    Merge one gaze entry with its REC counterpart.
+    Asserts both refer to the same image and pads gaze_sequences / rec_points
+    with empties/None when their lengths don't match the candidate list.
+    """
+    image_path = g_entry["image_path"]
+    assert image_path == r_entry["image_path"], "Mismatch between gaze and rec entries"
+
+    raw_gaze_sequences = g_entry.get("gaze_sequences", [])
+    raw_rec_points     = r_entry.get("rec_points", [])
+
+    n_candidates = len(g_entry["candidates"])
+    if not isinstance(raw_gaze_sequences, list) or len(raw_gaze_sequences) != n_candidates:
+        raw_gaze_sequences = [[] for _ in range(n_candidates)]
+    if not isinstance(raw_rec_points, list) or len(raw_rec_points) != n_candidates:
+        raw_rec_points = [None for _ in range(n_candidates)]
+
+    return {
+        "image_path":     image_path,
+        "plain_path":     g_entry.get("plain_path", ""),
+        "bbox":           g_entry.get("bbox"),
+        "candidates":     g_entry["candidates"],
+        "gaze_distances": g_entry["gaze_distances"],
+        "rec_distances":  r_entry["rec_distances"],
+        "gaze_sequences": raw_gaze_sequences,
+        "rec_points":     raw_rec_points,
+    }
+
+
+def iter_merged(gaze_path: Path | str, rec_path: Path | str) -> Iterator[dict]:
+    """Pairwise-merged gaze/REC entries, streamed from both files at once."""
+    for g_entry, r_entry in zip(iter_entries(gaze_path), iter_entries(rec_path)):
+        yield merge_entries(g_entry, r_entry)
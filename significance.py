@@ -0,0 +1,189 @@
+"""
+Bootstrap confidence intervals and paired significance tests for rankings.
+
+Every ranking-quality number in the report (gold@k, MRR) is a mean over
+examples of a function of one integer: the rank of the example's best gold
+candidate (0 = no gold). Those per-example codes are computed once; after
+that nothing is resampled row by row:
+
+  bootstrap    a resample of E examples is fully described by how many times
+               each distinct code (or, for a pair of rankings, each distinct
+               pair of codes) was drawn — one multinomial draw over at most a
+               few hundred categories, so B resamples are a (B × categories)
+               count matrix and every metric a single matrix product
+  permutation  the paired sign-flip test only needs the non-zero per-example
+               differences; flipping the n_v examples that share a difference
+               v contributes v · (2·Binomial(n_v, ½) − n_v), so B permutations
+               are one (B × distinct differences) binomial draw
+
+Both are exact in distribution (not approximations of the resampling), and
+their cost depends on the number of distinct codes rather than on E.
+
+Usage:
+    python significance.py [--resamples 10000] [--alpha 0.05] [--json]
+"""
+import argparse
+import json
+from itertools import combinations
+from typing import Callable, Iterable
+
+import numpy as np
+
+from ranking_eval import DEFAULT_KS, STORE_RANKINGS, best_gold_ranks, candidate_ranks
+from scoring_store import CAND_GOLD, ScoringStore, build_store, is_store
+
+DEFAULT_RESAMPLES = 10_000
+DEFAULT_ALPHA = 0.05
+
+
+def best_gold_table(
+    rankings: dict[str, np.ndarray],
+    cand_offsets: np.ndarray,
+    is_gold: np.ndarray,
+    gold_last_on_ties: bool = False,
+) -> np.ndarray:
+    """(E, K) best gold rank per example and ranking (0 = no gold), K = rankings in order."""
+    cand_offsets = np.asarray(cand_offsets, dtype=np.int64)
+    is_gold = np.asarray(is_gold, dtype=bool)
+    return np.stack([
+        best_gold_ranks(candidate_ranks(np.asarray(s, dtype=np.float64), cand_offsets, is_gold, gold_last_on_ties),
+                        cand_offsets, is_gold)
+        for s in rankings.values()
+    ], axis=1)
+
+
+def metric_functions(ks: Iterable[int] = DEFAULT_KS) -> dict[str, Callable[[np.ndarray], np.ndarray]]:
+    """Per-example metric values from best gold ranks; their means are the report's rates."""
+    fns: dict[str, Callable[[np.ndarray], np.ndarray]] = {
+        f"gold_at_top_{k}": (lambda r, k=k: ((r > 0) & (r <= k)).astype(np.float64)) for k in ks
+    }
+    fns["mrr"] = lambda r: np.divide(1.0, r, out=np.zeros(r.shape), where=r > 0)
+    return fns
+
+
+def _resample_counts(codes: np.ndarray, n_resamples: int, rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    """Distinct codes (U,) and how often each is drawn in every bootstrap resample (B, U)."""
+    uniq, counts = np.unique(codes, return_counts=True)
+    draws = rng.multinomial(len(codes), counts / len(codes), size=n_resamples)
+    return uniq, draws
+
+
+def _interval(samples: np.ndarray, alpha: float) -> tuple[float, float]:
+    lo, hi = np.quantile(samples, [alpha / 2, 1 - alpha / 2])
+    return float(lo), float(hi)
+
+
+def bootstrap_intervals(
+    best: np.ndarray,
+    names: list[str],
+    ks: Iterable[int] = DEFAULT_KS,
+    n_resamples: int = DEFAULT_RESAMPLES,
+    alpha: float = DEFAULT_ALPHA,
+    seed: int = 0,
+) -> list[dict]:
+    """Percentile bootstrap CI of every metric of every ranking, one row each."""
+    rng = np.random.default_rng(seed)
+    fns = metric_functions(ks)
+    n = len(best)
+    rows = []
+    for a, name in enumerate(names):
+        uniq, draws = _resample_counts(best[:, a], n_resamples, rng)
+        for metric, fn in fns.items():
+            samples = draws @ fn(uniq) / n
+            lo, hi = _interval(samples, alpha)
+            rows.append({"ranking": name, "metric": metric, "value": float(fn(best[:, a]).mean()),
+                         "ci_low": lo, "ci_high": hi})
+    return rows
+
+
+def permutation_pvalue(diffs: np.ndarray, n_resamples: int, rng: np.random.Generator) -> float:
+    """Two-sided paired sign-flip p-value of mean(diffs) == 0."""
+    values, counts = np.unique(diffs[diffs != 0], return_counts=True)
+    if not len(values):
+        return 1.0
+    observed = abs(float(diffs.sum()))
+    flips = rng.binomial(counts, 0.5, size=(n_resamples, len(counts)))
+    totals = (2 * flips - counts) @ values
+    # tolerance: equal-magnitude sums can differ in the last bits
+    extreme = np.count_nonzero(np.abs(totals) >= observed - 1e-9 * max(observed, 1.0))
+    return float((extreme + 1) / (n_resamples + 1))
+
+
+def paired_comparisons(
+    best: np.ndarray,
+    names: list[str],
+    ks: Iterable[int] = DEFAULT_KS,
+    n_resamples: int = DEFAULT_RESAMPLES,
+    alpha: float = DEFAULT_ALPHA,
+    seed: int = 0,
+) -> list[dict]:
+    """
+    For every pair of rankings and every metric: the difference of means
+    (a − b), its paired bootstrap CI and the sign-flip permutation p-value.
+    """
+    rng = np.random.default_rng(seed + 1)
+    fns = metric_functions(ks)
+    n = len(best)
+    width = int(best.max()) + 1 if n else 1
+    rows = []
+    for a, b in combinations(range(len(names)), 2):
+        # Joint code of the pair, so each resample keeps examples paired
+        uniq, draws = _resample_counts(best[:, a] * width + best[:, b], n_resamples, rng)
+        ua, ub = np.divmod(uniq, width)
+        for metric, fn in fns.items():
+            diffs = fn(best[:, a]) - fn(best[:, b])
+            lo, hi = _interval(draws @ (fn(ua) - fn(ub)) / n, alpha)
+            rows.append({"a": names[a], "b": names[b], "metric": metric, "diff": float(diffs.mean()),
+                         "ci_low": lo, "ci_high": hi, "p_value": permutation_pvalue(diffs, n_resamples, rng)})
+    return rows
+
+
+def store_significance(
+    store: ScoringStore,
+    ks: Iterable[int] = DEFAULT_KS,
+    n_resamples: int = DEFAULT_RESAMPLES,
+    alpha: float = DEFAULT_ALPHA,
+    seed: int = 0,
+) -> dict[str, list[dict]]:
+    """CIs for gaze / REC / combined over a store and their pairwise tests."""
+    ks = tuple(ks)
+    best = best_gold_table({name: fn(store) for name, fn in STORE_RANKINGS.items()},
+                           store.cand_offsets, np.asarray(store.cand_type) == CAND_GOLD)
+    names = list(STORE_RANKINGS)
+    return {
+        "intervals":   bootstrap_intervals(best, names, ks, n_resamples, alpha, seed),
+        "comparisons": paired_comparisons(best, names, ks, n_resamples, alpha, seed),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--gaze", default="output/gaze_scoring_results_new.json")
+    ap.add_argument("--rec", default="output/rec_scoring_results_new.json")
+    ap.add_argument("--store", default="output/scoring_store_new",
+                    help="columnar store directory (built from --gaze/--rec if missing)")
+    ap.add_argument("--resamples", type=int, default=DEFAULT_RESAMPLES)
+    ap.add_argument("--alpha", type=float, default=DEFAULT_ALPHA)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", action="store_true", help="print the raw result rows as JSON")
+    args = ap.parse_args()
+
+    if not is_store(args.store, args.gaze, args.rec):
+        build_store(args.gaze, args.rec, args.store)
+    result = store_significance(ScoringStore(args.store), DEFAULT_KS, args.resamples, args.alpha, args.seed)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+
+    level = f"{100 * (1 - args.alpha):g}%"
+    print(f"{'ranking':10s} {'metric':16s} {'value':>7s}   {level} CI")
+    for r in result["intervals"]:
+        print(f"{r['ranking']:10s} {r['metric']:16s} {r['value']:7.3f}   [{r['ci_low']:.3f}, {r['ci_high']:.3f}]")
+    print(f"\n{'a - b':20s} {'metric':16s} {'diff':>7s}   {level} CI{'':10s} p")
+    for r in result["comparisons"]:
+        pair = f"{r['a']} - {r['b']}"
+        print(f"{pair:20s} {r['metric']:16s} {r['diff']:+7.3f}   [{r['ci_low']:+.3f}, {r['ci_high']:+.3f}]  {r['p_value']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
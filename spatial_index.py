@@ -0,0 +1,180 @@
+"""
+Uniform-grid spatial index over every valid gaze fixation of a store.
+
+Fixations (normalized 0–100 coordinates) are bucketed into a GRID × GRID
+grid and stored sorted by cell, each tagged with its fixation row, candidate
+and example and whether it is its candidate's final fixation. A rectangle
+touches one contiguous slice of the sorted arrays per grid row, so a query
+reads only those slices and filters them exactly; radius queries run on
+their bounding rectangle.
+
+Like the search index, it is built once per store and persisted at
+<store>/spatial; `open_spatial_index` rebuilds it when the store changes.
+"""
+import json
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from scoring_store import ScoringStore
+
+INDEX_VERSION = 1
+GRID = 64
+EXTENT = 100.0
+
+
+class Hits(NamedTuple):
+    """Fixations matched by a query, one row each."""
+    points: np.ndarray     # (n, 2) float32, 0–100 coords
+    fixation: np.ndarray   # (n,) row into store.gaze_points
+    candidate: np.ndarray  # (n,) candidate index
+    example: np.ndarray    # (n,) example index
+
+    def examples(self) -> np.ndarray:
+        return np.unique(self.example)
+
+    def candidates(self) -> np.ndarray:
+        return np.unique(self.candidate)
+
+
+def _cells(xy: np.ndarray, grid: int) -> tuple[np.ndarray, np.ndarray]:
+    c = np.clip((xy / EXTENT * grid).astype(np.int64), 0, grid - 1)
+    return c[:, 0], c[:, 1]
+
+
+def build_spatial_index(store: ScoringStore, out_dir: Path | str | None = None, grid: int = GRID) -> Path:
+    """Write the grid index for `store` (default: <store>/spatial)."""
+    out_dir = Path(out_dir) if out_dir else store.root / "spatial"
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    valid = np.asarray(store.gaze_valid, dtype=bool)
+    rows = np.flatnonzero(valid)
+    points = np.asarray(store.gaze_points)[rows]
+    gaze_offsets = np.asarray(store.gaze_offsets)
+    candidate = np.searchsorted(gaze_offsets, rows, side="right") - 1
+    example = np.searchsorted(np.asarray(store.cand_offsets), candidate, side="right") - 1
+    # Final fixation: the last valid row of its candidate
+    is_final = np.ones(len(rows), dtype=bool)
+    is_final[:-1] = candidate[1:] != candidate[:-1]
+
+    cx, cy = _cells(points, grid)
+    cell = cy * grid + cx
+    order = np.argsort(cell, kind="stable")
+    cell_offsets = np.zeros(grid * grid + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cell, minlength=grid * grid), out=cell_offsets[1:])
+
+    columns = {
+        "points":       points[order].astype(np.float32),
+        "fixation":     rows[order].astype(np.int64),
+        "candidate":    candidate[order].astype(np.int32),
+        "example":      example[order].astype(np.int32),
+        "is_final":     is_final[order],
+        "cell_offsets": cell_offsets,
+    }
+    schema = {}
+    for name, arr in columns.items():
+        arr.tofile(out_dir / f"{name}.bin")
+        schema[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape)}
+    meta = {
+        "version": INDEX_VERSION,
+        "store": store.fingerprint(),
+        "grid": grid,
+        "n_fixations": int(len(rows)),
+        "columns": schema,
+    }
+    (out_dir / "meta.json").write_text(json.dumps(meta, indent=2))
+    return out_dir
+
+
+class SpatialIndex:
+    """Read side of `build_spatial_index`."""
+
+    def __init__(self, root: Path | str):
+        self.root = Path(root)
+        self.meta = json.loads((self.root / "meta.json").read_text())
+        if self.meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"{self.root}: spatial index version mismatch, rebuild it")
+        self.grid = self.meta["grid"]
+        cols = {}
+        for name, spec in self.meta["columns"].items():
+            shape = tuple(spec["shape"])
+            cols[name] = (np.empty(shape, dtype=spec["dtype"]) if 0 in shape else
+                          np.memmap(self.root / f"{name}.bin", dtype=spec["dtype"], mode="r", shape=shape))
+        self.points = cols["points"]
+        self.fixation = cols["fixation"]
+        self.candidate = cols["candidate"]
+        self.example = cols["example"]
+        self.is_final = cols["is_final"]
+        self.cell_offsets = cols["cell_offsets"]
+
+    def __len__(self) -> int:
+        return self.meta["n_fixations"]
+
+    def _candidate_rows(self, x0: float, y0: float, x1: float, y1: float) -> np.ndarray:
+        """Sorted-array positions of every fixation in the cells the rectangle touches."""
+        (cx0, cx1), (cy0, cy1) = _cells(np.array([[x0, y0], [x1, y1]], dtype=np.float64), self.grid)
+        starts = self.cell_offsets[np.arange(cy0, cy1 + 1) * self.grid + cx0]
+        ends = self.cell_offsets[np.arange(cy0, cy1 + 1) * self.grid + cx1 + 1]
+        if not len(starts):
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([np.arange(a, b) for a, b in zip(starts.tolist(), ends.tolist())])
+
+    def _hits(self, pos: np.ndarray) -> Hits:
+        return Hits(
+            points=np.asarray(self.points[pos]),
+            fixation=np.asarray(self.fixation[pos]),
+            candidate=np.asarray(self.candidate[pos]),
+            example=np.asarray(self.example[pos]),
+        )
+
+    def rect(self, x0: float, y0: float, x1: float, y1: float, final_only: bool = False) -> Hits:
+        """Fixations with x0 <= x <= x1 and y0 <= y <= y1 (edges inclusive)."""
+        x0, x1 = sorted((x0, x1))
+        y0, y1 = sorted((y0, y1))
+        pos = self._candidate_rows(x0, y0, x1, y1)
+        pts = np.asarray(self.points[pos])
+        keep = (pts[:, 0] >= x0) & (pts[:, 0] <= x1) & (pts[:, 1] >= y0) & (pts[:, 1] <= y1)
+        if final_only:
+            keep &= np.asarray(self.is_final[pos])
+        return self._hits(pos[keep])
+
+    def radius(self, x: float, y: float, r: float, final_only: bool = False) -> Hits:
+        """Fixations within distance `r` of (x, y)."""
+        pos = self._candidate_rows(x - r, y - r, x + r, y + r)
+        pts = np.asarray(self.points[pos], dtype=np.float64)
+        keep = (pts[:, 0] - x) ** 2 + (pts[:, 1] - y) ** 2 <= r * r
+        if final_only:
+            keep &= np.asarray(self.is_final[pos])
+        return self._hits(pos[keep])
+
+
+def open_spatial_index(store: ScoringStore) -> SpatialIndex:
+    """Spatial index stored alongside `store`, (re)built when missing or stale."""
+    root = store.root / "spatial"
+    meta_path = root / "meta.json"
+    if not meta_path.exists() or json.loads(meta_path.read_text()).get("store") != store.fingerprint():
+        build_spatial_index(store, root)
+    return SpatialIndex(root)
+
+
+def final_fixation_in_bbox(store: ScoringStore, image_size=(512, 320)) -> np.ndarray:
+    """
+    (C,) bool: the candidate's final valid fixation lies inside its example's
+    bbox (pixel coords of an `image_size` image, edges inclusive) — the
+    notebook's per-point `in_bbox` check, for every candidate at once.
+    """
+    valid = np.asarray(store.gaze_valid, dtype=bool)
+    n_valid_before = np.concatenate([[0], np.cumsum(valid, dtype=np.int64)])
+    gaze_offsets = np.asarray(store.gaze_offsets)
+    counts = n_valid_before[gaze_offsets[1:]] - n_valid_before[gaze_offsets[:-1]]
+    has_final = counts > 0
+    rows = np.flatnonzero(valid)
+    final = np.zeros((len(counts), 2))
+    final[has_final] = np.asarray(store.gaze_points)[rows[n_valid_before[gaze_offsets[1:]][has_final] - 1]]
+    final *= np.array([image_size[0], image_size[1]]) / EXTENT
+
+    cand_example = np.repeat(np.arange(len(store)), np.diff(np.asarray(store.cand_offsets)))
+    x0, y0, w, h = np.asarray(store.bbox, dtype=np.float64)[cand_example].T
+    px, py = final.T
+    return has_final & (x0 <= px) & (px <= x0 + w) & (y0 <= py) & (py <= y0 + h)
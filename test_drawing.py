@@ -0,0 +1,24 @@
+import numpy as np
+from PIL import Image
+
+from drawing import GAZE_STYLE, REC_STYLE, render_gaze_overlay, render_rec_overlay, scaled_style
+
+
+def _marked_width(img: Image.Image) -> int:
+    cols = np.flatnonzero(np.asarray(img).any(axis=(0, 2)))
+    return int(cols[-1] - cols[0] + 1)
+
+
+def test_markers_keep_their_size_relative_to_a_thumbnail():
+    full, thumb = Image.new("RGB", (512, 320)), Image.new("RGB", (384, 240))
+    scale = thumb.width / full.width
+    seq = np.array([[50.0, 50.0]], dtype=np.float32)  # one fixation: just its markers
+
+    for render, data, style in ((render_gaze_overlay, seq, {**GAZE_STYLE, "label": False}),
+                                (render_rec_overlay, [50.0, 50.0], REC_STYLE)):
+        expected = _marked_width(render(full, data, **style)) * scale
+        assert abs(_marked_width(render(thumb, data, **scaled_style(style, scale))) - expected) <= 1.5
+        # unscaled markers would be too large for the thumbnail
+        assert _marked_width(render(thumb, data, **style)) > expected + 1.5
+
+    assert scaled_style(GAZE_STYLE, 1.0) is GAZE_STYLE
@@ -0,0 +1,49 @@
+import math
+
+from bench import synth_entries
+from incremental import IncrementalEvaluator
+from scoring_stream import merge_entries
+
+
+def _entries(n: int, seed: int = 0) -> list[dict]:
+    gaze, rec = synth_entries(n, seed=seed)
+    return [merge_entries(g, r) for g, r in zip(gaze, rec)]
+
+
+def _same(a: dict, b: dict) -> bool:
+    return a.keys() == b.keys() and all(
+        (math.isnan(a[k]) and math.isnan(b[k])) if isinstance(a[k], float) and math.isnan(a[k])
+        else a[k] == b[k] for k in a)
+
+
+def test_update_recovers_from_inf_scores(tmp_path):
+    entries = _entries(30)
+    entries[3]["gaze_distances"][0] = math.inf  # a candidate without gaze data
+    evaluator = IncrementalEvaluator(tmp_path / "cache")
+    evaluator.update(entries)
+    evaluator.save()
+    assert math.isinf(evaluator.report()["avg_distance_to_center_gaze"])
+
+    # the inf example changes, then goes away: totals come back finite, with no drift
+    entries[3] = {**entries[3], "gaze_distances": [1.0] * len(entries[3]["gaze_distances"])}
+    reopened = IncrementalEvaluator(tmp_path / "cache")
+    assert reopened.update(entries)["modified"] == 1
+    del entries[3]
+    assert reopened.update(entries)["removed"] == 1
+
+    cold = IncrementalEvaluator(tmp_path / "cold")
+    cold.update(entries)
+    assert math.isfinite(reopened.report()["avg_distance_to_center_gaze"])
+    assert _same(reopened.report(), cold.report())
+
+
+def test_totals_without_examples_is_a_cold_cache(tmp_path):
+    entries = _entries(5)
+    evaluator = IncrementalEvaluator(tmp_path)
+    evaluator.update(entries)
+    evaluator.save()
+    (tmp_path / "examples.jsonl").unlink()
+
+    restarted = IncrementalEvaluator(tmp_path)
+    assert restarted.update(entries)["added"] == len(entries)
+    assert _same(restarted.report(), evaluator.report())
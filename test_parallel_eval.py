@@ -0,0 +1,20 @@
+import numpy as np
+
+from gaze_metrics import PackedGaze
+from parallel_eval import evaluate_parallel
+
+
+def test_evaluate_parallel_without_examples():
+    cand_offsets = np.zeros(1, dtype=np.int64)
+    no_cands = dict(is_gold=np.zeros(0, dtype=bool), lengths=np.zeros(0, dtype=np.int64))
+    packed = PackedGaze(points=np.zeros((0, 2), dtype=np.float32), offsets=np.zeros(1, dtype=np.int64),
+                        cand_offsets=cand_offsets, bbox=np.zeros((0, 4)), is_gold=no_cands["is_gold"])
+
+    results = evaluate_parallel(cand_offsets, scores={"rec": np.zeros(0)}, packed=packed, **no_cands)
+
+    assert "rec" in results and len(results) > 1  # precomputed scores and every gaze metric
+    for summary in results.values():
+        assert summary["total_examples"] == 0
+        assert summary["gold_at_top_1"] == summary["gold_at_top_3"] == 0
+        assert summary["mrr"] == 0.0
+        assert np.isnan(summary["avg_gold_position"])
@@ -0,0 +1,24 @@
+from pathlib import Path
+
+import pytest
+
+from incremental import refresh
+from ranking_eval import store_summary
+from scoring_store import ScoringStore, build_store
+
+GAZE_PATH = Path("output/gaze_scoring_results_new.json")
+REC_PATH = Path("output/rec_scoring_results_new.json")
+# Distances to center the original rerank_vis.py sidebar reported for these files
+BASELINE_DISTANCES = {
+    "avg_distance_to_center_rec": 67.3057957222177,
+    "avg_distance_to_center_gaze": 80.43525600992326,
+    "avg_distance_to_center_combined": 73.8705258661,
+}
+
+
+def test_distance_to_center_matches_baseline(tmp_path):
+    store = ScoringStore(build_store(GAZE_PATH, REC_PATH, tmp_path / "store"))
+    incremental_report, _ = refresh(GAZE_PATH, REC_PATH, tmp_path / "metric_cache")
+    for report in (store_summary(store), incremental_report):
+        for key, value in BASELINE_DISTANCES.items():
+            assert report[key] == pytest.approx(value)
@@ -0,0 +1,25 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+from drawing import GAZE_STYLE
+from render_cache import overlay_key
+
+
+def test_overlay_key_covers_encoding_and_base_image(tmp_path):
+    path = tmp_path / "overlayed_example_0.jpg"
+    Image.new("RGB", (64, 40)).save(path)
+    seq = np.array([[10.0, 20.0], [30.0, 40.0]], dtype=np.float32)
+
+    def key(fmt="WEBP", quality=None):
+        return overlay_key("gaze", path, 0, GAZE_STYLE, seq, fmt, quality)
+
+    webp = key()
+    assert webp == key()
+    assert len({webp, key("JPEG"), key("PNG"), key("WEBP", 50)}) == 4
+
+    # the overlayed image is regenerated: same path, new content
+    Image.new("RGB", (64, 40), "white").save(path)
+    os.utime(path, ns=(path.stat().st_atime_ns, path.stat().st_mtime_ns + 1))
+    assert key() != webp
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from ranking_eval import best_gold_ranks, candidate_ranks, to_matrix
+from score_fusion import METHODS, fuse, random_weights, search_weights, stack_scores, weight_grid
+
+
+def _dense_search(scores, cand_offsets, is_gold, weights, method, ks, gold_last_on_ties):
+    # A third ranking at weight 0 changes no fused score but takes the per-setting path
+    S3, mask = stack_scores([*scores, scores[0]], cand_offsets)
+    gold, _ = to_matrix(is_gold, cand_offsets, False)
+    return search_weights(S3, mask, gold, np.c_[weights, np.zeros(len(weights))], method, ks, gold_last_on_ties)
+
+
+def _fused_gold_at_1(scores, cand_offsets, is_gold, weights, method):
+    # What the app shows for one slider setting: rank the `fuse` scores
+    S, mask = stack_scores(list(scores), cand_offsets)
+    fused = fuse(S, mask, weights, method)[mask]
+    best = best_gold_ranks(candidate_ranks(fused, cand_offsets), cand_offsets, is_gold)
+    return int(((best > 0) & (best <= 1)).sum())
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("method", METHODS)
+@pytest.mark.parametrize("integer_scores", [False, True])
+def test_two_ranking_sweep_matches_per_setting_path(seed, method, integer_scores):
+    rng = np.random.default_rng(seed)
+    cand_offsets = np.r_[0, np.cumsum(rng.integers(1, 8, 200))]
+    n = cand_offsets[-1]
+    scores = rng.integers(0, 4, (2, n)).astype(float) if integer_scores else rng.normal(size=(2, n))
+    scores[0, rng.random(n) < 0.1] = np.inf
+    is_gold = rng.random(n) < 0.3
+    gold, _ = to_matrix(is_gold, cand_offsets, False)
+    weights = np.r_[weight_grid(2, 30), random_weights(2, 20, seed) * 3][rng.permutation(51)]
+
+    for gold_last_on_ties in (False, True):
+        S, mask = stack_scores(list(scores), cand_offsets)
+        swept = search_weights(S, mask, gold, weights, method, (1, 3), gold_last_on_ties)
+        dense = _dense_search(scores, cand_offsets, is_gold, weights, method, (1, 3), gold_last_on_ties)
+        for name in dense:
+            np.testing.assert_allclose(swept[name], dense[name], err_msg=f"{name} ties={gold_last_on_ties}")
+        if not gold_last_on_ties:
+            for w, hits in zip(weights[:10], swept["gold_at_top_1"]):
+                assert hits == _fused_gold_at_1(scores, cand_offsets, is_gold, w, method)
+
+
+@pytest.mark.parametrize("method", ["sum", "borda"])
+def test_exact_tie_is_ranked_like_fuse(method):
+    # gold (candidate 0) and its rival fuse to 4/3 each at w = (1/3, 2/3)
+    scores = np.array([[2.0, 4.0], [1.0, 0.0]])
+    cand_offsets = np.array([0, 2])
+    is_gold = np.array([True, False])
+    weights = np.array([[1 / 3, 2 / 3], [0.5, 0.5], [0.25, 0.75]])
+    S, mask = stack_scores(list(scores), cand_offsets)
+    gold, _ = to_matrix(is_gold, cand_offsets, False)
+
+    swept = search_weights(S, mask, gold, weights, method)
+    for w, hits in zip(weights, swept["gold_at_top_1"]):
+        assert hits == _fused_gold_at_1(scores, cand_offsets, is_gold, w, method)
+    dense = _dense_search(scores, cand_offsets, is_gold, weights, method, (1, 3), False)
+    np.testing.assert_array_equal(swept["gold_at_top_1"], dense["gold_at_top_1"])
@@ -0,0 +1,175 @@
+"""
+Downscaled pyramid of the overlay base images.
+
+The apps show candidate overlays in half-width columns, yet every overlay used
+to be drawn on (and encoded from) the full-size image. The pyramid keeps each
+base image at a few widths, so an overlay is drawn, encoded and sent at the
+smallest level that still fills its panel:
+
+  output/thumbnails/w128/overlayed_example_0.jpg
+  output/thumbnails/w256/overlayed_example_0.jpg
+  output/thumbnails/w384/overlayed_example_0.jpg
+
+Source JPEGs are decoded with `Image.draft`, which makes libjpeg scale by
+1/2, 1/4 or 1/8 inside the DCT (less to decode, nothing to throw away), and
+each level is resized down from the next larger one, so one reduced decode
+per image serves every level. A level is rebuilt when its source is newer.
+`ThumbnailPyramid.path` builds a missing level on demand, so the app works
+without the offline step; running it just moves the work out of the first
+page view.
+
+Usage:
+    python thumbnails.py [--images output/overlayed_images] [--out output/thumbnails]
+    python thumbnails.py --widths 128 256 384 --format WEBP --workers 8
+"""
+import argparse
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+THUMB_WIDTHS = (128, 256, 384)
+DEFAULT_THUMB_DIR = Path("output/thumbnails")
+THUMB_FORMATS = {"JPEG": ".jpg", "WEBP": ".webp"}
+THUMB_QUALITY = 85
+
+
+def scaled_size(size: tuple[int, int], width: int) -> tuple[int, int]:
+    w, h = size
+    return width, max(1, round(h * width / w))
+
+
+def load_scaled(path: Path | str, width: int) -> Image.Image:
+    """RGB image at `width` (never upscaled), JPEG-decoded at the smallest draft scale that covers it."""
+    with Image.open(path) as img:
+        if img.width > width:
+            img.draft("RGB", scaled_size(img.size, width))
+        img = img.convert("RGB")
+    if img.width > width:
+        img = img.resize(scaled_size(img.size, width), Image.LANCZOS)
+    return img
+
+
+def thumbnail_path(out_dir: Path | str, image_path: Path | str, width: int, fmt: str = "JPEG") -> Path:
+    return Path(out_dir) / f"w{width}" / (Path(image_path).stem + THUMB_FORMATS[fmt])
+
+
+def _is_fresh(path: Path, source_mtime_ns: int) -> bool:
+    return path.exists() and path.stat().st_mtime_ns >= source_mtime_ns
+
+
+def _save(img: Image.Image, path: Path, fmt: str, quality: int) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # unique per writer: the app's prefetch threads and batch workers may race on one level
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    img.save(tmp, format=fmt, quality=quality)
+    tmp.replace(path)
+
+
+def build_pyramid(
+    image_path: Path | str,
+    out_dir: Path | str = DEFAULT_THUMB_DIR,
+    widths=THUMB_WIDTHS,
+    fmt: str = "JPEG",
+    quality: int = THUMB_QUALITY,
+    overwrite: bool = False,
+) -> list[Path]:
+    """Write the missing or stale levels of one image (largest first); returns the paths written."""
+    source_mtime = Path(image_path).stat().st_mtime_ns
+    todo = [w for w in sorted(widths, reverse=True)
+            if overwrite or not _is_fresh(thumbnail_path(out_dir, image_path, w, fmt), source_mtime)]
+    if not todo:
+        return []
+    img = load_scaled(image_path, todo[0])
+    written = []
+    for w in todo:
+        if img.width > w:
+            img = img.resize(scaled_size(img.size, w), Image.LANCZOS)
+        path = thumbnail_path(out_dir, image_path, w, fmt)
+        _save(img, path, fmt, quality)
+        written.append(path)
+    return written
+
+
+class ThumbnailPyramid:
+    """
+    Picks the pyramid level for a display width: the smallest level at least
+    that wide, or the original when no level is (or the image is smaller).
+    """
+
+    def __init__(self, out_dir: Path | str = DEFAULT_THUMB_DIR, widths=THUMB_WIDTHS,
+                 fmt: str = "JPEG", quality: int = THUMB_QUALITY):
+        self.out_dir = Path(out_dir)
+        self.widths = tuple(sorted(widths))
+        self.fmt = fmt
+        self.quality = quality
+
+    def level(self, display_width: int) -> int | None:
+        return next((w for w in self.widths if w >= display_width), None)
+
+    def scale(self, image_path: Path | str, display_width: int) -> float:
+        """Width of the image `path` picks relative to the original (1.0 for the original)."""
+        w = self.level(display_width)
+        if w is None:
+            return 1.0
+        with Image.open(image_path) as img:
+            return min(1.0, w / img.width)
+
+    def path(self, image_path: Path | str, display_width: int) -> Path:
+        """Path of the image to draw at `display_width`, building that level if missing or stale."""
+        image_path = Path(image_path)
+        w = self.level(display_width)
+        if w is None:
+            return image_path
+        with Image.open(image_path) as img:
+            if img.width <= w:
+                return image_path
+        path = thumbnail_path(self.out_dir, image_path, w, self.fmt)
+        if not _is_fresh(path, image_path.stat().st_mtime_ns):
+            _save(load_scaled(image_path, w), path, self.fmt, self.quality)
+        return path
+
+
+def _build_chunk(args: tuple) -> int:
+    paths, out_dir, widths, fmt, quality, overwrite = args
+    return sum(len(build_pyramid(p, out_dir, widths, fmt, quality, overwrite)) for p in paths)
+
+
+def build_all(
+    image_dir: Path,
+    out_dir: Path = DEFAULT_THUMB_DIR,
+    widths=THUMB_WIDTHS,
+    fmt: str = "JPEG",
+    quality: int = THUMB_QUALITY,
+    workers: int | None = None,
+    overwrite: bool = False,
+    chunk: int = 64,
+) -> int:
+    """Pyramid levels for every JPEG / PNG in `image_dir`; returns the number of files written."""
+    paths = sorted(p for p in Path(image_dir).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png"))
+    chunks = [(paths[s:s + chunk], out_dir, tuple(widths), fmt, quality, overwrite)
+              for s in range(0, len(paths), chunk)]
+    with ProcessPoolExecutor(workers or os.cpu_count()) as pool:
+        return sum(pool.map(_build_chunk, chunks))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--images", default="output/overlayed_images")
+    ap.add_argument("--out", default=str(DEFAULT_THUMB_DIR))
+    ap.add_argument("--widths", type=int, nargs="+", default=list(THUMB_WIDTHS))
+    ap.add_argument("--format", default="JPEG", choices=list(THUMB_FORMATS))
+    ap.add_argument("--quality", type=int, default=THUMB_QUALITY)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--overwrite", action="store_true", help="rebuild levels that are up to date")
+    args = ap.parse_args()
+
+    n = build_all(Path(args.images), Path(args.out), args.widths, args.format, args.quality,
+                  args.workers, args.overwrite)
+    print(f"wrote {n} thumbnails under {args.out}")
+
+
+if __name__ == "__main__":
+    main()